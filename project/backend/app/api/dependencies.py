@@ -1,37 +1,94 @@
-from fastapi import Depends, Query, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Optional
+from fastapi import Depends, Header, Query, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import FrozenSet, Optional
 from decimal import Decimal
-from datetime import date
+from datetime import date, datetime
+import math
+import secrets
+import time
 
-from ..database import get_db
-from ..services.contract import ContractService, CategoryService
-from ..schemas.contract import ContractFilters, PaginationParams
+from ..config import settings
+from ..database import get_async_db, get_async_replica_db
+from ..services.contract import AsyncContractService, AsyncCategoryService
+from ..schemas.contract import ContractFilters, PaginationParams, ChangeHistoryFilters, CONTRACT_FIELDS, FACET_FIELDS
 from ..models.contract import ContractStatus
+from ..utils.etag import parse_etag
 
 
-def get_contract_service(db: Session = Depends(get_db)) -> ContractService:
+# Read-your-writes marker: a Unix time until which the client's reads go to the primary.
+# Browsers get it as a cookie; other clients echo the response header back.
+READ_PRIMARY_COOKIE = "read_primary_until"
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+
+
+def get_write_db(response: Response, db: AsyncSession = Depends(get_async_db)) -> AsyncSession:
+    """Dependency to get a primary session for writes, opening the client's read-your-writes window"""
+    if settings.read_replica_urls:
+        until = f"{time.time() + settings.read_your_writes_seconds:.3f}"
+        response.set_cookie(
+            READ_PRIMARY_COOKIE, until, max_age=math.ceil(settings.read_your_writes_seconds), httponly=True
+        )
+        response.headers[READ_PRIMARY_HEADER] = until
+    return db
+
+
+def get_read_db(
+    request: Request,
+    primary: AsyncSession = Depends(get_async_db),
+    replica: AsyncSession = Depends(get_async_replica_db)
+) -> AsyncSession:
+    """
+    Dependency to get a session for read-only routes: a read replica, or the
+    primary while the client is inside its read-your-writes window. Sessions
+    connect lazily, so the one not chosen never checks out a connection.
+    """
+    marker = request.cookies.get(READ_PRIMARY_COOKIE) or request.headers.get(READ_PRIMARY_HEADER)
+    try:
+        reads_own_writes = marker is not None and float(marker) > time.time()
+    except ValueError:
+        reads_own_writes = False
+    return primary if reads_own_writes else replica
+
+
+def get_contract_service(db: AsyncSession = Depends(get_write_db)) -> AsyncContractService:
     """Dependency to get contract service"""
-    return ContractService(db)
+    return AsyncContractService(db)
+
+
+def get_read_contract_service(db: AsyncSession = Depends(get_read_db)) -> AsyncContractService:
+    """Dependency to get contract service for read-only routes"""
+    return AsyncContractService(db)
 
 
-def get_category_service(db: Session = Depends(get_db)) -> CategoryService:
+def get_category_service(db: AsyncSession = Depends(get_write_db)) -> AsyncCategoryService:
     """Dependency to get category service"""
-    return CategoryService(db)
+    return AsyncCategoryService(db)
+
+
+def get_read_category_service(db: AsyncSession = Depends(get_read_db)) -> AsyncCategoryService:
+    """Dependency to get category service for read-only routes"""
+    return AsyncCategoryService(db)
 
 
 def get_pagination_params(
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=10, description="Items per page (max 10)"),
-    sort_by: str = Query("start_date", description="Field to sort by"),
-    sort_dir: str = Query("desc", pattern="^(asc|desc)$", description="Sort direction")
+    sort_by: str = Query("start_date", description="Field to sort by, or 'relevance' together with q"),
+    sort_dir: str = Query("desc", pattern="^(asc|desc)$", description="Sort direction"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from a previous response's next_cursor"),
+    include_total: str = Query(
+        "exact", pattern="^(false|exact|estimate)$",
+        description="Count matches exactly, reuse a cached count (estimate) or skip counting (false)"
+    )
 ) -> PaginationParams:
     """Dependency to get pagination parameters"""
     return PaginationParams(
         page=page,
         page_size=page_size,
         sort_by=sort_by,
-        sort_dir=sort_dir
+        sort_dir=sort_dir,
+        cursor=cursor,
+        include_total=include_total
     )
 
 
@@ -45,7 +102,7 @@ def get_contract_filters(
     start_date_to: Optional[date] = Query(None, description="Start date to (YYYY-MM-DD)"),
     end_date_from: Optional[date] = Query(None, description="End date from (YYYY-MM-DD)"),
     end_date_to: Optional[date] = Query(None, description="End date to (YYYY-MM-DD)"),
-    q: Optional[str] = Query(None, description="Text search across contract fields")
+    q: Optional[str] = Query(None, description="Full-text search across contract fields (prefix match per word)")
 ) -> ContractFilters:
     """Dependency to get contract filters"""
     return ContractFilters(
@@ -62,6 +119,19 @@ def get_contract_filters(
     )
 
 
+def get_history_filters(
+    changed_by: Optional[str] = Query(None, description="Only changes made by this user"),
+    changed_from: Optional[datetime] = Query(None, description="Changed at or after (ISO 8601)"),
+    changed_to: Optional[datetime] = Query(None, description="Changed at or before (ISO 8601)")
+) -> ChangeHistoryFilters:
+    """Dependency to get change history filters"""
+    return ChangeHistoryFilters(
+        changed_by=changed_by,
+        changed_from=changed_from,
+        changed_to=changed_to
+    )
+
+
 def verify_delete_confirmation(
     confirmation: bool = Query(False, description="Must be true to confirm deletion")
 ) -> bool:
@@ -71,4 +141,65 @@ def verify_delete_confirmation(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Delete confirmation required. Add ?confirmation=true to the request."
         )
-    return confirmation
\ No newline at end of file
+    return confirmation
+
+
+def get_if_match_version(
+    if_match: Optional[str] = Header(None, description="ETag of the version being modified")
+) -> Optional[int]:
+    """Dependency to get the contract version required by an If-Match header"""
+    if if_match is None:
+        return None
+    try:
+        return parse_etag(if_match)
+    except ValueError:
+        # Nothing we issued can match a malformed tag
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match must be an ETag returned by this API"
+        )
+
+
+def get_contract_fields(
+    fields: Optional[str] = Query(
+        None, description="Comma-separated contract fields to return (id is always included)"
+    )
+) -> Optional[FrozenSet[str]]:
+    """Dependency to get the sparse fieldset requested with ?fields="""
+    if fields is None:
+        return None
+    requested = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    unknown = requested.difference(CONTRACT_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(CONTRACT_FIELDS)}"
+        )
+    return requested
+
+
+def get_contract_facets(
+    facets: Optional[str] = Query(
+        None, description=f"Comma-separated facets to count ({', '.join(FACET_FIELDS)})"
+    )
+) -> Optional[FrozenSet[str]]:
+    """Dependency to get the facets requested with ?facets="""
+    if facets is None:
+        return None
+    requested = frozenset(name.strip() for name in facets.split(",") if name.strip())
+    unknown = requested.difference(FACET_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown facets: {', '.join(sorted(unknown))}. Allowed: {', '.join(FACET_FIELDS)}"
+        )
+    return requested
+
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Dependency to guard the admin endpoints with the profiling token"""
+    if not settings.profiling_token:
+        # Admin endpoints do not exist until a token is configured
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), settings.profiling_token.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or missing X-Admin-Token")
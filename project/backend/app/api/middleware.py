@@ -0,0 +1,226 @@
+"""
+ASGI middleware for request instrumentation
+"""
+from urllib.parse import parse_qs
+import cProfile
+import logging
+import pstats
+import random
+import secrets
+import time
+import tracemalloc
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+from ..utils import metrics
+from ..utils.profiling import (
+    APP_ROOT, allocation_summary, end_profile, function_summary, new_profile_id, profile_store,
+    start_allocation_tracing, start_profile
+)
+from ..utils.query_stats import current_request_stats, end_request_stats, start_request_stats, statement_preview
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Route label for requests no route matched (404s), so arbitrary paths do not create series
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_label(scope: Scope) -> str:
+    """Path template of the route that handled the request"""
+    return getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """
+    Record per-route latency, status, body sizes and in-flight requests.
+
+    A plain ASGI middleware rather than BaseHTTPMiddleware, so it adds no task
+    or response buffering per request. Requests are labeled with the matched
+    route's path template, which FastAPI's router leaves in the scope, so ids
+    in URLs do not create new series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500  # Unless a response starts, the request failed
+        request_size = response_size = 0
+
+        async def counting_receive() -> Message:
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Message) -> None:
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.http_requests_in_progress.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            duration = time.perf_counter() - started
+            metrics.http_requests_in_progress.dec((method,))
+            route = route_label(scope)
+            labels = (method, route, str(status_code))
+            metrics.http_requests_total.inc(labels)
+            metrics.http_request_duration_seconds.observe(labels, duration)
+            metrics.http_request_size_bytes.observe((method, route), request_size)
+            metrics.http_response_size_bytes.observe((method, route), response_size)
+
+
+class QueryStatsMiddleware:
+    """
+    Count the SQL statements each request executes.
+
+    Responses get a ``Server-Timing`` header with the DB time, statement count
+    and slowest statement, and per-route query count and DB time histograms
+    are recorded. Statements a single request runs at least
+    ``settings.sql_repeated_statement_threshold`` times, the usual sign of an
+    N+1 loop, are logged and counted.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = start_request_stats()
+
+        async def timing_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timing_send)
+        finally:
+            end_request_stats(token)
+            method, route = scope["method"], route_label(scope)
+            metrics.http_request_db_queries.observe((method, route), stats.count)
+            metrics.http_request_db_seconds.observe((method, route), stats.total_seconds)
+            threshold = settings.sql_repeated_statement_threshold
+            for statement, executions in stats.repeated(threshold) if threshold else ():
+                metrics.db_repeated_statements_total.inc((method, route))
+                logger.warning(
+                    "Possible N+1: %s %s ran this statement %d times: %s",
+                    method, route, executions, statement_preview(statement)
+                )
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests on demand and store the results for the admin endpoints.
+
+    A request is profiled when it carries ``settings.profiling_token`` in the
+    ``X-Profile`` header or the ``profile`` query parameter, or at random at
+    ``settings.profiling_sample_rate``. It then runs under cProfile and
+    tracemalloc, with wall time split between the route, service and
+    repository layers (see utils.profiling), and the response names the
+    stored profile in ``X-Profile-Id``. One request is profiled at a time:
+    cProfile and tracemalloc are process wide, so concurrent requests on the
+    event loop can show up in the function profile, but not in the layer
+    times. Only installed when ``settings.profiling_enabled`` is set.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._busy = False
+
+    def _trigger(self, scope: Scope) -> str:
+        """Why this request should be profiled, or an empty string"""
+        token = settings.profiling_token
+        if token:
+            supplied = Headers(scope=scope).get(PROFILE_HEADER)
+            if supplied is None and b"profile=" in scope["query_string"]:
+                supplied = parse_qs(scope["query_string"].decode("latin-1")).get(PROFILE_QUERY_PARAM, [None])[0]
+            if supplied is not None and secrets.compare_digest(supplied.encode(), token.encode()):
+                return "token"
+        if settings.profiling_sample_rate and random.random() < settings.profiling_sample_rate:
+            return "sample"
+        return ""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._busy:
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if not trigger:
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        profile_id = new_profile_id()
+        status_code = 500
+        query_stats = current_request_stats()  # Set by QueryStatsMiddleware when installed outside
+
+        async def profiled_send(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, profile_id)
+            await send(message)
+
+        layers, token = start_profile()
+        started_tracing = start_allocation_tracing()
+        allocations_before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            profiler.disable()
+            wall_seconds = time.perf_counter() - started
+            end_profile(token)
+            allocations = allocation_summary(allocations_before, tracemalloc.take_snapshot())
+            if started_tracing:
+                tracemalloc.stop()
+            stats = pstats.Stats(profiler)
+            summary = {
+                "id": profile_id,
+                "created_at": time.time(),
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_label(scope),
+                "status_code": status_code,
+                "wall_ms": round(wall_seconds * 1000, 3),
+                "layers": layers.layers(wall_seconds),
+                "db": {
+                    "queries": query_stats.count,
+                    "total_ms": round(query_stats.total_seconds * 1000, 3),
+                } if query_stats is not None else None,
+                "allocations": allocations,
+                "functions": function_summary(stats),
+                "app_functions": function_summary(stats, APP_ROOT),
+            }
+            try:
+                await run_in_threadpool(profile_store().save, summary, stats)
+            except OSError:
+                logger.exception("Could not store profile %s", profile_id)
+            finally:
+                self._busy = False
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from typing import Any, Dict
+
+from ...utils.profiling import profile_store
+from ...utils.responses import FastJSONResponse
+from ..dependencies import verify_admin_token
+
+# Admin router, every route guarded by X-Admin-Token
+admin_router = APIRouter(
+    prefix="/admin", tags=["admin"], default_response_class=FastJSONResponse,
+    dependencies=[Depends(verify_admin_token)]
+)
+
+# Summary fields shown in the profile list
+PROFILE_LIST_FIELDS = ("id", "created_at", "trigger", "method", "path", "route", "status_code", "wall_ms")
+
+
+@admin_router.get("/profiles")
+async def list_profiles() -> Dict[str, Any]:
+    """
+    List stored request profiles, newest first.
+
+    Profiles are recorded by the profiling middleware for requests sent with
+    the X-Profile header (or ?profile=) and for sampled requests.
+    """
+    profiles = profile_store().list()
+    return {"items": [{field: profile.get(field) for field in PROFILE_LIST_FIELDS} for profile in profiles]}
+
+
+@admin_router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str) -> Dict[str, Any]:
+    """
+    Get a profile summary.
+
+    Includes wall time per layer (route, service, repository), SQL statement
+    totals, allocation deltas and the slowest functions overall and in the app package.
+    """
+    summary = profile_store().get(profile_id)
+    if summary is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile {profile_id} not found")
+    return summary
+
+
+@admin_router.get("/profiles/{profile_id}/download")
+async def download_profile(profile_id: str) -> FileResponse:
+    """
+    Download a profile's pstats dump.
+
+    Open it with `python -m pstats <file>` or a viewer such as snakeviz.
+    """
+    path = profile_store().dump_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile {profile_id} not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
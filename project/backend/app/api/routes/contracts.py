@@ -1,36 +1,44 @@
-from fastapi import APIRouter, Depends, status
-from typing import List
+from fastapi import APIRouter, Depends, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import FrozenSet, List, Optional, Union
 
 from ...schemas.contract import (
     Category, CategoryCreate, CategoryUpdate,
-    Contract, ContractCreate, ContractUpdate, PaginatedResponse, ContractFilters, PaginationParams
+    Contract, ContractCreate, ContractUpdate, PaginatedResponse, ContractFilters, PaginationParams,
+    ContractBulkRequest, ContractBulkResponse, ContractBatchGetRequest, ContractBatchGetResponse,
+    ContractSummary, SupplierSuggestResponse, SUPPLIER_SUGGEST_MAX_LIMIT,
+    ChangeHistoryFilters, ChangeHistoryPage, HISTORY_MAX_PAGE_SIZE
 )
-from ...services.contract import CategoryService, ContractService
+from ...services.contract import AsyncCategoryService, AsyncContractService
+from ...utils.etag import format_etag
+from ...utils.responses import FastJSONResponse
+from ...utils.export import EXPORT_MEDIA_TYPES
 from ..dependencies import (
-    get_category_service, get_contract_service, verify_delete_confirmation,
-    get_pagination_params, get_contract_filters
+    get_category_service, get_contract_service, get_read_category_service, get_read_contract_service,
+    verify_delete_confirmation, get_pagination_params, get_contract_filters, get_if_match_version,
+    get_history_filters, get_contract_fields, get_contract_facets
 )
 
 # Category router
-category_router = APIRouter(prefix="/categories", tags=["categories"])
+category_router = APIRouter(prefix="/categories", tags=["categories"], default_response_class=FastJSONResponse)
 
 
 @category_router.get("/", response_model=List[Category])
 async def list_categories(
-    category_service: CategoryService = Depends(get_category_service)
+    category_service: AsyncCategoryService = Depends(get_read_category_service)
 ) -> List[Category]:
     """
     Get all categories.
     
     Returns a list of all available contract categories.
     """
-    return category_service.get_all_categories()
+    return await category_service.get_all_categories()
 
 
 @category_router.post("/", response_model=Category, status_code=status.HTTP_201_CREATED)
 async def create_category(
     category_data: CategoryCreate,
-    category_service: CategoryService = Depends(get_category_service)
+    category_service: AsyncCategoryService = Depends(get_category_service)
 ) -> Category:
     """
     Create a new category.
@@ -38,27 +46,27 @@ async def create_category(
     - **name**: Category name (must be unique)
     - **description**: Optional category description
     """
-    return category_service.create_category(category_data)
+    return await category_service.create_category(category_data)
 
 
 @category_router.get("/{category_id}", response_model=Category)
 async def get_category(
     category_id: int,
-    category_service: CategoryService = Depends(get_category_service)
+    category_service: AsyncCategoryService = Depends(get_read_category_service)
 ) -> Category:
     """
     Get a specific category by ID.
     
     - **category_id**: Unique category identifier
     """
-    return category_service.get_category(category_id)
+    return await category_service.get_category(category_id)
 
 
 @category_router.put("/{category_id}", response_model=Category)
 async def update_category(
     category_id: int,
     category_data: CategoryUpdate,
-    category_service: CategoryService = Depends(get_category_service)
+    category_service: AsyncCategoryService = Depends(get_category_service)
 ) -> Category:
     """
     Update an existing category.
@@ -67,13 +75,13 @@ async def update_category(
     - **name**: New category name (optional)
     - **description**: New category description (optional)
     """
-    return category_service.update_category(category_id, category_data)
+    return await category_service.update_category(category_id, category_data)
 
 
 @category_router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_category(
     category_id: int,
-    category_service: CategoryService = Depends(get_category_service),
+    category_service: AsyncCategoryService = Depends(get_category_service),
     _: bool = Depends(verify_delete_confirmation)
 ):
     """
@@ -84,19 +92,43 @@ async def delete_category(
     
     Note: Cannot delete categories that have associated contracts.
     """
-    category_service.delete_category(category_id)
+    await category_service.delete_category(category_id)
+
+
+# Supplier router
+supplier_router = APIRouter(prefix="/suppliers", tags=["suppliers"], default_response_class=FastJSONResponse)
+
+
+@supplier_router.get("/suggest", response_model=SupplierSuggestResponse)
+async def suggest_suppliers(
+    prefix: str = Query(..., min_length=1, max_length=200, description="Start of the supplier name"),
+    limit: int = Query(10, ge=1, le=SUPPLIER_SUGGEST_MAX_LIMIT, description="Maximum suggestions"),
+    contract_service: AsyncContractService = Depends(get_read_contract_service)
+) -> FastJSONResponse:
+    """
+    Suggest suppliers for a typeahead.
+    
+    Matches the start of supplier names, ignoring case and accents, and lists
+    the suppliers with the most contracts first. Served from an in-memory index
+    rather than the contracts table.
+    """
+    result = await contract_service.suggest_suppliers(prefix, limit)
+    return FastJSONResponse(result.model_dump())
 
 
 # Contracts router
-router = APIRouter(prefix="/contracts", tags=["contracts"])
+router = APIRouter(prefix="/contracts", tags=["contracts"], default_response_class=FastJSONResponse)
 
 
 @router.get("/", response_model=PaginatedResponse)
 async def list_contracts(
     filters: ContractFilters = Depends(get_contract_filters),
     pagination: PaginationParams = Depends(get_pagination_params),
-    contract_service: ContractService = Depends(get_contract_service)
-) -> PaginatedResponse:
+    highlight: bool = Query(False, description="Return highlighted snippets for the q search"),
+    fields: Optional[FrozenSet[str]] = Depends(get_contract_fields),
+    facets: Optional[FrozenSet[str]] = Depends(get_contract_facets),
+    contract_service: AsyncContractService = Depends(get_read_contract_service)
+) -> FastJSONResponse:
     """
     List contracts with filtering, search, and pagination.
     
@@ -107,36 +139,132 @@ async def list_contracts(
     - **min_value/max_value**: Filter by value range
     - **start_date_from/start_date_to**: Filter by start date range
     - **end_date_from/end_date_to**: Filter by end date range
-    - **q**: Text search across contract_number, supplier, description, responsible
+    - **q**: Full-text search across contract_number, supplier, description, responsible.
+      Every word must match the start of a word in one of those fields.
+    - **highlight**: With q, return `highlights` mapping contract id to a snippet
+      with the matched terms wrapped in `<mark>`
     
     **Pagination:**
     - **page**: Page number (starts from 1)
     - **page_size**: Items per page (max 10)
-    - **sort_by**: Field to sort by (start_date, end_date, created_at, etc.)
+    - **sort_by**: Field to sort by (start_date, end_date, created_at, etc.),
+      or `relevance` to rank q matches (offset pages only)
+    - **include_total**: `exact` (default) counts all matches, `estimate` reuses a cached
+      count for the same filters when available, `false` skips counting. `total_mode`
+      reports which one produced `total`; `has_next` is always set.
     - **sort_dir**: Sort direction (asc/desc)
+    - **cursor**: Keyset cursor taken from `next_cursor`; pages by seeking instead of
+      offsetting, so deep pages stay fast. Must be used with the same sort_by/sort_dir.
+    
+    **Fields:**
+    - **fields**: Comma-separated contract fields to return, e.g. `fields=contract_number,status`.
+      Only those columns are read; `category` adds the joined category. `id` is always included.
+    
+    **Facets:**
+    - **facets**: Comma-separated facets to count, e.g. `facets=status,category_id,year`.
+      `facets` maps each to `{value, count}` buckets, most contracts first, counted under
+      all filters except the facet's own (`year`, the start year, ignores the start date
+      range), so every bucket shows what selecting it would return. Counts are cached per
+      filter set until the next write.
+    """
+    page = await contract_service.list_contracts(filters, pagination, highlight, fields, facets)
+    # Already validated by the service: encode directly instead of re-validating against response_model
+    return FastJSONResponse(page.model_dump())
+
+
+@router.get("/summary", response_model=ContractSummary)
+async def get_contract_summary(
+    expiring_within_days: int = Query(30, ge=0, le=3650, description="Window for the expiring-soon count"),
+    contract_service: AsyncContractService = Depends(get_read_contract_service)
+) -> ContractSummary:
+    """
+    Dashboard metrics over all contracts.
+    
+    Returns contract counts and value sums by status, by category and by start
+    month (YYYY-MM), plus how many active contracts end within the next
+    **expiring_within_days** days. Aggregates are kept up to date on every write.
     """
-    return contract_service.list_contracts(filters, pagination)
+    return await contract_service.get_summary(expiring_within_days)
+
+
+@router.get("/export")
+async def export_contracts(
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Export format"),
+    sort_by: str = Query("start_date", description="Field to sort by"),
+    sort_dir: str = Query("desc", pattern="^(asc|desc)$", description="Sort direction"),
+    filters: ContractFilters = Depends(get_contract_filters),
+    contract_service: AsyncContractService = Depends(get_read_contract_service)
+) -> StreamingResponse:
+    """
+    Export every contract matching the filters.
+    
+    - **format**: `csv` (with header row) or `ndjson` (one JSON object per line)
+    - Accepts the same filters as the contract list; there is no page size limit
+    
+    Rows are streamed from a server-side cursor, so memory use stays flat no
+    matter how many contracts match.
+    """
+    return StreamingResponse(
+        contract_service.export_contracts(filters, format, sort_by, sort_dir),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="contracts.{format}"'}
+    )
 
 
 @router.get("/{contract_id}", response_model=Contract)
 async def get_contract(
     contract_id: str,
-    contract_service: ContractService = Depends(get_contract_service)
-) -> Contract:
+    response: Response,
+    fields: Optional[FrozenSet[str]] = Depends(get_contract_fields),
+    contract_service: AsyncContractService = Depends(get_read_contract_service)
+) -> Union[Contract, FastJSONResponse]:
     """
     Get a specific contract by ID.
     
     - **contract_id**: Unique contract identifier (UUID format)
+    - **fields**: Optional comma-separated contract fields to return (id is always included)
     
-    Returns detailed contract information including category details.
+    Returns detailed contract information including category details. The `ETag`
+    header carries the contract version for conditional updates; with `fields` it
+    is only sent when `version` is among them.
     """
-    return contract_service.get_contract(contract_id)
+    contract = await contract_service.get_contract(contract_id, fields)
+    if fields is not None:
+        # Partial schema: bypass response_model, which would require every field
+        headers = {"ETag": format_etag(contract.version)} if "version" in fields else None
+        return FastJSONResponse(contract.model_dump(), headers=headers)
+    response.headers["ETag"] = format_etag(contract.version)
+    return contract
+
+
+@router.get("/{contract_id}/history", response_model=ChangeHistoryPage)
+async def get_contract_history(
+    contract_id: str,
+    page_size: int = Query(20, ge=1, le=HISTORY_MAX_PAGE_SIZE, description=f"Items per page (max {HISTORY_MAX_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from a previous response's next_cursor"),
+    filters: ChangeHistoryFilters = Depends(get_history_filters),
+    contract_service: AsyncContractService = Depends(get_read_contract_service)
+) -> ChangeHistoryPage:
+    """
+    Get the change history of a contract, newest first.
+    
+    - **contract_id**: Unique contract identifier (UUID format)
+    - **changed_by**: Only changes made by this user
+    - **changed_from/changed_to**: Only changes within this time range
+    - **page_size**: Entries per page (max 100)
+    - **cursor**: Keyset cursor taken from `next_cursor` to fetch the next page
+    
+    Pages seek from the cursor instead of offsetting, so every page costs the
+    same regardless of how long the history is.
+    """
+    return await contract_service.get_contract_history(contract_id, filters, page_size, cursor)
 
 
 @router.post("/", response_model=Contract, status_code=status.HTTP_201_CREATED)
 async def create_contract(
     contract_data: ContractCreate,
-    contract_service: ContractService = Depends(get_contract_service)
+    response: Response,
+    contract_service: AsyncContractService = Depends(get_contract_service)
 ) -> Contract:
     """
     Create a new contract.
@@ -153,14 +281,56 @@ async def create_contract(
     
     Returns the created contract with generated ID and timestamps.
     """
-    return contract_service.create_contract(contract_data)
+    contract = await contract_service.create_contract(contract_data)
+    response.headers["ETag"] = format_etag(contract.version)
+    return contract
+
+
+@router.post("/bulk", response_model=ContractBulkResponse)
+async def bulk_create_contracts(
+    bulk_data: ContractBulkRequest,
+    contract_service: AsyncContractService = Depends(get_contract_service)
+) -> ContractBulkResponse:
+    """
+    Create many contracts in a single transaction.
+    
+    - **items**: Up to 1000 contracts, each with the same fields as a single create
+    - **upsert**: When true, items whose contract_number already exists update that
+      contract instead of failing
+    
+    Returns one result per item (created, updated, unchanged or error) in input order.
+    Items with a duplicate number or unknown category are reported as errors without
+    affecting the rest of the batch.
+    """
+    return await contract_service.bulk_create_contracts(bulk_data)
+
+
+@router.post(":batchGet", response_model=ContractBatchGetResponse)
+async def batch_get_contracts(
+    batch_request: ContractBatchGetRequest,
+    contract_service: AsyncContractService = Depends(get_read_contract_service)
+) -> FastJSONResponse:
+    """
+    Get many contracts in one call.
+    
+    - **ids**: Up to 1000 contract ids (or contract numbers)
+    - **by**: `id` (default) or `contract_number`, what the ids are matched against
+    
+    Returns one item per requested id in request order, with `found` false and no
+    `contract` for ids that do not exist; those are also listed in `missing`.
+    """
+    result = await contract_service.batch_get_contracts(batch_request)
+    # Already validated by the service: encode directly instead of re-validating against response_model
+    return FastJSONResponse(result.model_dump())
 
 
 @router.put("/{contract_id}", response_model=Contract)
 async def update_contract(
     contract_id: str,
     contract_data: ContractUpdate,
-    contract_service: ContractService = Depends(get_contract_service)
+    response: Response,
+    expected_version: Optional[int] = Depends(get_if_match_version),
+    contract_service: AsyncContractService = Depends(get_contract_service)
 ) -> Contract:
     """
     Update an existing contract.
@@ -178,14 +348,24 @@ async def update_contract(
     
     Only provided fields will be updated. Returns the updated contract with new timestamps.
     Creates a change history record for tracking modifications.
+    
+    Send the `ETag` from a previous read as `If-Match` to make the update conditional:
+    if the contract changed since then the response is **412 Precondition Failed**
+    and nothing is written. Without `If-Match` an update that races a concurrent one
+    is applied on top of it, or answered with **409 Conflict** if the race repeats.
+    Concurrent updates never silently overwrite each other.
     """
-    return contract_service.update_contract(contract_id, contract_data)
+    contract = await contract_service.update_contract(
+        contract_id, contract_data, expected_version=expected_version
+    )
+    response.headers["ETag"] = format_etag(contract.version)
+    return contract
 
 
 @router.delete("/{contract_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_contract(
     contract_id: str,
-    contract_service: ContractService = Depends(get_contract_service),
+    contract_service: AsyncContractService = Depends(get_contract_service),
     _: bool = Depends(verify_delete_confirmation)
 ):
     """
@@ -200,4 +380,4 @@ async def delete_contract(
     **Warning**: This is a destructive operation that will permanently delete
     the contract and all associated data.
     """
-    contract_service.delete_contract(contract_id)
\ No newline at end of file
+    await contract_service.delete_contract(contract_id)
\ No newline at end of file
@@ -1,12 +1,53 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
     project_name: str = "Contract Management API"
     api_v1_str: str = "/api/v1"
     database_url: str = "sqlite:///./contracts.db"
+    async_database_url: Optional[str] = None  # Derived from database_url when unset
     debug: bool = True
+    full_text_search: bool = True  # Use the SQLite FTS5 index for the q filter
+    count_cache_ttl_seconds: float = 30.0  # Lifetime of counts served for include_total=estimate
+    facet_cache_ttl_seconds: float = 30.0  # Lifetime of cached ?facets= counts; any contract write invalidates them sooner
+    export_batch_size: int = 1000  # Rows fetched per round-trip when streaming exports
+    # SQLite performance profile, applied to every new connection (sqlite_pragmas=False keeps SQLite defaults)
+    sqlite_pragmas: bool = True
+    sqlite_journal_mode: str = "wal"  # WAL lets readers proceed while a write is in progress
+    sqlite_synchronous: str = "normal"  # NORMAL is durable across app crashes in WAL mode; FULL also survives power loss
+    sqlite_mmap_size: int = 256 * 1024 * 1024  # Bytes of the database file read through memory mapping
+    sqlite_cache_size: int = -64000  # Page cache per connection; negative values are KiB
+    sqlite_busy_timeout_ms: int = 5000  # Wait this long for a lock instead of failing with "database is locked"
+    sqlite_temp_store: str = "memory"  # Temporary tables and sort spills
+    sqlite_foreign_keys: bool = True  # Enforce FOREIGN KEY constraints, which SQLite leaves off by default
+    sqlite_single_writer: bool = True  # Route writes through one dedicated connection (file databases only)
+    sqlite_reader_pool_size: int = 8  # Pooled asyncio reader connections
+    read_replica_urls: List[str] = []  # Read-only copies of database_url that serve GET requests
+    read_your_writes_seconds: float = 5.0  # After a write, the client's reads use the primary this long
+    audit_write_behind: bool = False  # Queue change history rows and insert them in background batches
+    audit_batch_size: int = 200  # Max change history rows per background INSERT
+    audit_flush_interval_ms: int = 50  # Max time a queued change history row waits for its batch
+    audit_queue_size: int = 10000  # Queued rows before writes fall back to the request transaction
+    audit_journal_dir: str = "./audit_journal"  # Queued rows are journaled here and replayed after a crash; "" disables
+    audit_journal_fsync: bool = True  # fsync the journal once per event loop tick so it survives power loss, not just crashes
+    metrics_enabled: bool = True  # Record request metrics and serve them at /metrics
+    metrics_multiprocess_dir: Optional[str] = None  # Shared directory for per-worker snapshots when running several workers
+    metrics_snapshot_interval_seconds: float = 1.0  # How often each worker refreshes its snapshot file
+    sql_instrumentation: bool = True  # Count statements per request (Server-Timing header, metrics, N+1 warnings)
+    sql_slow_query_ms: float = 200.0  # Log statements slower than this; 0 disables the slow query log
+    sql_repeated_statement_threshold: int = 5  # Warn when one request runs the same statement this often; 0 disables
+    supplier_index_reload_seconds: float = 300.0  # Rebuild the supplier typeahead index to pick up other workers' writes; 0 disables
+    profiling_enabled: bool = False  # Install the profiling middleware; when off, profiling costs nothing
+    profiling_token: Optional[str] = None  # Secret for X-Profile header / ?profile= requests and the admin profile endpoints
+    profiling_sample_rate: float = 0.0  # Fraction of requests profiled without a token, for always-on low-rate profiling
+    profiling_dir: str = "./profiles"  # Where profiles are stored, shared by all workers
+    profiling_max_profiles: int = 100  # Newest profiles kept on disk
+    serve_workers: int = 0  # serve.py worker processes; 0 starts one per CPU available to the process
+    serve_max_requests: int = 10000  # Recycle a worker after this many requests; 0 disables
+    serve_max_requests_jitter: int = 1000  # Up to this many extra requests per worker, so workers don't recycle together
+    serve_max_worker_memory_mb: int = 0  # Recycle a worker whose resident memory exceeds this; 0 disables
+    serve_graceful_timeout_seconds: float = 30.0  # Time a stopping worker gets to finish in-flight requests
     
     class Config:
         env_file = ".env"
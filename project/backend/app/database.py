@@ -1,17 +1,153 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from typing import Any, Dict, Optional
+import itertools
+import sqlite3
 from .config import settings
+from .utils.query_stats import instrument_engine
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Map a sync database URL onto its asyncio driver (sqlite -> aiosqlite)"""
+    if database_url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + database_url[len("sqlite://"):]
+    return database_url
+
+
+def is_sqlite_file(database_url: str) -> bool:
+    """Whether a URL points at an on-disk SQLite database (not :memory:)"""
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """The configured SQLite performance profile as PRAGMA name -> value"""
+    if not settings.sqlite_pragmas:
+        return {}
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "mmap_size": settings.sqlite_mmap_size,
+        "cache_size": settings.sqlite_cache_size,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "temp_store": settings.sqlite_temp_store,
+        "foreign_keys": "ON" if settings.sqlite_foreign_keys else "OFF",
+    }
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: Optional[Dict[str, Any]] = None) -> None:
+    """Run PRAGMAs (default: the configured profile) on every new connection of an SQLite engine"""
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class RoutingSession(Session):
+    """
+    Session that sends writes to a dedicated writer engine (``info["write_bind"]``).
+
+    Reads use the regular bind until the transaction first writes; from then on
+    every statement in that transaction goes to the writer so it sees its own
+    uncommitted changes. Without a write bind it behaves like a plain Session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        write_bind = self.info.get("write_bind")
+        if write_bind is not None and (
+            self.info.get("writing") or self._flushing or isinstance(clause, UpdateBase)
+        ):
+            self.info["writing"] = True
+            return write_bind
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_write_routing(session, transaction):
+    """Send the next transaction's reads back to the reader pool"""
+    if transaction.parent is None:
+        session.info.pop("writing", None)
+
+
+# SQLite allows one writer at a time; funnelling writes through one pooled
+# connection queues them in-process instead of contending for the file lock
+single_writer = settings.sqlite_single_writer and is_sqlite_file(settings.database_url)
 
 engine = create_engine(
     settings.database_url,
     connect_args={"check_same_thread": False}  # SQLite specific
 )
+apply_sqlite_pragmas(engine)
+
+write_engine = engine
+if single_writer:
+    write_engine = create_engine(
+        settings.database_url,
+        connect_args={"check_same_thread": False},
+        pool_size=1,
+        max_overflow=0
+    )
+    apply_sqlite_pragmas(write_engine)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=RoutingSession,
+    info={"write_bind": write_engine} if single_writer else {}
+)
 
 Base = declarative_base()
 
+async_database_url = settings.async_database_url or get_async_database_url(settings.database_url)
+reader_pool: Dict[str, Any] = {}
+if single_writer:
+    reader_pool = {"poolclass": AsyncAdaptedQueuePool, "pool_size": settings.sqlite_reader_pool_size}
+async_engine = create_async_engine(async_database_url, **reader_pool)
+apply_sqlite_pragmas(async_engine.sync_engine)
+
+async_write_engine = async_engine
+if single_writer:
+    async_write_engine = create_async_engine(
+        async_database_url, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0
+    )
+    apply_sqlite_pragmas(async_write_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, sync_session_class=RoutingSession,
+    info={"write_bind": async_write_engine.sync_engine} if single_writer else {}
+)
+
+# Read replicas serve read-only requests; with none configured those use the primary
+replica_engines = []
+for replica_url in settings.read_replica_urls:
+    replica_engine = create_async_engine(get_async_database_url(replica_url))
+    apply_sqlite_pragmas(replica_engine.sync_engine, {
+        name: value for name, value in sqlite_pragmas().items() if name != "journal_mode"
+    })
+    replica_engines.append(replica_engine)
+
+# Statement timing (request stats, slow query log) on the app's own engines only
+if settings.sql_instrumentation or settings.sql_slow_query_ms:
+    for instrumented_engine in {engine, write_engine, async_engine.sync_engine, async_write_engine.sync_engine}:
+        instrument_engine(instrumented_engine)
+    for replica_engine in replica_engines:
+        instrument_engine(replica_engine.sync_engine)
+
+ReplicaSessionLocals = [
+    async_sessionmaker(bind=replica_engine, class_=AsyncSession, autoflush=False)
+    for replica_engine in replica_engines
+]
+_replica_rotation = itertools.cycle(ReplicaSessionLocals or [AsyncSessionLocal])
+
 
 def get_db():
     """Dependency to get database session"""
@@ -22,6 +158,76 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency to get an asyncio database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_replica_db():
+    """Dependency to get an asyncio session on the next read replica (the primary if none)"""
+    async with next(_replica_rotation)() as db:
+        yield db
+
+
+def dispose_engines() -> None:
+    """
+    Close the pooled connections of the synchronous engines, e.g. in a pre-fork
+    master after startup work: an SQLite connection must never be used on both
+    sides of a fork, so each worker opens its own.
+    """
+    for sync_engine in {engine, write_engine}:
+        sync_engine.dispose()
+
+
+def backup_sqlite_database(source_url: str, target_url: str) -> None:
+    """
+    Copy one SQLite database file onto another with the online backup API.
+
+    The copy is a consistent snapshot even while the source is being written;
+    running it periodically keeps a local read replica in sync.
+    """
+    source = sqlite3.connect(make_url(source_url).database)
+    target = sqlite3.connect(make_url(target_url).database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+# Columns whose ix_contracts_<column> index older databases still have, although
+# a (column, id) keyset index covers it (contract_number's is kept: it enforces uniqueness)
+REDUNDANT_CONTRACT_INDEX_COLUMNS = ("supplier", "status", "value", "start_date", "end_date", "created_at")
+
+
 def create_tables():
     """Create all tables"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from .models.generation import create_data_generation
+    from .models.indexes import apply_managed_indexes
+    from .models.search import create_search_index
+    from .repositories.contract import SummaryRepository
+
+    inspector = inspect(engine)
+    summary_missing = not inspector.has_table("contract_summary")
+    version_missing = inspector.has_table("contracts") and "version" not in {
+        column["name"] for column in inspector.get_columns("contracts")
+    }
+    Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so older databases need the version column added
+    if version_missing:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE contracts ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+    # ... the search index, the data generation counter and the advisor-managed indexes,
+    # minus single-column indexes now covered by the (column, id) keyset indexes
+    with engine.begin() as connection:
+        for column in REDUNDANT_CONTRACT_INDEX_COLUMNS:
+            connection.execute(text(f"DROP INDEX IF EXISTS ix_contracts_{column}"))
+        create_search_index(connection)
+        create_data_generation(connection)
+        apply_managed_indexes(connection)
+    # ... and a summary table populated from their existing contracts
+    if summary_missing:
+        with SessionLocal() as db:
+            SummaryRepository(db).rebuild()
+            db.commit()
@@ -1,10 +1,18 @@
-from fastapi import FastAPI, HTTPException, status
+import asyncio
+
+from fastapi import FastAPI, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import ValidationError
 
 from .config import settings
-from .database import create_tables
-from .api.routes.contracts import router as contracts_router, category_router
+from .database import SessionLocal, create_tables
+from .services.audit import audit_writer
+from .services.contract import ContractService
+from .utils import metrics
+from .utils.supplier_index import reload_periodically
+from .api.middleware import MetricsMiddleware, ProfilingMiddleware, QueryStatsMiddleware
+from .api.routes.contracts import router as contracts_router, category_router, supplier_router
+from .api.routes.admin import admin_router
 from .api.exceptions import (
     ContractException, contract_exception_handler,
     http_exception_handler, validation_exception_handler,
@@ -29,6 +37,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in and innermost, so an unprofiled request pays nothing and a profile sees its query stats
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
+if settings.sql_instrumentation:
+    app.add_middleware(QueryStatsMiddleware)
+
+# Outermost, so latency covers every other middleware
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # Exception handlers
 app.add_exception_handler(ContractException, contract_exception_handler)
 app.add_exception_handler(HTTPException, http_exception_handler)
@@ -38,12 +57,49 @@ app.add_exception_handler(Exception, general_exception_handler)
 # Include routers
 app.include_router(contracts_router, prefix=settings.api_v1_str)
 app.include_router(category_router, prefix=settings.api_v1_str)
+app.include_router(supplier_router, prefix=settings.api_v1_str)
+app.include_router(admin_router, prefix=settings.api_v1_str)
+
+# Sessions for startup and background work outside requests; replace it along with the get_db override
+app.state.session_factory = SessionLocal
+
+
+def load_supplier_index() -> None:
+    """(Re)build the supplier typeahead index from the database"""
+    with app.state.session_factory() as db:
+        ContractService(db).load_supplier_index()
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
-    create_tables()
+    if not getattr(app.state, "database_ready", False):  # serve.py's master does this once for all workers
+        create_tables()
+    load_supplier_index()
+    if settings.supplier_index_reload_seconds:
+        app.state.supplier_index_reload = asyncio.create_task(
+            reload_periodically(load_supplier_index, settings.supplier_index_reload_seconds)
+        )
+    if settings.audit_write_behind:
+        audit_writer.start()
+    if settings.metrics_enabled and settings.metrics_multiprocess_dir:
+        app.state.metrics_snapshots = asyncio.create_task(metrics.write_snapshots(
+            metrics.registry, settings.metrics_multiprocess_dir, settings.metrics_snapshot_interval_seconds
+        ))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write out queued change history and this worker's final metrics before exiting"""
+    await audit_writer.stop()
+    tasks = [
+        task for task in (
+            getattr(app.state, "supplier_index_reload", None), getattr(app.state, "metrics_snapshots", None)
+        ) if task is not None
+    ]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
 @app.get("/")
@@ -57,6 +113,15 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Request metrics in Prometheus text format, merged across workers when configured"""
+    return Response(
+        metrics.registry.render(settings.metrics_multiprocess_dir),
+        media_type=metrics.PROMETHEUS_CONTENT_TYPE
+    )
+
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
@@ -1,3 +1,4 @@
-from .contract import Contract, Category, ChangeHistory, User, ContractStatus
+from .contract import Contract, Category, ChangeHistory, ContractSummary, AuditJournalCheckpoint, User, ContractStatus
+from . import search, generation
 
-__all__ = ["Contract", "Category", "ChangeHistory", "User", "ContractStatus"]
\ No newline at end of file
+__all__ = ["Contract", "Category", "ChangeHistory", "ContractSummary", "AuditJournalCheckpoint", "User", "ContractStatus"]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, JSON, Enum, Numeric
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, JSON, Enum, Numeric, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -23,29 +23,47 @@ class Category(Base):
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    # Relationships
-    contracts = relationship("Contract", back_populates="category")
+    # Relationships; a category's contracts are never nulled out, the foreign key refuses the delete instead
+    contracts = relationship("Contract", back_populates="category", passive_deletes="all")
 
 
 class Contract(Base):
     __tablename__ = "contracts"
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
-    contract_number = Column(String(100), unique=True, nullable=False, index=True)
-    supplier = Column(String(200), nullable=False, index=True)
+    contract_number = Column(String(100), unique=True, nullable=False)
+    supplier = Column(String(200), nullable=False)
     description = Column(Text, nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False, index=True)
     responsible = Column(String(200), nullable=False, index=True)
-    status = Column(Enum(ContractStatus), nullable=False, default=ContractStatus.DRAFT, index=True)
-    value = Column(Numeric(15, 2), nullable=False, index=True)
-    start_date = Column(Date, nullable=False, index=True)
-    end_date = Column(Date, nullable=False, index=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    status = Column(Enum(ContractStatus), nullable=False, default=ContractStatus.DRAFT)
+    value = Column(Numeric(15, 2), nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Optimistic concurrency: bumped by every update and exposed as the ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     category = relationship("Category", back_populates="contracts")
     change_history = relationship("ChangeHistory", back_populates="contract", cascade="all, delete-orphan")
+    
+    # Keyset pagination indexes: one (sort_field, id) pair per sortable column.
+    # Each also serves filters and lookups on its leading column, so those
+    # columns carry no single-column index of their own
+    __table_args__ = (
+        Index("idx_contract_start_date_id", "start_date", "id"),
+        Index("idx_contract_end_date_id", "end_date", "id"),
+        Index("idx_contract_created_at_id", "created_at", "id"),
+        Index("idx_contract_updated_at_id", "updated_at", "id"),
+        Index("idx_contract_number_id", "contract_number", "id"),
+        Index("idx_contract_supplier_id", "supplier", "id"),
+        Index("idx_contract_value_id", "value", "id"),
+        Index("idx_contract_status_id", "status", "id"),
+    )
+    # Fetch server-generated timestamps with RETURNING instead of a refresh SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
 
 class ChangeHistory(Base):
@@ -59,6 +77,30 @@ class ChangeHistory(Base):
     
     # Relationships
     contract = relationship("Contract", back_populates="change_history")
+    
+    # Serves per-contract history pages ordered by (changed_at, id); SQLite
+    # indexes carry the rowid id implicitly, making the index cover the keyset
+    __table_args__ = (
+        Index("idx_change_history_contract_date", "contract_id", "changed_at"),
+    )
+
+
+class AuditJournalCheckpoint(Base):
+    """Last write-behind journal entry inserted into change_history, per journal file"""
+    __tablename__ = "audit_journal_checkpoints"
+    
+    journal = Column(String(100), primary_key=True)  # Journal file name
+    sequence = Column(Integer, nullable=False)
+
+
+class ContractSummary(Base):
+    """Dashboard aggregates maintained incrementally by ContractService"""
+    __tablename__ = "contract_summary"
+    
+    dimension = Column(String(20), primary_key=True)  # status | category | start_month
+    bucket = Column(String(50), primary_key=True)  # status value, category id or YYYY-MM
+    contract_count = Column(Integer, nullable=False, default=0)
+    total_value_cents = Column(Integer, nullable=False, default=0)  # Integer cents keep sums exact
 
 
 class User(Base):
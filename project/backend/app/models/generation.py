@@ -0,0 +1,58 @@
+"""
+Data generation counter for cross-process cache invalidation.
+
+``data_generation`` holds one row whose counter SQLite triggers bump on every
+insert, update or delete of a contract, whichever process or script writes
+it. Result caches key their entries by the generation read from the database
+that served the request, so writes made by other workers (or reflected in a
+replica only later) never match an entry computed before them. The counter
+starts at a random value, so a recreated database does not repeat the
+generations of the one it replaced.
+"""
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+
+from .contract import Contract
+
+GENERATION_TABLE = "data_generation"
+
+_bump = f"UPDATE {GENERATION_TABLE} SET generation = generation + 1 WHERE id = 1;"
+
+GENERATION_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {GENERATION_TABLE} (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        generation INTEGER NOT NULL
+    )
+    """,
+    f"INSERT OR IGNORE INTO {GENERATION_TABLE} (id, generation) VALUES (1, abs(random() % 1000000000000))",
+    f"CREATE TRIGGER IF NOT EXISTS {GENERATION_TABLE}_ai AFTER INSERT ON contracts BEGIN {_bump} END",
+    f"CREATE TRIGGER IF NOT EXISTS {GENERATION_TABLE}_ad AFTER DELETE ON contracts BEGIN {_bump} END",
+    f"CREATE TRIGGER IF NOT EXISTS {GENERATION_TABLE}_au AFTER UPDATE ON contracts BEGIN {_bump} END",
+]
+
+
+def create_data_generation(connection: Connection) -> None:
+    """Create the generation counter and the contract triggers that bump it (SQLite only)"""
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in GENERATION_DDL:
+        connection.execute(text(statement))
+
+
+def drop_data_generation(connection: Connection) -> None:
+    """Drop the generation counter and its triggers"""
+    if connection.dialect.name == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {GENERATION_TABLE}_{suffix}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {GENERATION_TABLE}"))
+
+
+@event.listens_for(Contract.__table__, "after_create")
+def _create_data_generation(target, connection, **kw):
+    create_data_generation(connection)
+
+
+@event.listens_for(Contract.__table__, "before_drop")
+def _drop_data_generation(target, connection, **kw):
+    drop_data_generation(connection)
@@ -0,0 +1,88 @@
+"""
+Managed secondary indexes.
+
+Indexes proposed by ``benchmarks/index_advisor.py`` are listed in
+``managed_indexes.json`` next to this module rather than in the models, so the
+advisor can add them without editing code. ``apply_managed_indexes`` brings a
+database in line with the manifest: it creates new or changed indexes and
+drops ones removed from the manifest, tracking what it manages in the
+``managed_indexes`` table so indexes it did not create are never touched.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Sequence
+import json
+import os
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "managed_indexes.json")
+TRACKING_TABLE = "managed_indexes"
+
+
+class ManagedIndex(NamedTuple):
+    name: str
+    table: str
+    columns: Sequence[str]
+    reason: str = ""
+
+    def ddl(self) -> str:
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({', '.join(self.columns)})"
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> List[ManagedIndex]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as manifest:
+        return [
+            ManagedIndex(entry["name"], entry["table"], tuple(entry["columns"]), entry.get("reason", ""))
+            for entry in json.load(manifest)["indexes"]
+        ]
+
+
+def save_manifest(indexes: Sequence[ManagedIndex], path: str = MANIFEST_PATH) -> None:
+    entries = [
+        {"name": index.name, "table": index.table, "columns": list(index.columns), "reason": index.reason}
+        for index in indexes
+    ]
+    with open(f"{path}.tmp", "w") as manifest:
+        json.dump({"indexes": entries}, manifest, indent=2)
+        manifest.write("\n")
+    os.replace(f"{path}.tmp", path)
+
+
+def apply_managed_indexes(connection: Connection, indexes: Sequence[ManagedIndex] = None) -> List[str]:
+    """
+    Create, rebuild or drop indexes so the database matches the manifest (or
+    the given indexes); returns a description of each change made.
+    """
+    if indexes is None:
+        indexes = load_manifest()
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {TRACKING_TABLE} "
+        "(name VARCHAR(200) PRIMARY KEY, definition TEXT NOT NULL, applied_at VARCHAR(40) NOT NULL)"
+    ))
+    applied: Dict[str, str] = dict(connection.execute(text(f"SELECT name, definition FROM {TRACKING_TABLE}")).all())
+    wanted = {index.name: index for index in indexes}
+    changes = []
+
+    for name in applied.keys() - wanted.keys():
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        connection.execute(text(f"DELETE FROM {TRACKING_TABLE} WHERE name = :name"), {"name": name})
+        changes.append(f"dropped {name}")
+
+    for name, index in wanted.items():
+        definition = index.ddl()
+        if applied.get(name) == definition:
+            connection.execute(text(definition))  # Recreates it if dropped behind our back (bulk loads)
+            continue
+        if name in applied:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        connection.execute(text(definition))
+        connection.execute(text(f"DELETE FROM {TRACKING_TABLE} WHERE name = :name"), {"name": name})
+        connection.execute(
+            text(f"INSERT INTO {TRACKING_TABLE} (name, definition, applied_at) VALUES (:name, :definition, :applied_at)"),
+            {"name": name, "definition": definition, "applied_at": datetime.now(timezone.utc).isoformat()}
+        )
+        changes.append(f"{'rebuilt' if name in applied else 'created'} {name}")
+    return changes
@@ -0,0 +1,90 @@
+"""
+SQLite FTS5 shadow index for contract text search.
+
+``contracts_fts`` is an external-content FTS5 table over the searchable contract
+columns, keyed by the contracts rowid and kept in sync by triggers, so every
+write path (ORM, bulk Core statements, raw SQL) updates it.
+"""
+from sqlalchemy import column, event, table, text
+from sqlalchemy.engine import Connection
+
+from .contract import Contract
+
+SEARCH_TABLE = "contracts_fts"
+SEARCH_COLUMNS = ("contract_number", "supplier", "description", "responsible")
+
+# Lightweight handle for querying the index (rank is FTS5's bm25 score)
+search_table = table(SEARCH_TABLE, column("rowid"), column("rank"))
+
+_columns = ", ".join(SEARCH_COLUMNS)
+_new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+_old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+
+SEARCH_INDEX_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        {_columns},
+        content='contracts', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON contracts BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, {_columns}) VALUES (new.rowid, {_new_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON contracts BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {_columns})
+        VALUES ('delete', old.rowid, {_old_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF {_columns} ON contracts BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {_columns})
+        VALUES ('delete', old.rowid, {_old_values});
+        INSERT INTO {SEARCH_TABLE}(rowid, {_columns}) VALUES (new.rowid, {_new_values});
+    END
+    """,
+]
+
+
+def create_search_index(connection: Connection) -> None:
+    """Create the FTS5 index and sync triggers, backfilling it if it is new"""
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": SEARCH_TABLE}
+    ).first()
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        rebuild_search_index(connection)
+
+
+def rebuild_search_index(connection: Connection) -> None:
+    """
+    Re-read every contract into the FTS5 index.
+
+    Needed after VACUUM, which may renumber the rowids the index is keyed on.
+    """
+    connection.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+
+
+def drop_search_index(connection: Connection) -> None:
+    """Drop the FTS5 index and its sync triggers, leaving contract writes unindexed"""
+    if connection.dialect.name == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{suffix}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+
+
+@event.listens_for(Contract.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(Contract.__table__, "before_drop")
+def _drop_search_index(target, connection, **kw):
+    drop_search_index(connection)
@@ -1,3 +1,9 @@
-from .contract import ContractRepository, CategoryRepository, ChangeHistoryRepository
+from .contract import (
+    ContractRepository, CategoryRepository, ChangeHistoryRepository, SummaryRepository, ContractPage,
+    HistoryPage
+)
 
-__all__ = ["ContractRepository", "CategoryRepository", "ChangeHistoryRepository"]
\ No newline at end of file
+__all__ = [
+    "ContractRepository", "CategoryRepository", "ChangeHistoryRepository", "SummaryRepository", "ContractPage",
+    "HistoryPage"
+]
\ No newline at end of file
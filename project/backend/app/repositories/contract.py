@@ -1,19 +1,118 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, desc, asc, func
-from typing import List, Optional, Tuple, Dict, Any
-from ..models.contract import Contract, Category, ChangeHistory, ContractStatus
-from ..schemas.contract import ContractCreate, ContractUpdate, ContractFilters, PaginationParams
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import and_, or_, desc, asc, func, tuple_, literal, literal_column, select, insert, update, delete, cast, bindparam, text, String, DateTime, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row, RowMapping
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple, Dict, Any
+from datetime import date, datetime, timedelta, timezone
+from ..config import settings
+from ..models.contract import AuditJournalCheckpoint, Contract, Category, ChangeHistory, ContractSummary, ContractStatus
+from ..models.generation import GENERATION_TABLE
+from ..models.search import SEARCH_TABLE, search_table
+from ..schemas.contract import ContractCreate, ContractFilters, PaginationParams, ChangeHistoryFilters
+from ..utils.pagination import encode_cursor, decode_cursor
+import html
 import math
+import re
+
+
+# Map sort fields to model attributes
+SORT_FIELDS = {
+    "start_date": Contract.start_date,
+    "end_date": Contract.end_date,
+    "created_at": Contract.created_at,
+    "updated_at": Contract.updated_at,
+    "contract_number": Contract.contract_number,
+    "supplier": Contract.supplier,
+    "value": Contract.value,
+    "status": Contract.status
+}
+
+DEFAULT_SORT_FIELD = "start_date"
+
+# Columns selected for each contract response field when serving rows without ORM entities
+CONTRACT_FIELD_COLUMNS = {
+    "id": (Contract.id,),
+    "contract_number": (Contract.contract_number,),
+    "supplier": (Contract.supplier,),
+    "description": (Contract.description,),
+    "category_id": (Contract.category_id,),
+    "responsible": (Contract.responsible,),
+    "status": (Contract.status,),
+    "value": (Contract.value,),
+    "start_date": (Contract.start_date,),
+    "end_date": (Contract.end_date,),
+    "created_at": (Contract.created_at,),
+    "updated_at": (Contract.updated_at,),
+    "version": (Contract.version,),
+    "category": (
+        Contract.category_id, Category.name.label("category_name"),
+        Category.description.label("category_description"),
+        Category.created_at.label("category_created_at")
+    )
+}
+
+# Flat contract + category columns for list pages served without ORM entities
+CONTRACT_ROW_COLUMNS = tuple(dict.fromkeys(
+    column for columns in CONTRACT_FIELD_COLUMNS.values() for column in columns
+))
+
+
+def contract_row_columns(fields: Iterable[str]) -> Tuple[Any, ...]:
+    """Columns needed for the given response fields, without duplicates"""
+    return tuple(dict.fromkeys(
+        column for field in fields for column in CONTRACT_FIELD_COLUMNS[field]
+    ))
+
+
+# Keys per IN list for batch lookups, well below SQLite's bound parameter limit
+BATCH_GET_CHUNK_SIZE = 500
+
+# Ranks full-text matches; only meaningful together with the q filter
+RELEVANCE_SORT = "relevance"
+SEARCH_ALIAS = "contract_search"
+# Private-use characters FTS5 wraps matches in, swapped for <mark> tags once the snippet is HTML-escaped
+SNIPPET_MATCH_START = "\ue000"
+SNIPPET_MATCH_END = "\ue001"
+
+
+def _highlight_html(snippet: str) -> str:
+    """Escape contract text in an FTS5 snippet, then mark its matches"""
+    return html.escape(snippet).replace(SNIPPET_MATCH_START, "<mark>").replace(SNIPPET_MATCH_END, "</mark>")
+
+
+class ContractPage(NamedTuple):
+    """One page of contracts as returned by ContractRepository.get_multi"""
+    items: List[Contract]
+    total: Optional[int]  # None when the count was skipped
+    next_cursor: Optional[str]
+    has_next: bool
+
+
+class HistoryPage(NamedTuple):
+    """One page of change history as returned by ChangeHistoryRepository.get_page"""
+    items: List[ChangeHistory]
+    next_cursor: Optional[str]
+    has_next: bool
 
 
 class ContractRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, autocommit: bool = True):
+        """
+        With ``autocommit=False`` the repository runs in unit-of-work mode:
+        writes are only flushed and the caller commits once for the whole operation.
+        """
         self.db = db
+        self.autocommit = autocommit
 
     def create(self, contract_data: ContractCreate) -> Contract:
         """Create a new contract"""
         db_contract = Contract(**contract_data.model_dump())
         self.db.add(db_contract)
+        if not self.autocommit:
+            # INSERT ... RETURNING fills in the server-side timestamps (eager_defaults)
+            self.db.flush()
+            return db_contract
         self.db.commit()
         self.db.refresh(db_contract)
         return self._get_with_category(db_contract.id)
@@ -22,6 +121,19 @@ class ContractRepository:
         """Get contract by ID with category"""
         return self._get_with_category(contract_id)
 
+    def get_row(self, contract_id: str, fields: Set[str]) -> Optional[Row]:
+        """Get the columns of the given response fields (plus id and version) for one contract"""
+        query = select(*contract_row_columns(["id", "version", *sorted(fields)])).where(
+            Contract.id == contract_id
+        )
+        if "category" in fields:
+            query = query.join(Category, Contract.category_id == Category.id)
+        return self.db.execute(query).first()
+
+    def exists(self, contract_id: str) -> bool:
+        """Check whether a contract exists without loading it"""
+        return self.db.scalar(select(Contract.id).where(Contract.id == contract_id)) is not None
+
     def get_by_contract_number(self, contract_number: str) -> Optional[Contract]:
         """Get contract by contract number"""
         return (
@@ -31,19 +143,115 @@ class ContractRepository:
             .first()
         )
 
-    def update(self, contract_id: str, contract_data: ContractUpdate) -> Optional[Contract]:
-        """Update contract"""
-        db_contract = self.db.query(Contract).filter(Contract.id == contract_id).first()
-        if not db_contract:
-            return None
+    def get_rows_by_contract_numbers(self, contract_numbers: Iterable[str]) -> Dict[str, RowMapping]:
+        """Fetch plain contract rows for many contract numbers with one IN query"""
+        contract_numbers = list(set(contract_numbers))
+        if not contract_numbers:
+            return {}
+        rows = self.db.execute(
+            select(Contract.__table__).where(Contract.contract_number.in_(contract_numbers))
+        ).mappings()
+        return {row["contract_number"]: row for row in rows}
+
+    def get_rows_by_keys(
+        self, keys: Iterable[str], by: str = "id", chunk_size: Optional[int] = None
+    ) -> Dict[str, Row]:
+        """Fetch CONTRACT_ROW_COLUMNS rows for many ids or contract numbers, one IN query per chunk"""
+        chunk_size = chunk_size or BATCH_GET_CHUNK_SIZE
+        column = Contract.contract_number if by == "contract_number" else Contract.id
+        keys = list(dict.fromkeys(keys))
+        rows: Dict[str, Row] = {}
+        for start in range(0, len(keys), chunk_size):
+            query = (
+                select(*CONTRACT_ROW_COLUMNS)
+                .join(Category, Contract.category_id == Category.id)
+                .where(column.in_(keys[start:start + chunk_size]))
+            )
+            for row in self.db.execute(query):
+                rows[getattr(row, by)] = row
+        return rows
+
+    def bulk_insert(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert many contracts with one executemany, without committing"""
+        if rows:
+            self.db.execute(insert(Contract), rows)
+
+    def bulk_update_if_version(self, rows: List[Dict[str, Any]]) -> bool:
+        """
+        Update many contracts whose version still matches, without committing.
+
+        Each row holds ``id``, ``expected_version`` and the columns to set; rows
+        setting the same columns share one ``UPDATE ... WHERE id = ? AND version = ?``
+        executemany that bumps the version. Returns whether every row matched;
+        when one did not, the others were still written and the caller must roll
+        back before retrying them one at a time with ``update_if_version``.
+        """
+        table = Contract.__table__
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for row in rows:
+            fields = tuple(sorted(field for field in row if field not in ("id", "expected_version")))
+            # Bind names must not collide with the column names being set
+            groups.setdefault(fields, []).append({f"b_{key}": value for key, value in row.items()})
         
-        update_data = contract_data.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_contract, field, value)
+        matched = 0
+        for fields, params in groups.items():
+            statement = (
+                update(table)
+                .where(table.c.id == bindparam("b_id"), table.c.version == bindparam("b_expected_version"))
+                .values(version=table.c.version + 1, **{field: bindparam(f"b_{field}") for field in fields})
+            )
+            matched += self.db.execute(statement, params).rowcount
+        return matched == len(rows)
+
+    def update_if_version(
+        self, contract_id: str, update_data: Dict[str, Any], expected_version: Optional[int] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Contract]]:
+        """
+        Update a contract only if its version still matches, without committing.
+
+        Two round-trips: one SELECT loads the contract together with the category
+        it will point to, then a single ``UPDATE ... WHERE id = ? AND version = ?
+        RETURNING`` bumps the version. The old values cannot come from the UPDATE
+        itself: SQLite's RETURNING only sees the new row, and neither a CTE nor
+        the tables of ``UPDATE ... FROM`` may feed it. The version guard makes the
+        separate read safe, since any write in between makes the UPDATE match
+        nothing.
+
+        Values equal to the stored ones are left out; when nothing is left the
+        contract is returned as loaded, without an UPDATE or a version bump.
+
+        Returns ``(old_values, contract)``. ``old_values`` is None when the contract
+        does not exist and ``contract`` is None when the version did not match
+        ``expected_version`` (or changed concurrently). ``contract.category`` is
+        None when the requested category does not exist.
+        """
+        category_id = update_data["category_id"] if "category_id" in update_data else Contract.category_id
+        loaded = self.db.execute(
+            select(Contract, Category)
+            .outerjoin(Category, Category.id == category_id)
+            .where(Contract.id == contract_id)
+            .execution_options(populate_existing=True)
+        ).first()
+        if loaded is None:
+            return None, None
+        contract, category = loaded
+        old_values = {column.key: getattr(contract, column.key) for column in Contract.__table__.columns}
+        if expected_version is not None and old_values["version"] != expected_version:
+            return old_values, None
         
-        self.db.commit()
-        self.db.refresh(db_contract)
-        return self._get_with_category(contract_id)
+        update_data = {field: value for field, value in update_data.items() if old_values[field] != value}
+        if update_data:
+            contract = self.db.scalars(
+                update(Contract)
+                .where(Contract.id == contract_id, Contract.version == old_values["version"])
+                .values(**update_data, version=Contract.version + 1)
+                .returning(Contract)
+                .execution_options(synchronize_session="fetch")
+            ).first()
+            if contract is None:
+                return old_values, None
+        set_committed_value(contract, "category", category)
+        return old_values, contract
 
     def delete(self, contract_id: str) -> bool:
         """Delete contract"""
@@ -52,32 +260,114 @@ class ContractRepository:
             return False
         
         self.db.delete(db_contract)
-        self.db.commit()
+        if self.autocommit:
+            self.db.commit()
+        else:
+            self.db.flush()
         return True
 
     def get_multi(
         self,
         filters: ContractFilters,
-        pagination: PaginationParams
-    ) -> Tuple[List[Contract], int]:
-        """Get contracts with filtering, search, and pagination"""
-        query = self.db.query(Contract).options(joinedload(Contract.category))
+        pagination: PaginationParams,
+        with_total: bool = True,
+        as_rows: bool = False,
+        fields: Optional[Set[str]] = None
+    ) -> ContractPage:
+        """Get contracts with filtering, search, and offset or keyset (cursor) pagination; ValueError for a bad cursor"""
+        if as_rows and fields is not None:
+            sort_key = self._resolve_sort_key(pagination.sort_by)
+            query = self.db.query(
+                *contract_row_columns(["id", sort_key, *sorted(fields)])
+            ).select_from(Contract)
+            if "category" in fields:
+                query = query.join(Category, Contract.category_id == Category.id)
+        elif as_rows:
+            query = self.db.query(*CONTRACT_ROW_COLUMNS).select_from(Contract).join(
+                Category, Contract.category_id == Category.id
+            )
+        else:
+            query = self.db.query(Contract).options(joinedload(Contract.category))
         
         # Apply filters
         query = self._apply_filters(query, filters)
         
         # Get total count before pagination
-        total = query.count()
+        total = query.count() if with_total else None
         
         # Apply sorting
-        query = self._apply_sorting(query, pagination.sort_by, pagination.sort_dir)
+        ranked = self._ranks_by_relevance(filters, pagination)
+        query = self._apply_sorting(query, pagination.sort_by, pagination.sort_dir, ranked=ranked)
         
-        # Apply pagination
-        offset = (pagination.page - 1) * pagination.page_size
-        query = query.offset(offset).limit(pagination.page_size)
+        # Apply keyset seek or offset pagination
+        if pagination.cursor:
+            if ranked:
+                raise ValueError("Cursor pagination is not supported when sorting by relevance")
+            query = self._apply_cursor(query, pagination)
+        else:
+            query = query.offset((pagination.page - 1) * pagination.page_size)
+        
+        # Fetch one extra row to know whether a next page exists
+        contracts = query.limit(pagination.page_size + 1).all()
+        
+        has_next = len(contracts) > pagination.page_size
+        next_cursor = None
+        if has_next:
+            contracts = contracts[:pagination.page_size]
+            if not ranked:
+                next_cursor = self._make_cursor(contracts[-1], pagination)
         
-        contracts = query.all()
-        return contracts, total
+        return ContractPage(contracts, total, next_cursor, has_next)
+
+    def build_export_query(self, filters: ContractFilters, sort_by: str, sort_dir: str):
+        """
+        Column-only select of filtered contracts for exports.
+
+        Rows come back as plain tuples in ``utils.export.EXPORT_COLUMNS`` order,
+        with no ORM identity map or Pydantic model per row.
+        """
+        query = (
+            select(
+                Contract.id, Contract.contract_number, Contract.supplier, Contract.description,
+                Contract.category_id, Category.name.label("category_name"), Contract.responsible,
+                Contract.status, Contract.value, Contract.start_date, Contract.end_date,
+                Contract.created_at, Contract.updated_at
+            )
+            .select_from(Contract)
+            .outerjoin(Category, Contract.category_id == Category.id)
+        )
+        query = self._apply_filters(query, filters)
+        return self._apply_sorting(query, sort_by, sort_dir)
+
+    def iter_export_rows(self, filters: ContractFilters, sort_by: str, sort_dir: str, batch_size: int):
+        """Yield batches of export rows through a server-side cursor"""
+        query = self.build_export_query(filters, sort_by, sort_dir)
+        result = self.db.execute(query.execution_options(yield_per=batch_size))
+        yield from result.partitions()
+
+    def supplier_counts(self) -> List[Tuple[str, int]]:
+        """Contracts per distinct supplier name"""
+        return self.db.execute(select(Contract.supplier, func.count()).group_by(Contract.supplier)).all()
+
+    def facet_counts(self, filters: ContractFilters, facet: str) -> List[Tuple[Any, int]]:
+        """(value, contracts) pairs of one facet over the contracts matching the filters"""
+        if facet == "year":
+            # Group by day and fold into years in Python to stay dialect neutral
+            years: Dict[int, int] = {}
+            query = select(Contract.start_date, func.count()).select_from(Contract)
+            for start_date, count in self.db.execute(self._apply_filters(query, filters).group_by(Contract.start_date)):
+                years[start_date.year] = years.get(start_date.year, 0) + count
+            return list(years.items())
+        column = {"status": Contract.status, "category_id": Contract.category_id}[facet]
+        query = select(column, func.count()).select_from(Contract)
+        return [
+            (value.value if isinstance(value, ContractStatus) else value, count)
+            for value, count in self.db.execute(self._apply_filters(query, filters).group_by(column))
+        ]
+
+    def count(self, filters: ContractFilters) -> int:
+        """Count contracts matching the filters"""
+        return self._apply_filters(self.db.query(Contract), filters).count()
 
     def _get_with_category(self, contract_id: str) -> Optional[Contract]:
         """Helper to get contract with category joined"""
@@ -119,8 +409,14 @@ class ContractRepository:
         if filters.end_date_to:
             conditions.append(Contract.end_date <= filters.end_date_to)
         
-        # Text search across multiple fields
-        if filters.q:
+        # Text search across multiple fields; q without words (e.g. "@") falls back to LIKE
+        match = self._build_match_expression(filters.q) if filters.q and self._use_full_text_search() else None
+        if match:
+            query = query.join(
+                self._search_subquery(match),
+                literal_column(f"{SEARCH_ALIAS}.rowid") == literal_column("contracts.rowid")
+            )
+        elif filters.q:
             search_term = f"%{filters.q}%"
             search_conditions = [
                 Contract.contract_number.ilike(search_term),
@@ -135,21 +431,16 @@ class ContractRepository:
         
         return query
 
-    def _apply_sorting(self, query, sort_by: str, sort_dir: str):
+    def _apply_sorting(self, query, sort_by: str, sort_dir: str, ranked: bool = False):
         """Apply sorting to query"""
-        # Map sort fields to model attributes
-        sort_fields = {
-            "start_date": Contract.start_date,
-            "end_date": Contract.end_date,
-            "created_at": Contract.created_at,
-            "updated_at": Contract.updated_at,
-            "contract_number": Contract.contract_number,
-            "supplier": Contract.supplier,
-            "value": Contract.value,
-            "status": Contract.status
-        }
-        
-        sort_field = sort_fields.get(sort_by, Contract.start_date)
+        if ranked:
+            # FTS5 rank is bm25, where lower means more relevant; "desc" lists best matches first
+            rank = literal_column(f"{SEARCH_ALIAS}.rank")
+            if sort_dir == "desc":
+                return query.order_by(asc(rank), asc(Contract.id))
+            return query.order_by(desc(rank), desc(Contract.id))
+        
+        sort_field = SORT_FIELDS[self._resolve_sort_key(sort_by)]
         
         if sort_dir == "desc":
             query = query.order_by(desc(sort_field), desc(Contract.id))
@@ -158,6 +449,114 @@ class ContractRepository:
         
         return query
 
+    def get_search_snippets(self, q: str, contract_ids: List[str]) -> Dict[str, str]:
+        """Return an HTML-escaped FTS5 snippet per contract id, matches wrapped in <mark>"""
+        match = self._build_match_expression(q)
+        if not match or not contract_ids or not self._use_full_text_search():
+            return {}
+        rows = self.db.execute(
+            select(
+                Contract.id,
+                func.snippet(literal_column(SEARCH_TABLE), -1, SNIPPET_MATCH_START, SNIPPET_MATCH_END, "…", 12)
+            )
+            .select_from(search_table)
+            .join(Contract, literal_column("contracts.rowid") == search_table.c.rowid)
+            .where(literal_column(SEARCH_TABLE).op("MATCH")(match))
+            .where(Contract.id.in_(contract_ids))
+        )
+        return {contract_id: _highlight_html(snippet) for contract_id, snippet in rows}
+
+    def data_generation(self) -> Optional[int]:
+        """
+        Counter bumped by every contract write (see models.generation), for
+        keying cached results; None on databases that do not maintain one.
+        """
+        if self.db.get_bind().dialect.name != "sqlite":
+            return None
+        return self.db.execute(text(f"SELECT generation FROM {GENERATION_TABLE} WHERE id = 1")).scalar()
+
+    def _use_full_text_search(self) -> bool:
+        """Whether the q filter is served by the FTS5 index"""
+        return settings.full_text_search and self.db.get_bind().dialect.name == "sqlite"
+
+    @staticmethod
+    def _build_match_expression(q: str) -> Optional[str]:
+        """Turn free text into an FTS5 query where every term must match as a prefix"""
+        terms = re.findall(r"\w+", q)
+        if not terms:
+            return None
+        return " ".join(f'"{term}"*' for term in terms)
+
+    @staticmethod
+    def _search_subquery(match: str):
+        """Rowids and bm25 rank of the contracts matching an FTS5 expression"""
+        return (
+            select(search_table.c.rowid, search_table.c.rank)
+            .where(literal_column(SEARCH_TABLE).op("MATCH")(match))
+            .subquery(SEARCH_ALIAS)
+        )
+
+    def _ranks_by_relevance(self, filters: ContractFilters, pagination: PaginationParams) -> bool:
+        """Whether the page is ordered by full-text rank instead of a column"""
+        return (
+            pagination.sort_by == RELEVANCE_SORT
+            and bool(filters.q)
+            and self._use_full_text_search()
+            and self._build_match_expression(filters.q) is not None
+        )
+
+    def _apply_cursor(self, query, pagination: PaginationParams):
+        """Seek past the row encoded in the cursor using a row-value comparison"""
+        sort_key = self._resolve_sort_key(pagination.sort_by)
+        payload = decode_cursor(pagination.cursor)
+        if payload.get("sort_by") != sort_key or payload.get("sort_dir") != pagination.sort_dir:
+            raise ValueError("Cursor does not match the requested sort order")
+        if "value" not in payload or not isinstance(payload.get("id"), str):
+            raise ValueError("Invalid pagination cursor")
+        
+        sort_field = SORT_FIELDS[sort_key]
+        position = tuple_(self._cursor_literal(sort_field, payload["value"]), literal(payload["id"]))
+        
+        if pagination.sort_dir == "desc":
+            return query.filter(tuple_(sort_field, Contract.id) < position)
+        return query.filter(tuple_(sort_field, Contract.id) > position)
+
+    def _make_cursor(self, contract: Contract, pagination: PaginationParams) -> str:
+        """Build the cursor pointing just after the given contract"""
+        sort_key = self._resolve_sort_key(pagination.sort_by)
+        value = getattr(contract, sort_key)
+        if isinstance(value, ContractStatus):
+            value = value.value
+        elif isinstance(value, (date, datetime)):
+            # str() matches SQLite's stored text form ("YYYY-MM-DD HH:MM:SS[.ffffff]")
+            value = str(value)
+        return encode_cursor({
+            "sort_by": sort_key,
+            "sort_dir": pagination.sort_dir,
+            "value": value,
+            "id": contract.id
+        })
+
+    def _cursor_literal(self, sort_field, value):
+        """Convert a decoded cursor value back into a bound literal for the sort column"""
+        try:
+            if isinstance(sort_field.type, DateTime):
+                # Compare DateTime columns as stored text so server-side defaults
+                # (no microseconds) line up with the cursor value
+                datetime.fromisoformat(value)
+                return literal(value, String())
+            python_type = sort_field.type.python_type
+            if python_type is date:
+                return literal(date.fromisoformat(value), sort_field.type)
+            return literal(python_type(value), sort_field.type)
+        except (TypeError, ValueError) as exc:
+            raise ValueError("Invalid pagination cursor") from exc
+
+    @staticmethod
+    def _resolve_sort_key(sort_by: str) -> str:
+        """Return the sort key actually used, falling back to the default field"""
+        return sort_by if sort_by in SORT_FIELDS else DEFAULT_SORT_FIELD
+
 
 class CategoryRepository:
     def __init__(self, db: Session):
@@ -179,14 +578,23 @@ class CategoryRepository:
         """Get category by name"""
         return self.db.query(Category).filter(Category.name == name).first()
 
+    def get_existing_ids(self, category_ids: Iterable[int]) -> Set[int]:
+        """Return which of the given category ids exist, with one IN query"""
+        category_ids = list(set(category_ids))
+        if not category_ids:
+            return set()
+        return set(self.db.scalars(select(Category.id).where(Category.id.in_(category_ids))))
+
     def get_all(self) -> List[Category]:
         """Get all categories"""
         return self.db.query(Category).order_by(Category.name).all()
 
 
 class ChangeHistoryRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, autocommit: bool = True):
+        """See ContractRepository for ``autocommit=False`` (unit-of-work mode)"""
         self.db = db
+        self.autocommit = autocommit
 
     def create(self, contract_id: str, changed_by: str, changes: Dict[str, Dict[str, Any]]) -> ChangeHistory:
         """Create change history record"""
@@ -196,15 +604,174 @@ class ChangeHistoryRepository:
             changes=changes
         )
         self.db.add(db_change)
+        if not self.autocommit:
+            self.db.flush()
+            return db_change
         self.db.commit()
         self.db.refresh(db_change)
         return db_change
 
-    def get_by_contract_id(self, contract_id: str) -> List[ChangeHistory]:
-        """Get change history for a contract"""
+    def bulk_create(self, entries: List[Dict[str, Any]]) -> None:
+        """Insert many change history rows as one multi-row INSERT, without committing"""
+        if entries:
+            self.db.execute(insert(ChangeHistory).values(entries))
+
+    def get_journal_checkpoint(self, journal: str) -> int:
+        """Sequence number of the last entry of a write-behind journal already inserted (0 for none)"""
+        return self.db.scalar(
+            select(AuditJournalCheckpoint.sequence).where(AuditJournalCheckpoint.journal == journal)
+        ) or 0
+
+    def save_journal_checkpoint(self, journal: str, sequence: int) -> None:
+        """Record how far a write-behind journal has been inserted, without committing"""
+        dialect_insert = postgresql.insert if self.db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        statement = dialect_insert(AuditJournalCheckpoint).values(journal=journal, sequence=sequence)
+        self.db.execute(statement.on_conflict_do_update(
+            index_elements=[AuditJournalCheckpoint.journal], set_={"sequence": statement.excluded.sequence}
+        ))
+
+    def delete_journal_checkpoint(self, journal: str) -> None:
+        """Forget a write-behind journal that has been removed, without committing"""
+        self.db.execute(delete(AuditJournalCheckpoint).where(AuditJournalCheckpoint.journal == journal))
+
+    def get_existing_contract_ids(self, contract_ids: Iterable[str]) -> Set[str]:
+        """Return which of the given contract ids still exist, with one IN query"""
+        contract_ids = list(set(contract_ids))
+        if not contract_ids:
+            return set()
+        return set(self.db.scalars(select(Contract.id).where(Contract.id.in_(contract_ids))))
+
+    def get_page(
+        self,
+        contract_id: str,
+        filters: ChangeHistoryFilters,
+        page_size: int,
+        cursor: Optional[str] = None
+    ) -> HistoryPage:
+        """
+        Get one page of a contract's change history, newest first.
+
+        Pages seek on ``(changed_at, id)`` from the cursor, so each request reads
+        at most ``page_size + 1`` rows off idx_change_history_contract_date no
+        matter how long the history is. Raises ValueError for a malformed cursor.
+        """
+        query = self.db.query(ChangeHistory).filter(ChangeHistory.contract_id == contract_id)
+        if filters.changed_by:
+            query = query.filter(ChangeHistory.changed_by == filters.changed_by)
+        if filters.changed_from:
+            query = query.filter(ChangeHistory.changed_at >= self._changed_at_literal(filters.changed_from))
+        if filters.changed_to:
+            query = query.filter(ChangeHistory.changed_at <= self._changed_at_literal(filters.changed_to))
+        if cursor:
+            payload = decode_cursor(cursor)
+            if not isinstance(payload.get("changed_at"), str) or not isinstance(payload.get("id"), int):
+                raise ValueError("Invalid pagination cursor")
+            try:
+                position = self._changed_at_literal(datetime.fromisoformat(payload["changed_at"]))
+            except ValueError as exc:
+                raise ValueError("Invalid pagination cursor") from exc
+            query = query.filter(
+                tuple_(ChangeHistory.changed_at, ChangeHistory.id) < tuple_(position, literal(payload["id"]))
+            )
+        
+        rows = (
+            query.order_by(desc(ChangeHistory.changed_at), desc(ChangeHistory.id))
+            .limit(page_size + 1)
+            .all()
+        )
+        has_next = len(rows) > page_size
+        items = rows[:page_size]
+        next_cursor = None
+        if has_next:
+            last = items[-1]
+            next_cursor = encode_cursor({"changed_at": str(last.changed_at), "id": last.id})
+        return HistoryPage(items=items, next_cursor=next_cursor, has_next=has_next)
+
+    @staticmethod
+    def _changed_at_literal(value: datetime):
+        """
+        Bind a datetime as text in the stored form, like ContractRepository
+        cursors, so server-default timestamps (no microseconds) compare correctly.
+        """
+        if value.tzinfo is not None:
+            # Server-side timestamps are stored as naive UTC
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return literal(str(value), String())
+
+
+class SummaryRepository:
+    """Data access for the incrementally maintained contract_summary table"""
+    def __init__(self, db: Session):
+        self.db = db
+
+    def apply_deltas(self, deltas: Dict[Tuple[str, str], Tuple[int, int]]) -> None:
+        """
+        Add (count, value_cents) deltas to summary buckets with one upsert, without committing.
+
+        Keys are ``(dimension, bucket)`` pairs; missing buckets are created and
+        zero deltas are skipped.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta != (0, 0)}
+        if not deltas:
+            return
+        dialect_insert = postgresql.insert if self.db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        statement = dialect_insert(ContractSummary).values([
+            {"dimension": dimension, "bucket": bucket, "contract_count": count, "total_value_cents": cents}
+            for (dimension, bucket), (count, cents) in deltas.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[ContractSummary.dimension, ContractSummary.bucket],
+            set_={
+                "contract_count": ContractSummary.contract_count + statement.excluded.contract_count,
+                "total_value_cents": ContractSummary.total_value_cents + statement.excluded.total_value_cents,
+            }
+        )
+        self.db.execute(statement)
+
+    def get_all(self) -> List[ContractSummary]:
+        """Get every non-empty summary bucket"""
         return (
-            self.db.query(ChangeHistory)
-            .filter(ChangeHistory.contract_id == contract_id)
-            .order_by(desc(ChangeHistory.changed_at))
+            self.db.query(ContractSummary)
+            .filter(ContractSummary.contract_count > 0)
+            .order_by(ContractSummary.dimension, ContractSummary.bucket)
             .all()
-        )
\ No newline at end of file
+        )
+
+    def count_expiring(self, within_days: int) -> int:
+        """Count active contracts whose end date falls within the next N days"""
+        today = date.today()
+        return (
+            self.db.query(func.count(Contract.id))
+            .filter(
+                Contract.status == ContractStatus.ACTIVE,
+                Contract.end_date >= today,
+                Contract.end_date <= today + timedelta(days=within_days)
+            )
+            .scalar()
+        )
+
+    def rebuild(self) -> None:
+        """Recompute every summary bucket from the contracts table, without committing"""
+        value_cents = func.sum(cast(func.round(Contract.value * 100), Integer))
+        deltas: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+        def add(key, count, cents):
+            old_count, old_cents = deltas.get(key, (0, 0))
+            deltas[key] = (old_count + count, old_cents + (cents or 0))
+
+        for status_value, count, cents in self.db.execute(
+            select(Contract.status, func.count(), value_cents).group_by(Contract.status)
+        ):
+            add(("status", status_value.value), count, cents)
+        for category_id, count, cents in self.db.execute(
+            select(Contract.category_id, func.count(), value_cents).group_by(Contract.category_id)
+        ):
+            add(("category", str(category_id)), count, cents)
+        # Group by day and fold into months in Python to stay dialect neutral
+        for start_date, count, cents in self.db.execute(
+            select(Contract.start_date, func.count(), value_cents).group_by(Contract.start_date)
+        ):
+            add(("start_month", start_date.strftime("%Y-%m")), count, cents)
+
+        self.db.execute(delete(ContractSummary))
+        self.apply_deltas(deltas)
\ No newline at end of file
@@ -1,13 +1,23 @@
 from .contract import (
     Category, CategoryCreate, CategoryUpdate,
     Contract, ContractCreate, ContractUpdate,
-    ChangeHistory, ChangeHistoryCreate,
-    ContractFilters, PaginationParams, PaginatedResponse
+    ContractBulkRequest, ContractBulkItemResult, ContractBulkResponse,
+    ContractBatchGetRequest, ContractBatchGetItem, ContractBatchGetResponse,
+    SupplierSuggestion, SupplierSuggestResponse,
+    SummaryBucket, ContractSummary,
+    ChangeHistory, ChangeHistoryCreate, ChangeHistoryFilters, ChangeHistoryPage,
+    ContractFilters, PaginationParams, PaginatedResponse, FacetBucket,
+    CONTRACT_FIELDS, FACET_FIELDS, partial_contract_schema, partial_paginated_schema
 )
 
 __all__ = [
     "Category", "CategoryCreate", "CategoryUpdate",
     "Contract", "ContractCreate", "ContractUpdate", 
-    "ChangeHistory", "ChangeHistoryCreate",
-    "ContractFilters", "PaginationParams", "PaginatedResponse"
+    "ContractBulkRequest", "ContractBulkItemResult", "ContractBulkResponse",
+    "ContractBatchGetRequest", "ContractBatchGetItem", "ContractBatchGetResponse",
+    "SupplierSuggestion", "SupplierSuggestResponse",
+    "SummaryBucket", "ContractSummary",
+    "ChangeHistory", "ChangeHistoryCreate", "ChangeHistoryFilters", "ChangeHistoryPage",
+    "ContractFilters", "PaginationParams", "PaginatedResponse", "FacetBucket",
+    "CONTRACT_FIELDS", "FACET_FIELDS", "partial_contract_schema", "partial_paginated_schema"
 ]
\ No newline at end of file
@@ -1,8 +1,11 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, create_model, validator
+from typing import Optional, List, Dict, Any, FrozenSet, Type, Union
+from functools import lru_cache
 from datetime import date, datetime
 from decimal import Decimal
 from ..models.contract import ContractStatus
+from ..utils.supplier_index import MAX_SUGGESTIONS
+import string
 
 
 # Base schemas
@@ -72,11 +75,91 @@ class Contract(ContractBase):
     id: str
     created_at: datetime
     updated_at: datetime
+    version: int
     category: Category
     
     model_config = {"from_attributes": True}
 
 
+# Bulk schemas
+BULK_MAX_ITEMS = 1000
+
+
+class ContractBulkRequest(BaseModel):
+    items: List[ContractCreate] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    upsert: bool = False  # Update existing contracts matched by contract_number
+
+
+class ContractBulkItemResult(BaseModel):
+    index: int
+    contract_number: str
+    status: str  # created | updated | unchanged | conflict | error
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ContractBulkResponse(BaseModel):
+    results: List[ContractBulkItemResult]
+    created: int
+    updated: int
+    unchanged: int
+    conflicts: int
+    failed: int
+
+
+# Batch get schemas
+BATCH_GET_MAX_ITEMS = 1000
+
+
+class ContractBatchGetRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=BATCH_GET_MAX_ITEMS)
+    by: str = Field("id", pattern="^(id|contract_number)$")  # Column the ids are matched against
+
+
+class ContractBatchGetItem(BaseModel):
+    key: str
+    found: bool
+    contract: Optional[Contract] = None
+
+
+class ContractBatchGetResponse(BaseModel):
+    items: List[ContractBatchGetItem]  # One per requested id, in request order
+    found: int
+    missing: List[str]
+
+
+# Supplier typeahead schemas
+SUPPLIER_SUGGEST_MAX_LIMIT = MAX_SUGGESTIONS  # Longest ranked list the index keeps per prefix
+
+
+class SupplierSuggestion(BaseModel):
+    name: str
+    contracts: int
+
+
+class SupplierSuggestResponse(BaseModel):
+    prefix: str
+    items: List[SupplierSuggestion]  # Most contracts first
+
+
+# Summary schemas
+class SummaryBucket(BaseModel):
+    key: str
+    label: Optional[str] = None
+    count: int
+    value: Decimal
+
+
+class ContractSummary(BaseModel):
+    total_count: int
+    total_value: Decimal
+    by_status: List[SummaryBucket]
+    by_category: List[SummaryBucket]
+    by_start_month: List[SummaryBucket]
+    expiring_within_days: int
+    expiring_count: int
+
+
 # Change History schemas
 class ChangeHistoryBase(BaseModel):
     contract_id: str
@@ -95,7 +178,27 @@ class ChangeHistory(ChangeHistoryBase):
     model_config = {"from_attributes": True}
 
 
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+class ChangeHistoryFilters(BaseModel):
+    changed_by: Optional[str] = None
+    changed_from: Optional[datetime] = None
+    changed_to: Optional[datetime] = None
+
+
+class ChangeHistoryPage(BaseModel):
+    items: List[ChangeHistory]
+    page_size: int
+    has_next: bool = False
+    next_cursor: Optional[str] = None
+
+
 # Pagination and filtering schemas
+# Lower-cases ASCII letters only, as SQLite's case-insensitive LIKE does
+ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
 class ContractFilters(BaseModel):
     supplier: Optional[str] = None
     status: Optional[ContractStatus] = None
@@ -114,17 +217,85 @@ class ContractFilters(BaseModel):
             raise ValueError('max_value must be greater than or equal to min_value')
         return v
 
+    def cache_key(self) -> tuple:
+        """
+        Normalized, hashable form of the active filters (for result caches).
+
+        Text is only folded the way every database compares it: SQLite's
+        LIKE and lower() fold ASCII letters alone and keep whitespace as is.
+        """
+        key = []
+        for field, value in sorted(self.model_dump(exclude_none=True).items()):
+            if isinstance(value, str):
+                value = value.translate(ASCII_LOWERCASE)
+            elif isinstance(value, Decimal):
+                value = value.normalize()
+            elif isinstance(value, ContractStatus):
+                value = value.value
+            key.append((field, value))
+        return tuple(key)
+
+
+# Facets countable with ?facets=, each mapped to the filters it ignores so its
+# counts show what choosing another value would return ("year" is the start year)
+FACET_FILTERS = {
+    "status": ("status",),
+    "category_id": ("category_id",),
+    "year": ("start_date_from", "start_date_to"),
+}
+FACET_FIELDS = tuple(FACET_FILTERS)
+
+
+class FacetBucket(BaseModel):
+    value: Union[int, str]
+    count: int
+
 
 class PaginationParams(BaseModel):
     page: int = Field(1, ge=1)
     page_size: int = Field(10, ge=1, le=10)
     sort_by: str = "start_date"
     sort_dir: str = Field("desc", pattern="^(asc|desc)$")
+    cursor: Optional[str] = None  # Opaque keyset cursor, takes precedence over page
+    include_total: str = Field("exact", pattern="^(false|exact|estimate)$")
 
 
 class PaginatedResponse(BaseModel):
     items: List[Contract]
-    total: int
+    total: Optional[int]
     page: int
     page_size: int
-    pages: int
\ No newline at end of file
+    pages: Optional[int]
+    total_mode: str = "exact"  # exact | estimate (cached count) | none (not counted)
+    has_next: bool = False
+    next_cursor: Optional[str] = None
+    highlights: Optional[Dict[str, str]] = None  # Contract id -> highlighted search snippet
+    facets: Optional[Dict[str, List[FacetBucket]]] = None  # Facet -> counts per value, most contracts first
+
+
+# Sparse fieldsets: contract fields selectable with ?fields=, id is always returned
+CONTRACT_FIELDS = tuple(Contract.model_fields)
+
+
+@lru_cache(maxsize=256)
+def partial_contract_schema(fields: FrozenSet[str]) -> Type[BaseModel]:
+    """Contract response model restricted to the given fields plus id"""
+    return create_model(
+        "PartialContract",
+        __config__={"from_attributes": True},
+        **{
+            name: (info.annotation, info)
+            for name, info in Contract.model_fields.items()
+            if name == "id" or name in fields
+        }
+    )
+
+
+@lru_cache(maxsize=256)
+def partial_paginated_schema(fields: FrozenSet[str]) -> Type[BaseModel]:
+    """PaginatedResponse whose items only carry the given fields"""
+    return create_model(
+        "PartialPaginatedResponse",
+        __base__=PaginatedResponse,
+        items=(List[partial_contract_schema(fields)], ...)
+    )
@@ -1,3 +1,7 @@
-from .contract import ContractService, CategoryService
+from .contract import ContractService, CategoryService, AsyncContractService, AsyncCategoryService
+from .audit import AuditLogWriter, audit_writer
 
-__all__ = ["ContractService", "CategoryService"]
\ No newline at end of file
+__all__ = [
+    "ContractService", "CategoryService", "AsyncContractService", "AsyncCategoryService",
+    "AuditLogWriter", "audit_writer"
+]
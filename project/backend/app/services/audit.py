@@ -0,0 +1,295 @@
+"""
+Write-behind queue for change history rows
+"""
+from collections import deque
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from typing import IO, Any, Deque, Dict, List, Optional, Set, Tuple
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import uuid
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..repositories.contract import ChangeHistoryRepository
+
+logger = logging.getLogger(__name__)
+
+# Failed batch writes are retried after this many seconds, doubling up to the cap
+RETRY_DELAY_SECONDS = 0.1
+MAX_RETRY_DELAY_SECONDS = 5.0
+# Attempts per batch while stopping, after which remaining entries are left to recovery
+STOP_WRITE_ATTEMPTS = 3
+JOURNAL_SUFFIX = ".journal"
+
+# (journal sequence number, ChangeHistory column values)
+QueuedEntry = Tuple[int, Dict[str, Any]]
+
+
+def _journal_line(sequence: int, entry: Dict[str, Any]) -> bytes:
+    return (json.dumps({"sequence": sequence, "entry": entry}, default=datetime.isoformat) + "\n").encode()
+
+
+def _read_journal(journal: IO[bytes]) -> List[QueuedEntry]:
+    """Entries of a journal in order, skipping a line cut short by a crash (never acknowledged)"""
+    entries = []
+    for line in journal:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        entry = record["entry"]
+        if entry.get("changed_at"):
+            entry["changed_at"] = datetime.fromisoformat(entry["changed_at"])
+        entries.append((record["sequence"], entry))
+    return entries
+
+
+class AuditLogWriter:
+    """Batches change history inserts on the event loop, journaled so a killed writer loses nothing"""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        batch_size: int = 200,
+        flush_interval_ms: int = 50,
+        max_queued: int = 10000,
+        journal_dir: Optional[str] = None,
+        journal_fsync: bool = True
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queued = max_queued
+        self.journal_dir = journal_dir or None
+        self.journal_fsync = journal_fsync
+        self._pending: Deque[QueuedEntry] = deque()
+        self._discarded: Set[str] = set()  # Deleted contracts whose in-flight entries must not be written
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._journal: Optional[IO[bytes]] = None
+        self._journal_name: Optional[str] = None
+        self._sequence = 0
+        self._sync_scheduled = False
+
+    @property
+    def running(self) -> bool:
+        """Whether the background task is accepting entries"""
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def start(self) -> None:
+        """Start the background task on the running event loop (no-op when already running)"""
+        if self.running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        if self.journal_dir:
+            self._open_journal()
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="audit-log-writer")
+
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """Queue (and journal) one change history row (ChangeHistory column values); False if it was not queued"""
+        if not self.running or len(self._pending) >= self.max_queued:
+            return False
+        sequence = self._sequence + 1
+        if self._journal is not None:
+            position = self._journal.tell()
+            try:
+                self._journal.write(_journal_line(sequence, entry))
+                self._journal.flush()
+            except OSError:
+                logger.warning("Could not journal a change history entry; writing it synchronously", exc_info=True)
+                self._journal.truncate(position)
+                return False
+            if self.journal_fsync and not self._sync_scheduled:
+                # One fsync per event loop tick covers every entry journaled in it
+                self._sync_scheduled = True
+                asyncio.get_running_loop().call_soon(self._sync_journal)
+        self._sequence = sequence
+        self._pending.append((sequence, entry))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def discard(self, contract_id: str) -> None:
+        """Drop every entry of a contract being deleted, including one in a batch being written"""
+        self._pending = deque(item for item in self._pending if item[1]["contract_id"] != contract_id)
+        if self._task is not None:
+            self._discarded.add(contract_id)
+
+    async def stop(self) -> None:
+        """Write everything still queued and stop the task"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        if self._journal is not None:
+            await self._close_journal(remove=not self._pending)
+        self._pending.clear()
+
+    async def _run(self) -> None:
+        if self.journal_dir:
+            await self._recover()
+        failures = 0
+        while self._pending or not self._stopping:
+            if len(self._pending) < self.batch_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if await self._write(batch):
+                failures = 0
+                if not self._pending and self._journal is not None:
+                    # Everything journaled is inserted and checkpointed, so the file can start over
+                    self._journal.truncate(0)
+                    self._journal.seek(0)
+                continue
+            failures += 1
+            # Entries of contracts deleted while the batch was in flight must not come back
+            batch = [item for item in batch if item[1]["contract_id"] not in self._discarded]
+            if self._stopping and failures >= STOP_WRITE_ATTEMPTS:
+                if self._journal is not None:
+                    self._pending.extendleft(reversed(batch))
+                    logger.error(
+                        "Could not write %d change history entries before stopping; journal %s keeps them "
+                        "for the next writer to start", len(self._pending), self._journal_name
+                    )
+                    return
+                logger.error("Could not write %d change history entries before stopping: %r", len(batch), batch)
+                failures = 0
+                continue
+            # Keep the batch at the front of the queue and retry it after a pause
+            self._pending.extendleft(reversed(batch))
+            await asyncio.sleep(min(RETRY_DELAY_SECONDS * 2 ** (failures - 1), MAX_RETRY_DELAY_SECONDS))
+
+    async def _write(self, batch: List[QueuedEntry]) -> bool:
+        """Insert one batch in its own transaction; returns whether it was written"""
+        try:
+            async with self.session_factory() as db:
+                await db.run_sync(self._insert, batch)
+                await db.commit()
+            self._discarded.clear()
+            return True
+        except SQLAlchemyError:
+            logger.warning("Writing %d change history entries failed; will retry", len(batch), exc_info=True)
+            return False
+
+    def _insert(self, db, batch: List[QueuedEntry]) -> None:
+        # Hold the write connection before filtering: a delete that discarded
+        # entries earlier is excluded here, one that writes later waits for this
+        # transaction and cascades over its rows
+        db.info["writing"] = True
+        db.connection()
+        entries = [entry for _, entry in batch if entry["contract_id"] not in self._discarded]
+        repo = ChangeHistoryRepository(db)
+        repo.bulk_create(entries)
+        if self._journal is not None:
+            repo.save_journal_checkpoint(self._journal_name, batch[-1][0])
+
+    def _open_journal(self) -> None:
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._journal_name = f"{os.getpid()}-{uuid.uuid4().hex}{JOURNAL_SUFFIX}"
+        self._journal = open(os.path.join(self.journal_dir, self._journal_name), "ab")
+        # Held while this writer lives, so recovery by other workers leaves the journal alone
+        fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._sequence = 0
+        if self.journal_fsync:
+            # Make the new file's directory entry durable too, or a power loss could drop the whole journal
+            directory = os.open(self.journal_dir, os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+    def _sync_journal(self) -> None:
+        """Flush journaled entries to disk"""
+        self._sync_scheduled = False
+        if self._journal is None:
+            return
+        try:
+            os.fsync(self._journal.fileno())
+        except OSError:
+            logger.warning("Could not fsync change history journal %s", self._journal_name, exc_info=True)
+
+    async def _close_journal(self, remove: bool) -> None:
+        if not remove and self.journal_fsync:
+            self._sync_journal()
+        name, self._journal_name = self._journal_name, None
+        self._journal.close()
+        self._journal = None
+        if remove:
+            os.remove(os.path.join(self.journal_dir, name))
+            await self._forget_journal(name)
+
+    async def _recover(self) -> None:
+        """Write the entries left in the journals of writers that are gone, then remove those journals"""
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not name.endswith(JOURNAL_SUFFIX) or name == self._journal_name:
+                continue
+            path = os.path.join(self.journal_dir, name)
+            try:
+                journal = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with journal:
+                try:
+                    fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Its writer is alive, or another worker is recovering it
+                if not os.path.exists(path):
+                    continue  # Recovered and removed just before we took the lock
+                entries = _read_journal(journal)
+                try:
+                    async with self.session_factory() as db:
+                        await db.run_sync(self._insert_recovered, name, entries)
+                        await db.commit()
+                except SQLAlchemyError:
+                    logger.warning("Could not recover change history journal %s; will retry on next start", name, exc_info=True)
+                    continue
+                os.remove(path)
+            logger.info("Recovered change history journal %s", name)
+            await self._forget_journal(name)
+
+    def _insert_recovered(self, db, name: str, entries: List[QueuedEntry]) -> None:
+        db.info["writing"] = True
+        db.connection()
+        repo = ChangeHistoryRepository(db)
+        checkpoint = repo.get_journal_checkpoint(name)
+        entries = [(sequence, entry) for sequence, entry in entries if sequence > checkpoint]
+        if not entries:
+            return
+        for start in range(0, len(entries), self.batch_size):
+            chunk = [entry for _, entry in entries[start:start + self.batch_size]]
+            existing = repo.get_existing_contract_ids(entry["contract_id"] for entry in chunk)
+            repo.bulk_create([entry for entry in chunk if entry["contract_id"] in existing])
+        repo.save_journal_checkpoint(name, entries[-1][0])
+
+    async def _forget_journal(self, name: str) -> None:
+        """Drop the checkpoint of a removed journal (a leftover row is harmless)"""
+        try:
+            async with self.session_factory() as db:
+                await db.run_sync(lambda sync_db: ChangeHistoryRepository(sync_db).delete_journal_checkpoint(name))
+                await db.commit()
+        except SQLAlchemyError:
+            logger.warning("Could not delete the checkpoint of change history journal %s", name, exc_info=True)
+
+
+audit_writer = AuditLogWriter(
+    AsyncSessionLocal,
+    batch_size=settings.audit_batch_size,
+    flush_interval_ms=settings.audit_flush_interval_ms,
+    max_queued=settings.audit_queue_size,
+    journal_dir=settings.audit_journal_dir,
+    journal_fsync=settings.audit_journal_fsync
+)
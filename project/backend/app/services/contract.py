@@ -1,125 +1,640 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional, Tuple, Dict, Any
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Callable, FrozenSet, Iterator, List, Optional, Tuple, Dict, Any
 from fastapi import HTTPException, status
-from ..repositories.contract import ContractRepository, CategoryRepository, ChangeHistoryRepository
+from pydantic import BaseModel, TypeAdapter
+from ..repositories.contract import ContractRepository, CategoryRepository, ChangeHistoryRepository, SummaryRepository
 from ..schemas.contract import (
     ContractCreate, ContractUpdate, ContractFilters, PaginationParams,
-    Contract, Category, ChangeHistory, PaginatedResponse, CategoryCreate, CategoryUpdate
+    Contract, Category, ChangeHistory, PaginatedResponse, CategoryCreate, CategoryUpdate,
+    ContractBulkRequest, ContractBulkItemResult, ContractBulkResponse,
+    ContractBatchGetRequest, ContractBatchGetResponse, ContractSummary, SummaryBucket, ChangeHistoryFilters, ChangeHistoryPage,
+    SupplierSuggestion, SupplierSuggestResponse, FACET_FIELDS, FACET_FILTERS,
+    partial_contract_schema, partial_paginated_schema
 )
-from ..models.contract import Contract as ContractModel
+from ..models.contract import Contract as ContractModel, ContractStatus
+from ..config import settings
+from ..utils.cache import QueryCache, invalidate_query_caches
+from ..utils.export import csv_header, rows_to_csv, rows_to_ndjson
+from ..utils.profiling import current_profile, profile_layer
+from ..utils.supplier_index import supplier_index
+from .audit import audit_writer
+from datetime import datetime, timezone
+from decimal import Decimal
 import math
+import uuid
+
+
+# Counts per (database and data generation, normalized filter set), served for include_total=estimate
+count_cache = QueryCache(ttl_seconds=settings.count_cache_ttl_seconds)
+# Facet buckets per (database and data generation, facet, normalized filters without the facet's own filters)
+facet_cache = QueryCache(ttl_seconds=settings.facet_cache_ttl_seconds)
+
+
+# Attempts of an update without If-Match that keeps losing the race to concurrent writers
+UPDATE_ATTEMPTS = 2
+
+# Summary money is stored in cents and reported with exactly two decimal places
+CENT = Decimal("0.01")
+
+# Contract fields that decide which summary buckets a contract counts towards
+SUMMARY_FIELDS = ("status", "category_id", "start_date", "value")
+
+
+def _add_summary_deltas(deltas: Dict[Tuple[str, str], Tuple[int, int]], values: Any, sign: int) -> None:
+    """Accumulate the bucket changes for adding (sign=1) or removing (sign=-1) one contract"""
+    status_value = values["status"]
+    if isinstance(status_value, ContractStatus):
+        status_value = status_value.value
+    cents = int((Decimal(values["value"]) * 100).to_integral_value())
+    for key in (
+        ("status", status_value),
+        ("category", str(values["category_id"])),
+        ("start_month", values["start_date"].strftime("%Y-%m")),
+    ):
+        count, total = deltas.get(key, (0, 0))
+        deltas[key] = (count + sign, total + sign * cents)
+
+
+def _summary_deltas(old: Any = None, new: Any = None) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """Summary changes for replacing contract values old with new (either may be None)"""
+    deltas: Dict[Tuple[str, str], Tuple[int, int]] = {}
+    if old is not None:
+        _add_summary_deltas(deltas, old, -1)
+    if new is not None:
+        _add_summary_deltas(deltas, new, 1)
+    return deltas
+
+
+def _summary_values(contract: ContractModel) -> Dict[str, Any]:
+    """Snapshot of the summary fields of a loaded contract"""
+    return {field: getattr(contract, field) for field in SUMMARY_FIELDS}
+
+
+# Validates a whole list page in one call instead of one model_validate per row
+paginated_response_adapter = TypeAdapter(PaginatedResponse)
+batch_get_response_adapter = TypeAdapter(ContractBatchGetResponse)
+
+
+def _category_payload(row: Any) -> Dict[str, Any]:
+    """Nested category fields from a contract row"""
+    return {
+        "id": row.category_id,
+        "name": row.category_name,
+        "description": row.category_description,
+        "created_at": row.category_created_at,
+    }
+
+
+def _contract_payload(row: Any, fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+    """Contract response fields from a CONTRACT_ROW_COLUMNS row, or only id and ``fields``"""
+    if fields is not None:
+        payload = {"id": row.id}
+        for field in fields:
+            payload[field] = _category_payload(row) if field == "category" else getattr(row, field)
+        return payload
+    return {
+        "id": row.id,
+        "contract_number": row.contract_number,
+        "supplier": row.supplier,
+        "description": row.description,
+        "category_id": row.category_id,
+        "responsible": row.responsible,
+        "status": row.status,
+        "value": row.value,
+        "start_date": row.start_date,
+        "end_date": row.end_date,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "version": row.version,
+        "category": _category_payload(row),
+    }
+
+
+# Driver error codes per violated constraint kind: SQLite extended result codes
+# (sqlite3 errors' sqlite_errorcode) and PostgreSQL SQLSTATEs (pgcode / sqlstate).
+# contract_number is the only unique column a contract write can collide on
+# (ids are fresh UUIDs), and category_id its only foreign key, enforced on SQLite
+# by the foreign_keys pragma of the connection profile.
+CONSTRAINT_VIOLATION_CODES = {
+    2067: "unique", "23505": "unique",  # SQLITE_CONSTRAINT_UNIQUE, unique_violation
+    787: "foreign_key", "23503": "foreign_key"  # SQLITE_CONSTRAINT_FOREIGNKEY, foreign_key_violation
+}
+
+
+def _constraint_violation(exc: IntegrityError) -> Optional[str]:
+    """The kind of constraint ("unique", "foreign_key") an IntegrityError reports, if known"""
+    for attribute in ("sqlite_errorcode", "pgcode", "sqlstate"):
+        code = getattr(exc.orig, attribute, None)
+        if code is not None:
+            return CONSTRAINT_VIOLATION_CODES.get(code)
+    return None
+
+
+def _export_serializer(export_format: str) -> Tuple[str, Callable]:
+    """Header and batch serializer for an export format"""
+    if export_format == "csv":
+        return csv_header(), rows_to_csv
+    return "", rows_to_ndjson
 
 
 class ContractService:
     def __init__(self, db: Session):
         self.db = db
-        self.contract_repo = ContractRepository(db)
-        self.category_repo = CategoryRepository(db)
-        self.change_history_repo = ChangeHistoryRepository(db)
+        # Unit-of-work mode: repositories flush, each service operation commits once
+        self.contract_repo = profile_layer(ContractRepository(db, autocommit=False), "repository")
+        self.category_repo = profile_layer(CategoryRepository(db), "repository")
+        self.change_history_repo = profile_layer(ChangeHistoryRepository(db, autocommit=False), "repository")
+        self.summary_repo = profile_layer(SummaryRepository(db), "repository")
+        self._deferred_history: List[Dict[str, Any]] = []
+
+    def _log_change(self, contract_id: str, changed_by: str, changes: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Record a change history row: held for the write-behind audit writer when it
+        is running, otherwise inserted in the current unit of work.
+        """
+        if audit_writer.running:
+            self._deferred_history.append({
+                "contract_id": contract_id,
+                "changed_by": changed_by,
+                "changes": changes,
+                # Stamp now, in the naive UTC form server defaults use, not at insert time
+                "changed_at": datetime.now(timezone.utc).replace(tzinfo=None)
+            })
+        else:
+            self.change_history_repo.create(contract_id=contract_id, changed_by=changed_by, changes=changes)
+
+    def _commit(self) -> None:
+        """
+        Commit the unit of work, then queue its deferred history rows; rows the
+        writer refuses (stopped, or queue full) are inserted in a second transaction.
+        """
+        self.db.commit()
+        deferred, self._deferred_history = self._deferred_history, []
+        refused = [entry for entry in deferred if not audit_writer.submit(entry)]
+        if refused:
+            self.change_history_repo.bulk_create(refused)
+            self.db.commit()
 
     def create_contract(self, contract_data: ContractCreate, created_by: str = "system") -> Contract:
-        """Create a new contract with validation"""
-        # Check if contract number already exists
-        existing = self.contract_repo.get_by_contract_number(contract_data.contract_number)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"Contract with number '{contract_data.contract_number}' already exists"
-            )
+        """
+        Create a new contract with validation.
+
+        The contract, its summary deltas and its creation history row are written
+        in one transaction. Contract number uniqueness is enforced by the unique
+        constraint rather than a pre-read.
+        """
+        try:
+            contract = self.contract_repo.create(contract_data)
+        except IntegrityError as exc:
+            self.db.rollback()
+            violation = _constraint_violation(exc)
+            if violation == "unique":
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Contract with number '{contract_data.contract_number}' already exists"
+                )
+            if violation == "foreign_key":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Category with id {contract_data.category_id} does not exist"
+                )
+            raise
         
-        # Check if category exists
-        category = self.category_repo.get_by_id(contract_data.category_id)
-        if not category:
+        # Check the category through the relationship the response needs anyway
+        # (the guard when foreign keys are not enforced, e.g. SQLITE_FOREIGN_KEYS=false)
+        if contract.category is None:
+            self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Category with id {contract_data.category_id} does not exist"
             )
         
-        # Create contract
-        contract = self.contract_repo.create(contract_data)
+        # Count it in the dashboard summary
+        self.summary_repo.apply_deltas(_summary_deltas(new=contract_data.model_dump()))
         
         # Log creation in change history
-        self.change_history_repo.create(
+        self._log_change(
             contract_id=contract.id,
             changed_by=created_by,
             changes={"action": {"old": None, "new": "created"}}
         )
         
-        return Contract.model_validate(contract)
+        # Serialize before committing so expire-on-commit does not force a reload
+        result = Contract.model_validate(contract)
+        self._commit()
+        invalidate_query_caches()
+        supplier_index.apply([(None, contract_data.supplier)])
+        
+        return result
 
-    def get_contract(self, contract_id: str) -> Contract:
-        """Get contract by ID"""
-        contract = self.contract_repo.get_by_id(contract_id)
-        if not contract:
+    def bulk_create_contracts(self, bulk_data: ContractBulkRequest, created_by: str = "system") -> ContractBulkResponse:
+        """
+        Create (or upsert by contract_number) many contracts in one transaction.
+
+        Duplicates and categories are checked with one set-based query each,
+        rows are written with executemany and all change history rows with a
+        single INSERT. Per-item problems are reported in the results instead of
+        failing the whole batch, including upserts of contracts changed by
+        someone else since they were read (status "conflict").
+        """
+        items = bulk_data.items
+        existing = self.contract_repo.get_rows_by_contract_numbers(item.contract_number for item in items)
+        categories = self.category_repo.get_existing_ids(item.category_id for item in items)
+        
+        results = []
+        inserts, updates, history = [], [], []
+        supplier_changes = []
+        summary: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        seen_numbers = set()
+        for index, item in enumerate(items):
+            result = ContractBulkItemResult(index=index, contract_number=item.contract_number, status="error")
+            results.append(result)
+            
+            if item.contract_number in seen_numbers:
+                result.error = f"Contract number '{item.contract_number}' appears more than once in the batch"
+                continue
+            seen_numbers.add(item.contract_number)
+            
+            if item.category_id not in categories:
+                result.error = f"Category with id {item.category_id} does not exist"
+                continue
+            
+            values = item.model_dump()
+            current = existing.get(item.contract_number)
+            if current is None:
+                result.id = str(uuid.uuid4())
+                result.status = "created"
+                inserts.append({"id": result.id, **values})
+                supplier_changes.append((None, item.supplier))
+                _add_summary_deltas(summary, values, 1)
+                history.append({
+                    "contract_id": result.id,
+                    "changed_by": created_by,
+                    "changes": {"action": {"old": None, "new": "created"}}
+                })
+                continue
+            
+            result.id = current["id"]
+            if not bulk_data.upsert:
+                result.error = f"Contract with number '{item.contract_number}' already exists"
+                continue
+            
+            changes = {
+                field: {"old": str(current[field]), "new": str(new_value)}
+                for field, new_value in values.items()
+                if current[field] != new_value
+            }
+            if not changes:
+                result.status = "unchanged"
+                continue
+            result.status = "updated"
+            updates.append((result, current, values, changes))
+        
+        try:
+            # Updates go first and only apply if the version read above still
+            # holds, so a concurrent write is reported rather than overwritten
+            update_rows = [
+                {
+                    "id": current["id"],
+                    "expected_version": current["version"],
+                    **{field: values[field] for field in changes}
+                }
+                for _, current, values, changes in updates
+            ]
+            if not self.contract_repo.bulk_update_if_version(update_rows):
+                self.db.rollback()
+                for (result, _, _, _), row in zip(updates, update_rows):
+                    fields = {field: value for field, value in row.items() if field not in ("id", "expected_version")}
+                    _, contract = self.contract_repo.update_if_version(row["id"], fields, row["expected_version"])
+                    if contract is None:
+                        result.status = "conflict"
+                        result.error = f"Contract with number '{result.contract_number}' was modified concurrently"
+                updates = [update for update in updates if update[0].status == "updated"]
+            for _, current, values, changes in updates:
+                supplier_changes.append((current["supplier"], values["supplier"]))
+                _add_summary_deltas(summary, current, -1)
+                _add_summary_deltas(summary, values, 1)
+                history.append({"contract_id": current["id"], "changed_by": created_by, "changes": changes})
+            
+            self.contract_repo.bulk_insert(inserts)
+            self.change_history_repo.bulk_create(history)
+            self.summary_repo.apply_deltas(summary)
+            self.db.commit()
+        except IntegrityError:
+            # A concurrent writer took one of the contract numbers after our check
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Bulk write conflicted with a concurrent change; no contracts were written"
+            )
+        
+        if inserts or updates:
+            invalidate_query_caches()
+            supplier_index.apply(supplier_changes)
+        
+        counts = {outcome: 0 for outcome in ("created", "updated", "unchanged", "conflict", "error")}
+        for result in results:
+            counts[result.status] += 1
+        return ContractBulkResponse(
+            results=results,
+            created=counts["created"],
+            updated=counts["updated"],
+            unchanged=counts["unchanged"],
+            conflicts=counts["conflict"],
+            failed=counts["error"]
+        )
+
+    def get_contract(self, contract_id: str, fields: Optional[FrozenSet[str]] = None) -> BaseModel:
+        """Get contract by ID, optionally only the given fields (plus id)"""
+        if fields is not None:
+            row = self.contract_repo.get_row(contract_id, fields)
+        else:
+            row = self.contract_repo.get_by_id(contract_id)
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Contract with id '{contract_id}' not found"
             )
-        return Contract.model_validate(contract)
+        if fields is not None:
+            return partial_contract_schema(fields).model_validate(_contract_payload(row, fields))
+        return Contract.model_validate(row)
 
-    def list_contracts(self, filters: ContractFilters, pagination: PaginationParams) -> PaginatedResponse:
-        """List contracts with filtering and pagination"""
-        contracts, total = self.contract_repo.get_multi(filters, pagination)
-        
-        # Calculate pagination info
-        total_pages = math.ceil(total / pagination.page_size) if total > 0 else 0
-        
-        return PaginatedResponse(
-            items=[Contract.model_validate(contract) for contract in contracts],
-            total=total,
-            page=pagination.page,
-            page_size=pagination.page_size,
-            pages=total_pages
-        )
+    def batch_get_contracts(self, request: ContractBatchGetRequest) -> ContractBatchGetResponse:
+        """
+        Get many contracts by id or contract number.
 
-    def update_contract(self, contract_id: str, contract_data: ContractUpdate, updated_by: str = "system") -> Contract:
-        """Update contract with change tracking"""
-        # Get existing contract
-        existing_contract = self.contract_repo.get_by_id(contract_id)
-        if not existing_contract:
+        Keys are resolved with chunked IN queries and the whole response is
+        validated in one call. Items follow the request order; unknown keys are
+        reported as not found instead of failing the request.
+        """
+        rows = self.contract_repo.get_rows_by_keys(request.ids, request.by)
+        items, missing = [], []
+        for key in request.ids:
+            row = rows.get(key)
+            if row is None:
+                missing.append(key)
+                items.append({"key": key, "found": False})
+            else:
+                items.append({"key": key, "found": True, "contract": _contract_payload(row)})
+        return batch_get_response_adapter.validate_python({
+            "items": items,
+            "found": len(items) - len(missing),
+            "missing": missing
+        })
+
+    def get_contract_history(
+        self, contract_id: str, filters: ChangeHistoryFilters, page_size: int, cursor: Optional[str] = None
+    ) -> ChangeHistoryPage:
+        """Get one keyset page of a contract's change history, newest first"""
+        if not self.contract_repo.exists(contract_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Contract with id '{contract_id}' not found"
             )
         
-        # Check for contract number uniqueness if it's being updated
+        try:
+            page = self.change_history_repo.get_page(contract_id, filters, page_size, cursor)
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(exc)
+            )
+        
+        return ChangeHistoryPage(
+            items=[ChangeHistory.model_validate(entry) for entry in page.items],
+            page_size=page_size,
+            has_next=page.has_next,
+            next_cursor=page.next_cursor
+        )
+
+    def list_contracts(
+        self,
+        filters: ContractFilters,
+        pagination: PaginationParams,
+        highlight: bool = False,
+        fields: Optional[FrozenSet[str]] = None,
+        facets: Optional[FrozenSet[str]] = None
+    ) -> PaginatedResponse:
+        """
+        List contracts with filtering and pagination, optionally with search snippets.
+
+        With ``fields`` only those columns are selected and items carry just
+        them plus id, validated by the matching partial schema. Each of
+        ``facets`` adds per-value counts from one grouped query, or from
+        ``facet_cache`` when the same filters were counted since the last write.
+
+        Cached counts are keyed by the database serving the request (primary
+        or replica) and its data generation, so a write by any process never
+        reuses a count taken before it, and replica counts never answer
+        primary reads.
+        """
+        scope = None
+        if pagination.include_total == "estimate" or facets:
+            scope = self._cache_scope()
+        
+        total, total_mode = None, "none"
+        if pagination.include_total == "estimate" and scope is not None:
+            total = count_cache.get((scope, filters.cache_key()))
+            if total is not None:
+                total_mode = "estimate"
+        with_total = pagination.include_total == "exact" or (
+            pagination.include_total == "estimate" and total is None
+        )
+        
+        try:
+            page = self.contract_repo.get_multi(
+                filters, pagination, with_total=with_total, as_rows=True, fields=fields
+            )
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(exc)
+            )
+        
+        if with_total:
+            total, total_mode = page.total, "exact"
+            if scope is not None:
+                count_cache.set((scope, filters.cache_key()), total)
+        
+        # Calculate pagination info
+        total_pages = None
+        if total is not None:
+            total_pages = math.ceil(total / pagination.page_size) if total > 0 else 0
+        
+        highlights = None
+        if highlight and filters.q:
+            highlights = self.contract_repo.get_search_snippets(
+                filters.q, [row.id for row in page.items]
+            )
+        
+        payload = {
+            "items": [_contract_payload(row, fields) for row in page.items],
+            "total": total,
+            "page": pagination.page,
+            "page_size": pagination.page_size,
+            "pages": total_pages,
+            "total_mode": total_mode,
+            "has_next": page.has_next,
+            "next_cursor": page.next_cursor,
+            "highlights": highlights,
+            "facets": {
+                facet: self._facet_buckets(filters, facet, scope) for facet in FACET_FIELDS if facet in facets
+            } if facets else None
+        }
+        if fields is not None:
+            return partial_paginated_schema(fields).model_validate(payload)
+        return paginated_response_adapter.validate_python(payload)
+
+    def _cache_scope(self) -> Optional[Tuple[str, int]]:
+        """Cache key prefix for derived counts: the database this session reads and its data generation"""
+        generation = self.contract_repo.data_generation()
+        if generation is None:
+            return None
+        return str(self.db.get_bind().url), generation
+
+    def _facet_buckets(
+        self, filters: ContractFilters, facet: str, scope: Optional[Tuple[str, int]]
+    ) -> List[Dict[str, Any]]:
+        """Counts per value of facet under every filter except the facet's own (cached per _cache_scope)"""
+        facet_filters = filters.model_copy(update=dict.fromkeys(FACET_FILTERS[facet]))
+        key = (scope, facet, facet_filters.cache_key())
+        buckets = facet_cache.get(key) if scope is not None else None
+        if buckets is None:
+            counts = sorted(self.contract_repo.facet_counts(facet_filters, facet), key=lambda item: (-item[1], item[0]))
+            buckets = [{"value": value, "count": count} for value, count in counts]
+            if scope is not None:
+                facet_cache.set(key, buckets)
+        return buckets
+
+    def export_contracts(
+        self, filters: ContractFilters, export_format: str, sort_by: str = "start_date", sort_dir: str = "desc"
+    ) -> Iterator[str]:
+        """Stream filtered contracts as CSV or NDJSON chunks, one chunk per fetched batch"""
+        header, serialize = _export_serializer(export_format)
+        if header:
+            yield header
+        for rows in self.contract_repo.iter_export_rows(filters, sort_by, sort_dir, settings.export_batch_size):
+            yield serialize(rows)
+
+    def get_summary(self, expiring_within_days: int = 30) -> ContractSummary:
+        """Dashboard aggregates from the summary table plus a live expiring-soon count"""
+        buckets: Dict[str, List[SummaryBucket]] = {"status": [], "category": [], "start_month": []}
+        category_names = None
+        for row in self.summary_repo.get_all():
+            label = None
+            if row.dimension == "category":
+                if category_names is None:
+                    category_names = {str(c.id): c.name for c in self.category_repo.get_all()}
+                label = category_names.get(row.bucket)
+            buckets[row.dimension].append(SummaryBucket(
+                key=row.bucket,
+                label=label,
+                count=row.contract_count,
+                value=(Decimal(row.total_value_cents) / 100).quantize(CENT)
+            ))
+        
+        return ContractSummary(
+            total_count=sum(bucket.count for bucket in buckets["status"]),
+            total_value=sum((bucket.value for bucket in buckets["status"]), Decimal("0.00")),
+            by_status=buckets["status"],
+            by_category=buckets["category"],
+            by_start_month=buckets["start_month"],
+            expiring_within_days=expiring_within_days,
+            expiring_count=self.summary_repo.count_expiring(expiring_within_days)
+        )
+
+    def rebuild_summary(self) -> None:
+        """Recompute the summary table from scratch (drift repair)"""
+        self.summary_repo.rebuild()
+        self.db.commit()
+
+    def update_contract(
+        self,
+        contract_id: str,
+        contract_data: ContractUpdate,
+        updated_by: str = "system",
+        expected_version: Optional[int] = None
+    ) -> Contract:
+        """Update contract with change tracking, conditional on the version read (412 on If-Match mismatch)"""
         update_data = contract_data.model_dump(exclude_unset=True)
-        if "contract_number" in update_data:
-            existing_by_number = self.contract_repo.get_by_contract_number(update_data["contract_number"])
-            if existing_by_number and existing_by_number.id != contract_id:
+        null_fields = [field for field, value in update_data.items() if value is None]
+        if null_fields:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Fields cannot be null: {', '.join(null_fields)}"
+            )
+        for _ in range(UPDATE_ATTEMPTS):
+            try:
+                old_row, updated_contract = self.contract_repo.update_if_version(
+                    contract_id, update_data, expected_version
+                )
+            except IntegrityError as exc:
+                self.db.rollback()
+                violation = _constraint_violation(exc)
+                if violation == "unique":
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=f"Contract with number '{update_data['contract_number']}' already exists"
+                    )
+                if violation == "foreign_key":
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Category with id {update_data['category_id']} does not exist"
+                    )
+                raise
+            
+            if old_row is None:
                 raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=f"Contract with number '{update_data['contract_number']}' already exists"
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Contract with id '{contract_id}' not found"
                 )
-        
-        # Check category exists if it's being updated
-        if "category_id" in update_data:
-            category = self.category_repo.get_by_id(update_data["category_id"])
-            if not category:
+            if updated_contract is not None:
+                break
+            self.db.rollback()
+            if expected_version is not None:
                 raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Category with id {update_data['category_id']} does not exist"
+                    status_code=status.HTTP_412_PRECONDITION_FAILED,
+                    detail=f"Contract with id '{contract_id}' has been modified; reload it and retry"
                 )
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Contract with id '{contract_id}' is being modified concurrently; retry"
+            )
+        if updated_contract.category is None:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Category with id {update_data.get('category_id', old_row['category_id'])} does not exist"
+            )
         
-        # Track changes for history
+        # Track changes for history against the row the update replaced
         changes = {}
         for field, new_value in update_data.items():
-            old_value = getattr(existing_contract, field)
+            old_value = old_row[field]
             if old_value != new_value:
                 changes[field] = {"old": str(old_value), "new": str(new_value)}
+        if not changes:
+            # update_if_version wrote nothing: no history, summary delta or invalidation
+            return Contract.model_validate(updated_contract)
         
-        # Update contract
-        updated_contract = self.contract_repo.update(contract_id, contract_data)
+        self.summary_repo.apply_deltas(_summary_deltas(old_row, _summary_values(updated_contract)))
         
-        # Log changes if any
-        if changes:
-            self.change_history_repo.create(
-                contract_id=contract_id,
-                changed_by=updated_by,
-                changes=changes
-            )
+        self._log_change(
+            contract_id=contract_id,
+            changed_by=updated_by,
+            changes=changes
+        )
         
-        return Contract.model_validate(updated_contract)
+        result = Contract.model_validate(updated_contract)
+        self._commit()
+        invalidate_query_caches()
+        if "supplier" in changes:
+            supplier_index.apply([(old_row["supplier"], update_data["supplier"])])
+        
+        return result
 
     def delete_contract(self, contract_id: str, deleted_by: str = "system") -> None:
         """Delete contract"""
@@ -130,25 +645,49 @@ class ContractService:
                 detail=f"Contract with id '{contract_id}' not found"
             )
         
-        # Log deletion before removing
+        # Queued history rows would outlive the cascade that removes the contract's history
+        audit_writer.discard(contract_id)
+        
+        # Log deletion before removing; everything commits together
         self.change_history_repo.create(
             contract_id=contract_id,
             changed_by=deleted_by,
             changes={"action": {"old": "active", "new": "deleted"}}
         )
         
+        self.summary_repo.apply_deltas(_summary_deltas(old=_summary_values(contract)))
+        supplier = contract.supplier
         success = self.contract_repo.delete(contract_id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to delete contract"
             )
+        self.db.commit()
+        invalidate_query_caches()
+        supplier_index.apply([(supplier, None)])
+
+    def load_supplier_index(self) -> None:
+        """(Re)build the supplier typeahead index from the contracts table"""
+        supplier_index.load(self.contract_repo.supplier_counts())
+
+    def suggest_suppliers(self, prefix: str, limit: int = 10) -> SupplierSuggestResponse:
+        """Suppliers whose name starts with prefix, ignoring case and accents; most contracts first"""
+        if not supplier_index.loaded:
+            self.load_supplier_index()
+        return _supplier_suggestions(prefix, limit)
+
+
+def _supplier_suggestions(prefix: str, limit: int) -> SupplierSuggestResponse:
+    return SupplierSuggestResponse(prefix=prefix, items=[
+        SupplierSuggestion(name=name, contracts=contracts) for name, contracts in supplier_index.suggest(prefix, limit)
+    ])
 
 
 class CategoryService:
     def __init__(self, db: Session):
         self.db = db
-        self.category_repo = CategoryRepository(db)
+        self.category_repo = profile_layer(CategoryRepository(db), "repository")
 
     def create_category(self, category_data: CategoryCreate) -> Category:
         """Create a new category"""
@@ -207,6 +746,8 @@ class CategoryService:
 
     def delete_category(self, category_id: int) -> None:
         """Delete category"""
+        # Check for contracts on the writer, in the delete's transaction, so none can be added in between
+        self.db.info["writing"] = True
         category = self.category_repo.get_by_id(category_id)
         if not category:
             raise HTTPException(
@@ -224,4 +765,134 @@ class CategoryService:
             )
         
         self.db.delete(category)
-        self.db.commit()
\ No newline at end of file
+        try:
+            self.db.commit()
+        except IntegrityError as exc:
+            self.db.rollback()
+            if _constraint_violation(exc) == "foreign_key":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cannot delete category. It has associated contracts."
+                )
+            raise
+
+
+class AsyncContractService:
+    """
+    Asyncio variant of ContractService.
+
+    Each call runs the synchronous service against the AsyncSession's connection
+    through ``run_sync``, so the repository/query logic is shared while database
+    I/O is awaited on the async driver instead of blocking the event loop.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, method: str, *args, **kwargs):
+        call = lambda session: getattr(ContractService(session), method)(*args, **kwargs)
+        profile = current_profile()
+        if profile is not None:
+            call = profile.timed("service", call)
+        return await self.db.run_sync(call)
+
+    async def create_contract(self, contract_data: ContractCreate, created_by: str = "system") -> Contract:
+        """Create a new contract with validation"""
+        return await self._run("create_contract", contract_data, created_by)
+
+    async def bulk_create_contracts(self, bulk_data: ContractBulkRequest, created_by: str = "system") -> ContractBulkResponse:
+        """Create (or upsert) many contracts in one transaction"""
+        return await self._run("bulk_create_contracts", bulk_data, created_by)
+
+    async def get_contract(self, contract_id: str, fields: Optional[FrozenSet[str]] = None) -> BaseModel:
+        """Get contract by ID, optionally only the given fields"""
+        return await self._run("get_contract", contract_id, fields)
+
+    async def batch_get_contracts(self, request: ContractBatchGetRequest) -> ContractBatchGetResponse:
+        """Get many contracts by id or contract number"""
+        return await self._run("batch_get_contracts", request)
+
+    async def suggest_suppliers(self, prefix: str, limit: int = 10) -> SupplierSuggestResponse:
+        """Supplier typeahead from the in-memory index, without a database round trip once loaded"""
+        if not supplier_index.loaded:
+            await self._run("load_supplier_index")
+        return _supplier_suggestions(prefix, limit)
+
+    async def get_contract_history(
+        self, contract_id: str, filters: ChangeHistoryFilters, page_size: int, cursor: Optional[str] = None
+    ) -> ChangeHistoryPage:
+        """Get one keyset page of a contract's change history"""
+        return await self._run("get_contract_history", contract_id, filters, page_size, cursor)
+
+    async def list_contracts(
+        self,
+        filters: ContractFilters,
+        pagination: PaginationParams,
+        highlight: bool = False,
+        fields: Optional[FrozenSet[str]] = None,
+        facets: Optional[FrozenSet[str]] = None
+    ) -> PaginatedResponse:
+        """List contracts with filtering and pagination, optionally with search snippets and facet counts"""
+        return await self._run("list_contracts", filters, pagination, highlight, fields, facets)
+
+    async def export_contracts(
+        self, filters: ContractFilters, export_format: str, sort_by: str = "start_date", sort_dir: str = "desc"
+    ) -> AsyncIterator[str]:
+        """Stream filtered contracts as CSV or NDJSON chunks from a server-side cursor"""
+        header, serialize = _export_serializer(export_format)
+        query = ContractRepository(self.db.sync_session).build_export_query(filters, sort_by, sort_dir)
+        result = await self.db.stream(query.execution_options(yield_per=settings.export_batch_size))
+        if header:
+            yield header
+        async for rows in result.partitions():
+            yield serialize(rows)
+
+    async def get_summary(self, expiring_within_days: int = 30) -> ContractSummary:
+        """Dashboard aggregates"""
+        return await self._run("get_summary", expiring_within_days)
+
+    async def update_contract(
+        self,
+        contract_id: str,
+        contract_data: ContractUpdate,
+        updated_by: str = "system",
+        expected_version: Optional[int] = None
+    ) -> Contract:
+        """Update contract with change tracking"""
+        return await self._run("update_contract", contract_id, contract_data, updated_by, expected_version)
+
+    async def delete_contract(self, contract_id: str, deleted_by: str = "system") -> None:
+        """Delete contract"""
+        return await self._run("delete_contract", contract_id, deleted_by)
+
+
+class AsyncCategoryService:
+    """Asyncio variant of CategoryService, see AsyncContractService"""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, method: str, *args, **kwargs):
+        call = lambda session: getattr(CategoryService(session), method)(*args, **kwargs)
+        profile = current_profile()
+        if profile is not None:
+            call = profile.timed("service", call)
+        return await self.db.run_sync(call)
+
+    async def create_category(self, category_data: CategoryCreate) -> Category:
+        """Create a new category"""
+        return await self._run("create_category", category_data)
+
+    async def get_category(self, category_id: int) -> Category:
+        """Get category by ID"""
+        return await self._run("get_category", category_id)
+
+    async def get_all_categories(self) -> List[Category]:
+        """Get all categories"""
+        return await self._run("get_all_categories")
+
+    async def update_category(self, category_id: int, category_data: CategoryUpdate) -> Category:
+        """Update category"""
+        return await self._run("update_category", category_id, category_data)
+
+    async def delete_category(self, category_id: int) -> None:
+        """Delete category"""
+        return await self._run("delete_category", category_id)
\ No newline at end of file
@@ -1,3 +1,13 @@
-from .pagination import PaginatedResult, PaginationMeta, paginate
+from .pagination import PaginatedResult, PaginationMeta, paginate, encode_cursor, decode_cursor
+from .cache import QueryCache, invalidate_query_caches
+from .etag import format_etag, parse_etag
+from .responses import FastJSONResponse
+from .metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+from .query_stats import QueryStats, capture_queries, instrument_engine
 
-__all__ = ["PaginatedResult", "PaginationMeta", "paginate"]
\ No newline at end of file
+__all__ = [
+    "PaginatedResult", "PaginationMeta", "paginate", "encode_cursor", "decode_cursor",
+    "QueryCache", "invalidate_query_caches", "format_etag", "parse_etag",
+    "FastJSONResponse", "MetricsRegistry", "PROMETHEUS_CONTENT_TYPE",
+    "QueryStats", "capture_queries", "instrument_engine"
+]
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+In-process query result caching
+"""
+from typing import Any, Dict, Hashable, Tuple
+import threading
+import time
+import weakref
+
+_MISSING = object()
+_registry: "weakref.WeakSet[QueryCache]" = weakref.WeakSet()
+
+
+class QueryCache:
+    """
+    Small TTL cache for derived query results (counts, aggregates).
+
+    Entries expire after ``ttl_seconds`` and every cache is cleared by
+    ``invalidate_query_caches()``, which services call after writes. That only
+    reaches this process: callers that must see other processes' writes put
+    the database's data generation (see models.generation) in their keys.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        _registry.add(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the oldest entry when full"""
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+def invalidate_query_caches() -> None:
+    """Clear every QueryCache, e.g. after contracts were written"""
+    for cache in list(_registry):
+        cache.clear()
+
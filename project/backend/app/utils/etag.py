@@ -0,0 +1,28 @@
+"""
+ETag helpers for optimistic concurrency on versioned resources
+"""
+from typing import Optional
+
+
+def format_etag(version: int) -> str:
+    """ETag header value for a resource version"""
+    return f'"{version}"'
+
+
+def parse_etag(value: str) -> Optional[int]:
+    """
+    Version carried by an If-Match header value.
+
+    Returns None for ``*`` (any version). Raises ValueError for anything that
+    is not a single ETag produced by format_etag, including weak tags
+    (``W/"1"``): If-Match uses the strong comparison (RFC 9110, 13.1.1), which
+    a weak tag never passes.
+    """
+    value = value.strip()
+    if value == "*":
+        return None
+    if value.startswith("W/"):
+        raise ValueError(f"Weak ETag cannot satisfy If-Match: {value!r}")
+    if len(value) < 2 or not (value.startswith('"') and value.endswith('"')):
+        raise ValueError(f"Malformed ETag: {value!r}")
+    return int(value[1:-1])
@@ -0,0 +1,52 @@
+"""
+Row serializers for streaming contract exports
+"""
+from typing import Any, Iterable, Sequence
+from datetime import date
+from decimal import Decimal
+import csv
+import enum
+import io
+import json
+
+EXPORT_COLUMNS = (
+    "id", "contract_number", "supplier", "description", "category_id", "category_name",
+    "responsible", "status", "value", "start_date", "end_date", "created_at", "updated_at"
+)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _plain(value: Any) -> Any:
+    """Convert a column value to a JSON/CSV friendly scalar"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def csv_header() -> str:
+    """CSV header line for EXPORT_COLUMNS"""
+    return ",".join(EXPORT_COLUMNS) + "\r\n"
+
+
+def rows_to_csv(rows: Iterable[Sequence[Any]]) -> str:
+    """Serialize a batch of rows (in EXPORT_COLUMNS order) as CSV lines"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_plain(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+def rows_to_ndjson(rows: Iterable[Sequence[Any]]) -> str:
+    """Serialize a batch of rows (in EXPORT_COLUMNS order) as one JSON object per line"""
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row))), ensure_ascii=False) + "\n"
+        for row in rows
+    )
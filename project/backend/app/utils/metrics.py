@@ -0,0 +1,256 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Metrics are plain dicts updated from the event loop thread, so recording
+takes no locks. Each worker process aggregates its own values; with a
+multiprocess directory configured, workers periodically dump a snapshot
+file there and a scrape merges every worker's file, summing counters and
+histograms. Gauges only count live workers, so a crashed worker's in-flight
+requests do not linger.
+"""
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import glob
+import json
+import math
+import os
+import time
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Request and response body size buckets in bytes
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+# SQL statements per request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    """A named metric family with one value per label combination"""
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, object] = {}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, labels: Labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """Per label set: a count per bucket (not cumulative, the last one is +Inf) followed by the sum"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+
+class MetricsRegistry:
+    """The metrics of one process, with snapshot files for multi-worker aggregation"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self._snapshot_pid: Optional[int] = None
+        self._snapshot_name = ""
+
+    def _register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def reset(self) -> None:
+        """Drop every recorded value (tests, forked children)"""
+        for metric in self.metrics.values():
+            metric.values.clear()
+
+    def snapshot(self) -> Dict[str, list]:
+        """JSON-serializable copy of every value: {name: [[labels, value], ...]}"""
+        return {
+            name: [[list(labels), value] for labels, value in metric.values.items()]
+            for name, metric in self.metrics.items()
+        }
+
+    def write_snapshot(self, directory: str) -> None:
+        """Atomically replace this process's snapshot file in the multiprocess directory"""
+        pid = os.getpid()
+        if pid != self._snapshot_pid:
+            # New process (or forked child): its own file, named so a reused pid never overwrites another
+            self._snapshot_pid = pid
+            self._snapshot_name = f"worker-{pid}-{time.time_ns()}.json"
+        path = os.path.join(directory, self._snapshot_name)
+        partial = f"{path}.tmp"
+        with open(partial, "w") as snapshot_file:
+            json.dump({"pid": pid, "metrics": self.snapshot()}, snapshot_file)
+        os.replace(partial, path)
+
+    def collect(self, directory: Optional[str] = None) -> Dict[str, Dict[Labels, object]]:
+        """Values of this process, or merged from every worker's snapshot in directory"""
+        if directory is None:
+            return {name: dict(metric.values) for name, metric in self.metrics.items()}
+        self.write_snapshot(directory)
+        merged: Dict[str, Dict[Labels, object]] = {name: {} for name in self.metrics}
+        for path in glob.glob(os.path.join(directory, "worker-*.json")):
+            try:
+                with open(path) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue  # Removed or replaced while listing
+            alive = _pid_alive(snapshot["pid"])
+            for name, series in snapshot["metrics"].items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not alive):
+                    continue
+                for labels, value in series:
+                    _merge_value(merged[name], tuple(labels), value)
+        return merged
+
+    def render(self, directory: Optional[str] = None) -> str:
+        """Prometheus text exposition of this process or of all workers"""
+        values = self.collect(directory)
+        lines: List[str] = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(values[name].items()):
+                label_text = _format_labels(metric.labelnames, labels)
+                if metric.kind != "histogram":
+                    lines.append(f"{_series(name, label_text)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else _format_value(bound)
+                    bucket_labels = _join(label_text, f'le="{le}"')
+                    lines.append(f"{_series(name + '_bucket', bucket_labels)} {cumulative}")
+                lines.append(f"{_series(name + '_sum', label_text)} {_format_value(value[-1])}")
+                lines.append(f"{_series(name + '_count', label_text)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+async def write_snapshots(registry: MetricsRegistry, directory: str, interval_seconds: float) -> None:
+    """Keep this worker's snapshot file fresh until cancelled, writing a final one on the way out"""
+    try:
+        while True:
+            registry.write_snapshot(directory)
+            await asyncio.sleep(interval_seconds)
+    finally:
+        registry.write_snapshot(directory)
+
+
+def remove_snapshots(directory: str) -> None:
+    """Delete every worker snapshot in directory, e.g. left over from a previous server run"""
+    for path in glob.glob(os.path.join(directory, "worker-*.json*")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_value(target: Dict[Labels, object], labels: Labels, value) -> None:
+    existing = target.get(labels)
+    if existing is None:
+        target[labels] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        target[labels] = [a + b for a, b in zip(existing, value)]
+    else:
+        target[labels] = existing + value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+def _series(name: str, label_text: str) -> str:
+    return f"{name}{{{label_text}}}" if label_text else name
+
+
+def _join(*parts: str) -> str:
+    return ",".join(part for part in parts if part)
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+# Process-wide registry and the HTTP metrics recorded by api.middleware.MetricsMiddleware
+registry = MetricsRegistry()
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency in seconds",
+    ("method", "route", "status"), LATENCY_BUCKETS
+)
+http_request_size_bytes = registry.histogram(
+    "http_request_size_bytes", "HTTP request body size in bytes", ("method", "route"), SIZE_BUCKETS
+)
+http_response_size_bytes = registry.histogram(
+    "http_response_size_bytes", "HTTP response body size in bytes", ("method", "route"), SIZE_BUCKETS
+)
+http_requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled", ("method",)
+)
+http_request_db_queries = registry.histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+http_request_db_seconds = registry.histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per HTTP request", ("method", "route"), LATENCY_BUCKETS
+)
+db_repeated_statements_total = registry.counter(
+    "db_repeated_statements_total", "Statements repeated often enough in one request to suggest an N+1 loop",
+    ("method", "route")
+)
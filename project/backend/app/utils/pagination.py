@@ -1,8 +1,11 @@
 """
 Pagination utilities
 """
-from typing import List, TypeVar, Generic
+from typing import Any, Dict, List, TypeVar, Generic
 from pydantic import BaseModel
+import base64
+import binascii
+import json
 import math
 
 T = TypeVar('T')
@@ -42,4 +45,22 @@ def paginate(
         has_prev=page > 1
     )
     
-    return PaginatedResult(items=items, meta=meta)
\ No newline at end of file
+    return PaginatedResult(items=items, meta=meta)
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    """Encode a keyset position into an opaque, URL-safe cursor string"""
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError("Invalid pagination cursor") from exc
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid pagination cursor")
+    return payload
@@ -0,0 +1,233 @@
+"""
+On-demand request profiling.
+
+A profiled request runs under cProfile with tracemalloc tracing, and a
+RequestProfile held in a context variable times the service and repository
+layers by wall clock (cProfile only sees coroutines while they run, not while
+they wait on the database). Async services time each synchronous service call
+and services wrap their repositories with ``profile_layer``, which returns
+the repository itself when no profile is active. Results are kept in a
+ProfileStore directory: a JSON summary and a pstats dump per request.
+"""
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+import functools
+import glob
+import json
+import os
+import pstats
+import re
+import time
+import tracemalloc
+
+from ..config import settings
+
+# Layers timed inside the request; "route" is the rest of the request (routing,
+# dependencies, validation, serialization) and needs no hook of its own
+TIMED_LAYERS = ("service", "repository")
+# Functions and allocation sites kept in each summary
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+# The app package, whose functions get their own list in each summary
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$")
+
+# Allocations made by the profiling machinery itself
+_ALLOCATION_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class RequestProfile:
+    """Wall time spent in each timed layer during one request"""
+
+    def __init__(self):
+        self.layer_seconds: Dict[str, float] = dict.fromkeys(TIMED_LAYERS, 0.0)
+        self._inside: Dict[str, bool] = dict.fromkeys(TIMED_LAYERS, False)
+
+    def timed(self, layer: str, func: Callable) -> Callable:
+        """Wrap func so its calls count toward layer, ignoring calls nested in the same layer"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if self._inside[layer]:
+                return func(*args, **kwargs)
+            self._inside[layer] = True
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.layer_seconds[layer] += time.perf_counter() - started
+                self._inside[layer] = False
+        return wrapper
+
+    def layers(self, wall_seconds: float) -> Dict[str, Dict[str, float]]:
+        """Inclusive and self time per layer in ms; each layer's self time excludes the layer below"""
+        totals = {"route": wall_seconds, **self.layer_seconds}
+        names = list(totals)
+        result = {}
+        for name, below in zip(names, names[1:] + [None]):
+            inner = totals[below] if below else 0.0
+            result[name] = {
+                "total_ms": round(totals[name] * 1000, 3),
+                "self_ms": round(max(totals[name] - inner, 0.0) * 1000, 3),
+            }
+        return result
+
+
+class _LayerProxy:
+    """Forwards attribute access to target, timing method calls as one layer"""
+
+    def __init__(self, target: Any, profile: RequestProfile, layer: str):
+        self._target = target
+        self._profile = profile
+        self._layer = layer
+
+    def __getattr__(self, name: str):
+        value = getattr(self._target, name)
+        if callable(value) and not name.startswith("_"):
+            return self._profile.timed(self._layer, value)
+        return value
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def start_profile() -> tuple:
+    """Begin layer timing for the current request; returns the profile and a reset token"""
+    profile = RequestProfile()
+    return profile, _current_profile.set(profile)
+
+
+def end_profile(token) -> None:
+    _current_profile.reset(token)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def profile_layer(target: Any, layer: str) -> Any:
+    """target itself, or a timing proxy for it while the current request is being profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        return target
+    return _LayerProxy(target, profile, layer)
+
+
+def start_allocation_tracing() -> bool:
+    """Start tracemalloc (or reset its peak); returns whether this call started it"""
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        return False
+    tracemalloc.start()
+    return True
+
+
+def allocation_summary(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> Dict[str, Any]:
+    """Net allocation change between two snapshots with the largest growing sites"""
+    differences = after.filter_traces(_ALLOCATION_FILTERS).compare_to(
+        before.filter_traces(_ALLOCATION_FILTERS), "lineno"
+    )
+    return {
+        "net_bytes": sum(difference.size_diff for difference in differences),
+        "peak_bytes": tracemalloc.get_traced_memory()[1],
+        "top": [
+            {
+                "location": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+                "size_diff_bytes": difference.size_diff,
+                "count_diff": difference.count_diff,
+            }
+            for difference in differences[:TOP_ALLOCATIONS]
+            if difference.size_diff
+        ],
+    }
+
+
+def function_summary(stats: pstats.Stats, prefix: str = "") -> List[Dict[str, Any]]:
+    """The functions with the largest cumulative time, optionally only from files under prefix"""
+    rows = sorted(
+        (item for item in stats.stats.items() if item[0][0].startswith(prefix)),
+        key=lambda item: item[1][3], reverse=True
+    )[:TOP_FUNCTIONS]
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, total, cumulative, _) in rows
+    ]
+
+
+def new_profile_id() -> str:
+    """UTC timestamp to the microsecond plus a random suffix, so ids sort by age"""
+    now = time.time()
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now % 1 * 1_000_000):06d}-{os.urandom(4).hex()}"
+
+
+class ProfileStore:
+    """Profiles on disk: <id>.json summaries and <id>.prof pstats dumps, newest max_profiles kept"""
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, summary: Dict[str, Any], stats: pstats.Stats) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, summary["id"])
+        stats.dump_stats(f"{base}.prof")
+        # Summary last and atomically: a listed profile always has its dump
+        with open(f"{base}.json.tmp", "w") as summary_file:
+            json.dump(summary, summary_file)
+        os.replace(f"{base}.json.tmp", f"{base}.json")
+        self.prune()
+
+    def prune(self) -> None:
+        for path in self._summary_paths()[self.max_profiles:]:
+            for stale in (path, f"{path[:-len('.json')]}.prof"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries, newest first"""
+        summaries = []
+        for path in self._summary_paths():
+            try:
+                with open(path) as summary_file:
+                    summaries.append(json.load(summary_file))
+            except (OSError, ValueError):
+                continue  # Pruned while listing
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json")) as summary_file:
+                return json.load(summary_file)
+        except (OSError, ValueError):
+            return None
+
+    def dump_path(self, profile_id: str) -> Optional[str]:
+        """Path of the pstats dump, loadable with pstats or snakeviz"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.prof")
+        return path if os.path.exists(path) else None
+
+    def _summary_paths(self) -> List[str]:
+        # Ids start with a UTC timestamp, so name order is age order
+        return sorted(glob.glob(os.path.join(self.directory, "*.json")), reverse=True)
+
+
+def profile_store() -> ProfileStore:
+    """The store configured in settings"""
+    return ProfileStore(settings.profiling_dir, settings.profiling_max_profiles)
@@ -0,0 +1,126 @@
+"""
+SQL statement instrumentation.
+
+Cursor events on the engines passed to ``instrument_engine()`` (the app's
+own when sql_instrumentation or the slow query log is enabled) time each
+statement and add it to the QueryStats of the current request, held in a
+context variable that asyncio tasks, SQLAlchemy's async greenlets and
+threadpool calls all inherit. Statements slower than
+``settings.sql_slow_query_ms`` are logged wherever they run.
+``capture_queries()`` collects statements from every thread, for tests and
+scripts that need a query budget.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+import logging
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Longest statement text kept for logs and reports
+STATEMENT_PREVIEW_CHARS = 500
+
+
+class QueryStats:
+    """Statements executed during one request (or one capture_queries block)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.statements: Counter = Counter()  # Statement text -> executions
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.statements[statement] += 1
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements executed at least threshold times, most repeated first (likely N+1 loops)"""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: total DB time with the statement count, and the slowest statement"""
+        return (
+            f'db;dur={self.total_seconds * 1000:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_seconds * 1000:.2f}"
+        )
+
+    def report(self) -> str:
+        """Statement counts, most executed first, for assertion messages"""
+        return "\n".join(
+            f"{n:>4}x {statement_preview(statement)}" for statement, n in self.statements.most_common()
+        )
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+_captures: List[QueryStats] = []
+
+
+def start_request_stats() -> Tuple[QueryStats, object]:
+    """Begin collecting statements for the current request; returns the stats and a reset token"""
+    stats = QueryStats()
+    return stats, _request_stats.set(stats)
+
+
+def end_request_stats(token) -> None:
+    _request_stats.reset(token)
+
+
+def current_request_stats() -> Optional[QueryStats]:
+    return _request_stats.get()
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryStats]:
+    """Collect every statement executed in any thread while the block runs"""
+    stats = QueryStats()
+    _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        _captures.remove(stats)
+
+
+def statement_preview(statement: str) -> str:
+    """Statement on one line, truncated for logs"""
+    statement = " ".join(statement.split())
+    if len(statement) > STATEMENT_PREVIEW_CHARS:
+        return statement[:STATEMENT_PREVIEW_CHARS] + "..."
+    return statement
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement run on an engine (no-op when it is already instrumented)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started_at"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started_at", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+    for capture in _captures:
+        capture.record(statement, seconds)
+    if settings.sql_slow_query_ms and seconds * 1000 >= settings.sql_slow_query_ms:
+        logger.warning("Slow query (%.1f ms): %s", seconds * 1000, statement_preview(statement))
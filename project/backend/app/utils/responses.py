@@ -0,0 +1,30 @@
+"""
+Fast JSON response encoding
+"""
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+import orjson
+
+
+def _orjson_default(value: Any) -> Any:
+    """Encode types orjson does not handle natively the way Pydantic's JSON mode does"""
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    orjson-encoded JSON response.
+
+    Accepts already JSON-ready content (what FastAPI produces from a
+    response_model) as well as plain Python values such as datetimes, enums
+    and Decimals, which are encoded like Pydantic's JSON mode would.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        )
@@ -0,0 +1,178 @@
+"""
+In-memory supplier name index for typeahead.
+
+Distinct supplier names are kept as a sorted list of normalized keys
+(casefolded, accents and extra whitespace removed) with their contract
+counts, so a prefix lookup is a binary search over the keys instead of an
+``ILIKE '%x%'`` scan of the contracts table. Each key shows as its most used
+spelling. The index is loaded at startup and adjusted by every contract
+write in this process; a periodic reload picks up writes made by other
+workers or scripts.
+"""
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import logging
+import threading
+import unicodedata
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Most suggestions one lookup returns
+MAX_SUGGESTIONS = 50
+# Keys kept per ranked prefix; the slack absorbs writes that push keys out before a rebuild is needed
+RANKED_DEPTH = 2 * MAX_SUGGESTIONS
+# Prefixes up to this length (which match the most names) are ranked at load and kept up to date
+RANKED_PREFIX_LENGTH = 4
+# Longer prefixes matching at least this many names keep their ranking once looked up
+RESULT_CACHE_MIN_MATCHES = 64
+# Sorts after every character a normalized key can contain
+_KEY_END = "\U0010ffff"
+
+SupplierChange = Tuple[Optional[str], Optional[str]]  # (old name, new name); None for create/delete
+
+
+def normalize_supplier(name: str) -> str:
+    """Case-, accent- and whitespace-insensitive form of a supplier name"""
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    return " ".join("".join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+class SupplierIndex:
+    """
+    Sorted normalized supplier names with contract counts; safe to use from any thread.
+
+    Short prefixes match too many names to rank per lookup, so each one up to
+    RANKED_PREFIX_LENGTH keeps its RANKED_DEPTH best keys, and writes adjust
+    those lists in place. A truncated list ranks every key it holds above
+    every key it left out; a key that falls below its last entry is dropped,
+    and a list left shorter than MAX_SUGGESTIONS is rebuilt by the next lookup.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._spellings: Dict[str, Counter] = {}  # Key -> original spelling -> contracts
+        self._counts: Dict[str, int] = {}
+        self._ranked: Dict[str, List[str]] = {}  # Prefix -> best keys, most contracts first
+        self._truncated: Set[str] = set()  # Ranked prefixes matching more keys than their list holds
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _rank(self, key: str) -> Tuple[int, str]:
+        return -self._counts[key], key
+
+    def load(self, rows: Iterable[Tuple[str, int]]) -> None:
+        """Replace the contents with (supplier, contracts) rows"""
+        spellings: Dict[str, Counter] = {}
+        for name, count in rows:
+            spellings.setdefault(normalize_supplier(name), Counter())[name] += count
+        counts = {key: sum(names.values()) for key, names in spellings.items()}
+        ranked: Dict[str, List[str]] = {}
+        truncated: Set[str] = set()
+        for key in sorted(counts, key=lambda key: (-counts[key], key)):
+            for length in range(1, min(len(key), RANKED_PREFIX_LENGTH) + 1):
+                best = ranked.setdefault(key[:length], [])
+                if len(best) < RANKED_DEPTH:
+                    best.append(key)
+                else:
+                    truncated.add(key[:length])
+        keys = sorted(spellings)
+        with self._lock:
+            self._keys, self._spellings, self._counts = keys, spellings, counts
+            self._ranked, self._truncated = ranked, truncated
+            self.loaded = True
+
+    def apply(self, changes: Iterable[SupplierChange]) -> None:
+        """Move one contract per change from its old supplier name to its new one"""
+        if not self.loaded:
+            return
+        with self._lock:
+            for old, new in changes:
+                if old == new:
+                    continue
+                if old is not None:
+                    self._add(old, -1)
+                if new is not None:
+                    self._add(new, 1)
+
+    def _add(self, name: str, delta: int) -> None:
+        key = normalize_supplier(name)
+        names = self._spellings.get(key)
+        if names is None:
+            if delta < 0:
+                return  # Not indexed (written before the last load); nothing to take away
+            names = self._spellings[key] = Counter()
+            self._counts[key] = 0
+            insort(self._keys, key)
+        names[name] += delta
+        if names[name] <= 0:
+            del names[name]
+        self._counts[key] += delta
+        removed = self._counts[key] <= 0 or not names
+        if removed:
+            del self._spellings[key], self._counts[key]
+            del self._keys[bisect_left(self._keys, key)]
+        self._rerank(key, removed)
+
+    def _rerank(self, key: str, removed: bool) -> None:
+        """Move key within the ranked list of each of its prefixes after its count changed"""
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            best = self._ranked.get(prefix)
+            if best is None:
+                continue
+            if key in best:
+                best.remove(key)
+            truncated = prefix in self._truncated
+            if not removed and (not truncated or (best and self._rank(key) < self._rank(best[-1]))):
+                insort(best, key, key=self._rank)
+                if len(best) > RANKED_DEPTH:
+                    del best[RANKED_DEPTH:]
+                    self._truncated.add(prefix)
+            elif truncated and len(best) < MAX_SUGGESTIONS:
+                del self._ranked[prefix]  # Keys left out may now belong in the top
+                self._truncated.discard(prefix)
+
+    def _ranked_keys(self, prefix: str) -> List[str]:
+        best = self._ranked.get(prefix)
+        if best is None:
+            start = bisect_left(self._keys, prefix)
+            end = bisect_left(self._keys, prefix + _KEY_END, start)
+            best = heapq.nsmallest(RANKED_DEPTH, self._keys[start:end], key=self._rank)
+            if len(prefix) <= RANKED_PREFIX_LENGTH or end - start >= RESULT_CACHE_MIN_MATCHES:
+                self._ranked[prefix] = best
+                if end - start > RANKED_DEPTH:
+                    self._truncated.add(prefix)
+        return best
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Up to limit (at most MAX_SUGGESTIONS) suppliers starting with prefix, most contracts first"""
+        key = normalize_supplier(prefix)
+        if not key:
+            return []
+        with self._lock:
+            return [
+                (self._spellings[match].most_common(1)[0][0], self._counts[match])
+                for match in self._ranked_keys(key)[:limit]
+            ]
+
+
+async def reload_periodically(load: Callable[[], None], interval_seconds: float) -> None:
+    """Call load in a worker thread every interval until cancelled"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(load)
+        except Exception:
+            logger.exception("Supplier index reload failed")
+
+
+# Process-wide index used by ContractService and the suggest endpoint
+supplier_index = SupplierIndex()
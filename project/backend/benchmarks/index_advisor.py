@@ -0,0 +1,384 @@
+"""
+Index advisor for the contract list queries.
+
+Builds every filter scenario in SCENARIOS against every SORT_FIELDS key in
+both directions, captures the exact SQL ContractRepository emits for the page
+and for the count, and runs EXPLAIN QUERY PLAN on a generated dataset (the
+benchmark fixture by default). Plans that scan the whole contracts table, sort
+in a temp B-tree or ignore an equality filter are flagged, and an index is
+proposed per problem: the equality-filtered columns, then the sort column,
+then id (the page tiebreaker), so the planner can seek and read rows already
+in page order. Proposals are ranked by the assumed traffic of the plans they
+fix (SCENARIOS and SORT_WEIGHTS) and checked by creating them inside a
+transaction that is rolled back, re-explaining every plan.
+
+SQLite scans an index in either direction and every page query orders its
+sort column and id the same way, so one ascending index serves both
+``sort_dir`` values.
+
+    python benchmarks/index_advisor.py --size 100000
+    python benchmarks/index_advisor.py --size 100000 --apply   # add to the managed index manifest
+
+With --apply the proposals are added to app/models/managed_indexes.json,
+which create_tables applies on startup, and applied to the database.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import re
+import sqlite3
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+from app.database import apply_sqlite_pragmas
+from app.models.contract import Category, Contract, ContractStatus
+from app.models.indexes import ManagedIndex, apply_managed_indexes, load_manifest, save_manifest
+from app.repositories.contract import SORT_FIELDS, DEFAULT_SORT_FIELD, ContractRepository
+from app.schemas.contract import ContractFilters, PaginationParams
+from suite import fixture_url
+
+TABLE = "contracts"
+
+# Filters an index can seek on: equality filters first, then range filters by column
+EQUALITY_FILTERS = ("status", "category_id")
+RANGE_FILTERS = {
+    "min_value": "value", "max_value": "value",
+    "start_date_from": "start_date", "start_date_to": "start_date",
+    "end_date_from": "end_date", "end_date_to": "end_date",
+}
+# Substring (ILIKE '%...%') and full-text filters no B-tree index can serve
+UNINDEXABLE_FILTERS = ("supplier", "q")
+
+# Filter scenarios with their assumed share of list traffic, used to rank proposals
+SCENARIOS: Dict[str, Tuple[float, Callable[[dict], dict]]] = {
+    "none": (10, lambda data: {}),
+    "status": (8, lambda data: {"status": ContractStatus.ACTIVE}),
+    "category": (4, lambda data: {"category_id": data["category_id"]}),
+    "supplier": (4, lambda data: {"supplier": data["supplier_word"]}),
+    "q": (6, lambda data: {"q": "cloud"}),
+    "value_range": (1, lambda data: {"min_value": Decimal(10_000), "max_value": Decimal(500_000)}),
+    "start_date_range": (2, lambda data: {"start_date_from": date(2022, 1, 1), "start_date_to": date(2022, 12, 31)}),
+    "end_date_range": (2, lambda data: {"end_date_from": date(2025, 1, 1), "end_date_to": date(2025, 3, 31)}),
+    "status+category": (3, lambda data: {"status": ContractStatus.ACTIVE, "category_id": data["category_id"]}),
+    "status+end_date_range": (3, lambda data: {
+        "status": ContractStatus.ACTIVE, "end_date_from": date(2025, 1, 1), "end_date_to": date(2025, 3, 31)
+    }),
+    "status+start_date_range": (1, lambda data: {
+        "status": ContractStatus.ACTIVE, "start_date_from": date(2022, 1, 1), "start_date_to": date(2022, 12, 31)
+    }),
+    "status+value_range": (1, lambda data: {"status": ContractStatus.ACTIVE, "min_value": Decimal(10_000)}),
+    "category+value_range": (1, lambda data: {
+        "category_id": data["category_id"], "min_value": Decimal(10_000), "max_value": Decimal(500_000)
+    }),
+    "status+category+value_range": (1, lambda data: {
+        "status": ContractStatus.ACTIVE, "category_id": data["category_id"], "min_value": Decimal(10_000)
+    }),
+}
+# Assumed relative use of each sort key; the default sort dominates
+SORT_WEIGHTS = {sort_by: 1.0 for sort_by in SORT_FIELDS}
+SORT_WEIGHTS.update({DEFAULT_SORT_FIELD: 5.0, "end_date": 3.0, "value": 2.0, "updated_at": 2.0})
+# Weight of a count query relative to the page it accompanies (exact totals are opt-in)
+COUNT_WEIGHT = 0.5
+
+_INDEX_USE = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+
+class Plan(NamedTuple):
+    scenario: str
+    filters: FrozenSet[str]  # Names of the active filters
+    query: str  # "page" or "count"
+    sort_by: Optional[str]
+    sort_dir: Optional[str]
+    statement: str
+    parameters: tuple
+    weight: float
+
+
+class Explained(NamedTuple):
+    plan: Plan
+    details: List[str]
+    issues: List[str]
+    indexes: Set[str]
+
+
+class Proposal(NamedTuple):
+    columns: Tuple[str, ...]
+    score: float
+    plans: List[Plan]
+
+    @property
+    def name(self) -> str:
+        return "idx_contract_" + "_".join(self.columns)
+
+    def reason(self) -> str:
+        scenarios = sorted({plan.scenario for plan in self.plans})
+        sorts = sorted({plan.sort_by for plan in self.plans if plan.sort_by})
+        text = f"filters: {', '.join(scenarios)}"
+        return f"{text}; sorted by {', '.join(sorts)}" if sorts else f"{text}; count"
+
+
+class _Captured(Exception):
+    """Raised from the cursor hook to stop a repository call once its SQL is known"""
+
+
+def capture_plans(session_factory, data: dict) -> List[Plan]:
+    """The page and count statements of every scenario and sort, without running them"""
+    captured: List[Tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, tuple(parameters)))
+        raise _Captured
+
+    def statement_of(call) -> Tuple[str, tuple]:
+        captured.clear()
+        try:
+            call()
+        except _Captured:
+            pass
+        return captured[0]
+
+    plans = []
+    with session_factory() as db:
+        repository = ContractRepository(db)
+        engine = db.get_bind()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            for scenario, (weight, build) in SCENARIOS.items():
+                values = build(data)
+                filters, names = ContractFilters(**values), frozenset(values)
+                statement, parameters = statement_of(lambda: repository.count(filters))
+                plans.append(Plan(scenario, names, "count", None, None, statement, parameters, weight * COUNT_WEIGHT))
+                sorts = list(SORT_FIELDS) + (["relevance"] if filters.q else [])
+                for sort_by in sorts:
+                    for sort_dir in ("asc", "desc"):
+                        pagination = PaginationParams(sort_by=sort_by, sort_dir=sort_dir, include_total="false")
+                        statement, parameters = statement_of(
+                            lambda: repository.get_multi(filters, pagination, with_total=False, as_rows=True)
+                        )
+                        plans.append(Plan(
+                            scenario, names, "page", sort_by, sort_dir, statement, parameters,
+                            weight * SORT_WEIGHTS.get(sort_by, 1.0) / 2
+                        ))
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+            db.rollback()
+    return plans
+
+
+def explain(connection: sqlite3.Connection, plan: Plan) -> Explained:
+    """Run EXPLAIN QUERY PLAN and flag full scans, temp B-tree sorts and unused equality filters"""
+    details = [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {plan.statement}", plan.parameters)]
+    table_steps = [detail for detail in details if re.match(rf"(SCAN|SEARCH) (TABLE )?{TABLE}\b", detail)]
+    issues = []
+    for detail in table_steps:
+        if detail.startswith("SCAN") and "USING" not in detail:
+            issues.append("full table scan")
+    if plan.query == "page" and any("USE TEMP B-TREE FOR" in detail and "ORDER BY" in detail for detail in details):
+        issues.append("temp b-tree sort")
+    if plan.filters & set(EQUALITY_FILTERS):
+        if table_steps and not any(detail.startswith("SEARCH") for detail in table_steps) and not issues:
+            issues.append("equality filter not used to seek")
+    indexes = {name for detail in table_steps for name in _INDEX_USE.findall(detail)}
+    return Explained(plan, details, issues, indexes)
+
+
+def existing_indexes(connection: sqlite3.Connection) -> Dict[str, Tuple[str, ...]]:
+    """Secondary indexes of the contracts table by name, with their columns"""
+    indexes = {}
+    for row in connection.execute(f"PRAGMA index_list({TABLE})"):
+        name = row[1]
+        indexes[name] = tuple(info[2] for info in connection.execute(f"PRAGMA index_info({name})"))
+    return indexes
+
+
+def proposed_columns(plan: Plan) -> Optional[Tuple[str, ...]]:
+    """Index columns that would let the planner seek this plan's filters and, for pages, read in order"""
+    filters = plan.filters
+    if filters & set(UNINDEXABLE_FILTERS) or plan.sort_by == "relevance":
+        return None
+    columns = [name for name in EQUALITY_FILTERS if name in filters]
+    if plan.query == "page":
+        sort_column = SORT_FIELDS[plan.sort_by].key
+        if sort_column not in columns:
+            columns.append(sort_column)
+        columns.append("id")
+    else:
+        ranges = [column for name, column in RANGE_FILTERS.items() if name in filters]
+        if ranges:
+            columns.append(ranges[0])
+    return tuple(columns) if columns else None
+
+
+def propose(explained: Sequence[Explained], existing: Dict[str, Tuple[str, ...]]) -> List[Proposal]:
+    """Candidate indexes for the flagged plans, best first, skipping ones an existing index already covers"""
+    by_columns: Dict[Tuple[str, ...], List[Plan]] = {}
+    for result in explained:
+        columns = proposed_columns(result.plan) if result.issues else None
+        if columns:
+            by_columns.setdefault(columns, []).append(result.plan)
+
+    def covered(columns: Tuple[str, ...], others) -> bool:
+        return any(other != columns and other[:len(columns)] == columns for other in others)
+
+    # A longer index with the same leading columns serves the shorter one's plans too
+    for columns in sorted(by_columns, key=len):
+        longer = [other for other in by_columns if other != columns and other[:len(columns)] == columns]
+        if longer:
+            by_columns[max(longer, key=len)].extend(by_columns.pop(columns))
+    proposals = [
+        Proposal(columns, sum(plan.weight for plan in plans), plans)
+        for columns, plans in by_columns.items()
+        if columns not in existing.values() and not covered(columns, existing.values())
+    ]
+    return sorted(proposals, key=lambda proposal: (-proposal.score, proposal.columns))
+
+
+def explain_all(connection: sqlite3.Connection, plans: Sequence[Plan]) -> List[Explained]:
+    return [explain(connection, plan) for plan in plans]
+
+
+def verify(connection: sqlite3.Connection, plans: Sequence[Plan], proposals: Sequence[Proposal]) -> List[Explained]:
+    """Plans as they would be with the proposals in place, built and analyzed in a rolled-back transaction"""
+    connection.execute("BEGIN")
+    try:
+        for proposal in proposals:
+            connection.execute(f"CREATE INDEX {proposal.name} ON {TABLE} ({', '.join(proposal.columns)})")
+            connection.execute(f"ANALYZE {proposal.name}")
+        return explain_all(connection, plans)
+    finally:
+        connection.execute("ROLLBACK")
+
+
+def sample_data(session_factory) -> dict:
+    """Filter values taken from the dataset, so scenarios match real rows"""
+    with session_factory() as db:
+        category_id = db.scalar(
+            select(Contract.category_id).group_by(Contract.category_id).order_by(func.count().desc()).limit(1)
+        ) or db.scalar(select(Category.id).limit(1))
+        supplier = db.scalar(
+            select(Contract.supplier).group_by(Contract.supplier).order_by(func.count().desc()).limit(1)
+        )
+    return {"category_id": category_id, "supplier_word": (supplier or "x").split()[0]}
+
+
+def print_issues(title: str, explained: Sequence[Explained], addressable: Set[Plan], verbose: bool) -> None:
+    """Flagged plans per scenario (every flagged plan when verbose)"""
+    flagged = [result for result in explained if result.issues]
+    print(f"{title}: {len(flagged)} of {len(explained)} plans flagged")
+    by_scenario: Dict[str, List[Explained]] = {}
+    for result in flagged:
+        by_scenario.setdefault(result.plan.scenario, []).append(result)
+    for scenario, results in by_scenario.items():
+        issues = sorted({issue for result in results for issue in result.issues})
+        fixable = sum(result.plan in addressable for result in results)
+        print(f"  {scenario:<28} {len(results):>3} flagged: {', '.join(issues)}; a new index could fix {fixable}")
+        for result in results if verbose else ():
+            plan = result.plan
+            query = f"{plan.sort_by} {plan.sort_dir}" if plan.query == "page" else "count"
+            print(f"      {query:<22} {', '.join(result.issues)}  [{' | '.join(result.details)}]")
+
+
+def report(
+    before: Sequence[Explained], after: Optional[Sequence[Explained]], proposals: Sequence[Proposal],
+    candidates: Sequence[Proposal], existing: Dict[str, Tuple[str, ...]], verbose: bool = False
+) -> dict:
+    """Print the findings; candidates are all proposals before the --max-indexes cut"""
+    addressable = {plan for candidate in candidates for plan in candidate.plans}
+    print_issues("Current plans", before, addressable, verbose)
+    used = set().union(*(result.indexes for result in before))
+    unused = sorted(name for name in existing if name not in used and not name.startswith("sqlite_autoindex"))
+    if unused:
+        print(f"Indexes no list plan uses: {', '.join(unused)}")
+    print(f"Proposed indexes ({len(proposals)} of {len(candidates)} candidates):")
+    for proposal in proposals:
+        print(f"  {proposal.name} ({', '.join(proposal.columns)})  score {proposal.score:g}  -- {proposal.reason()}")
+    if after is not None:
+        print_issues("With the proposed indexes", after, addressable, verbose)
+        used_after = set().union(*(result.indexes for result in after))
+        for proposal in proposals:
+            if proposal.name not in used_after:
+                print(f"  note: the planner did not choose {proposal.name}")
+    return {
+        "before": [_result_json(result) for result in before],
+        "after": [_result_json(result) for result in after] if after is not None else None,
+        "proposals": [
+            {"name": proposal.name, "columns": list(proposal.columns), "score": proposal.score, "reason": proposal.reason()}
+            for proposal in proposals
+        ],
+        "unused_indexes": unused,
+    }
+
+
+def _result_json(result: Explained) -> dict:
+    plan = result.plan
+    return {
+        "scenario": plan.scenario, "query": plan.query, "sort_by": plan.sort_by, "sort_dir": plan.sort_dir,
+        "plan": result.details, "issues": result.issues, "indexes": sorted(result.indexes),
+    }
+
+
+def apply(engine, proposals: Sequence[Proposal]) -> None:
+    """Add the proposals to the managed index manifest and bring the database in line with it"""
+    manifest = load_manifest()
+    known = {index.name for index in manifest}
+    manifest.extend(
+        ManagedIndex(proposal.name, TABLE, proposal.columns, proposal.reason())
+        for proposal in proposals if proposal.name not in known
+    )
+    save_manifest(manifest)
+    with engine.begin() as connection:
+        changes = apply_managed_indexes(connection, manifest)
+        connection.exec_driver_sql("ANALYZE")
+    print(f"Manifest has {len(manifest)} managed indexes; " + (", ".join(changes) or "database already up to date"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose indexes for the contract list filter/sort combinations")
+    parser.add_argument("--database-url", help="SQLite database to analyze (default: the benchmark fixture)")
+    parser.add_argument("--size", type=int, default=100_000, help="Benchmark fixture size when no URL is given")
+    parser.add_argument("--seed", type=int, default=42, help="Fixture generation seed")
+    parser.add_argument("--max-indexes", type=int, default=5, help="Propose at most this many indexes")
+    parser.add_argument("--no-verify", action="store_true", help="Skip re-explaining with the proposals built")
+    parser.add_argument("--verbose", action="store_true", help="List every flagged plan with its query plan")
+    parser.add_argument("--output", help="Also write plans and proposals as JSON to this file")
+    parser.add_argument("--apply", action="store_true", help="Add the proposals to the managed index manifest and apply it")
+    args = parser.parse_args()
+
+    database_url = args.database_url or fixture_url(args.size, args.seed, workers=1)
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite" or not url.database:
+        parser.error("the advisor reads EXPLAIN QUERY PLAN output and needs an SQLite database file")
+    engine = create_engine(database_url)
+    apply_sqlite_pragmas(engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+
+    plans = capture_plans(session_factory, sample_data(session_factory))
+    connection = sqlite3.connect(url.database, isolation_level=None)
+    try:
+        existing = existing_indexes(connection)
+        before = explain_all(connection, plans)
+        candidates = propose(before, existing)
+        proposals = candidates[:args.max_indexes]
+        after = None if args.no_verify or not proposals else verify(connection, plans, proposals)
+    finally:
+        connection.close()
+
+    result = report(before, after, proposals, candidates, existing, args.verbose)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2)
+    if args.apply and proposals:
+        apply(engine, proposals)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
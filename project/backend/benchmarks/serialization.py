@@ -0,0 +1,135 @@
+"""
+Contract list serialization benchmark: default FastAPI path vs the fast path.
+
+The default path is what the list route did before: ORM contracts with a
+joined category, one Contract.model_validate per row, then FastAPI
+re-validating the PaginatedResponse against response_model and encoding it
+with the stdlib JSON encoder. The fast path is what it does now: plain row
+tuples, one TypeAdapter validation for the whole page and orjson encoding.
+
+    python benchmarks/serialization.py --page-size 10 --page-size 100
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.contract import Category, ContractStatus
+from app.repositories.contract import ContractRepository
+from app.schemas.contract import Contract, ContractFilters, PaginatedResponse, PaginationParams
+from app.services.contract import ContractService, paginated_response_adapter
+from app.utils.responses import FastJSONResponse
+
+RESPONSE_FIELD = create_response_field(name="Response_list_contracts", type_=PaginatedResponse)
+
+
+def seed(database_url: str, contracts: int) -> None:
+    """Create the schema and contracts in a fresh database file"""
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    category = Category(name="Benchmark", description="Benchmark category")
+    db.add(category)
+    db.flush()
+    ContractRepository(db).bulk_insert([
+        {
+            "id": f"{n:08d}-0000-0000-0000-000000000000",
+            "contract_number": f"BENCH-{n:06d}",
+            "supplier": f"Supplier {n % 97}",
+            "description": f"Benchmark contract {n}",
+            "category_id": category.id,
+            "responsible": f"user{n % 13}",
+            "status": list(ContractStatus)[n % len(ContractStatus)],
+            "value": Decimal(n % 10000) + Decimal("0.99"),
+            "start_date": date(2020, 1, 1) + timedelta(days=n % 1500),
+            "end_date": date(2025, 1, 1) + timedelta(days=n % 1500),
+        }
+        for n in range(contracts)
+    ])
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+def default_path(db, pagination: PaginationParams, loop) -> bytes:
+    """ORM rows, per-row model_validate, response_model re-validation, stdlib JSON"""
+    page = ContractRepository(db).get_multi(ContractFilters(), pagination, with_total=False)
+    response = PaginatedResponse(
+        items=[Contract.model_validate(contract) for contract in page.items],
+        total=None,
+        page=pagination.page,
+        page_size=pagination.page_size,
+        pages=None,
+        total_mode="none",
+        has_next=page.has_next,
+        next_cursor=page.next_cursor
+    )
+    content = loop.run_until_complete(serialize_response(field=RESPONSE_FIELD, response_content=response))
+    return JSONResponse(content).body
+
+
+def fast_path(db, pagination: PaginationParams, loop) -> bytes:
+    """Row tuples, one TypeAdapter validation, orjson"""
+    page = ContractService(db).list_contracts(ContractFilters(), pagination)
+    return FastJSONResponse(paginated_response_adapter.dump_python(page)).body
+
+
+def measure(function, sessions, pagination: PaginationParams, iterations: int) -> float:
+    """Median milliseconds per call, each call with a fresh session"""
+    loop = asyncio.new_event_loop()
+    timings = []
+    try:
+        for _ in range(iterations):
+            db = sessions()
+            started = time.perf_counter()
+            function(db, pagination, loop)
+            timings.append((time.perf_counter() - started) * 1000)
+            db.close()
+    finally:
+        loop.close()
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare contract list serialization paths")
+    parser.add_argument("--contracts", type=int, default=5000, help="Contracts in the scratch database")
+    parser.add_argument("--page-size", type=int, action="append", help="Page sizes to measure (repeatable)")
+    parser.add_argument("--iterations", type=int, default=300, help="Requests per measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        seed(database_url, args.contracts)
+        sessions = sessionmaker(bind=create_engine(database_url), autoflush=False)
+
+        for page_size in args.page_size or [10, 100]:
+            # model_construct: the API caps page_size at 10, the benchmark may go beyond
+            pagination = PaginationParams.model_construct(
+                page=1, page_size=page_size, sort_by="start_date", sort_dir="desc",
+                cursor=None, include_total="false"
+            )
+            # Both paths must produce the same document
+            assert json.loads(default_path(sessions(), pagination, asyncio.new_event_loop())) == \
+                json.loads(fast_path(sessions(), pagination, None))
+            baseline = measure(default_path, sessions, pagination, args.iterations)
+            fast = measure(fast_path, sessions, pagination, args.iterations)
+            print(f"page_size={page_size:<4} default {baseline:7.2f} ms   fast {fast:7.2f} ms   {baseline / fast:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
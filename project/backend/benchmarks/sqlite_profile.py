@@ -0,0 +1,145 @@
+"""
+Mixed read/write benchmark for the SQLite performance profile.
+
+Runs the same workload twice against a scratch database file: once with
+SQLite defaults (rollback journal, one shared pool) and once with the
+configured profile (PRAGMAs from Settings plus a single writer connection
+and a reader pool). Reader processes fetch and list contracts, writer
+processes update them, all through ContractService. Processes rather than
+threads stand in for several API workers sharing one database file.
+
+    python benchmarks/sqlite_profile.py --readers 6 --writers 2 --seconds 10
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import multiprocessing
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, RoutingSession, apply_sqlite_pragmas, sqlite_pragmas
+from app.models.contract import Category, ContractStatus
+from app.models.search import create_search_index
+from app.repositories.contract import ContractRepository, SummaryRepository
+from app.schemas.contract import ContractFilters, ContractUpdate, PaginationParams
+from app.services.contract import ContractService
+
+
+def build_sessionmaker(database_url: str, profile: bool) -> sessionmaker:
+    """Sessions for one configuration: SQLite defaults, or the profile with a single writer"""
+    connect_args = {"check_same_thread": False}
+    engine = create_engine(database_url, connect_args=connect_args, pool_size=32, max_overflow=0)
+    if not profile:
+        return sessionmaker(bind=engine, autoflush=False, class_=RoutingSession)
+    apply_sqlite_pragmas(engine)
+    write_engine = create_engine(database_url, connect_args=connect_args, pool_size=1, max_overflow=0)
+    apply_sqlite_pragmas(write_engine)
+    return sessionmaker(
+        bind=engine, autoflush=False, class_=RoutingSession, info={"write_bind": write_engine}
+    )
+
+
+def seed(database_url: str, contracts: int) -> list:
+    """Create the schema and contracts in a fresh database file, returning their ids"""
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        create_search_index(connection)
+    db = sessionmaker(bind=engine)()
+    category = Category(name="Benchmark")
+    db.add(category)
+    db.flush()
+    rows = [
+        {
+            "id": f"{n:08d}-0000-0000-0000-000000000000",
+            "contract_number": f"BENCH-{n:06d}",
+            "supplier": f"Supplier {n % 97}",
+            "description": f"Benchmark contract {n}",
+            "category_id": category.id,
+            "responsible": f"user{n % 13}",
+            "status": list(ContractStatus)[n % len(ContractStatus)],
+            "value": Decimal(n % 10000),
+            "start_date": date(2020, 1, 1) + timedelta(days=n % 1500),
+            "end_date": date(2025, 1, 1) + timedelta(days=n % 1500),
+        }
+        for n in range(contracts)
+    ]
+    ContractRepository(db).bulk_insert(rows)
+    SummaryRepository(db).rebuild()
+    db.commit()
+    db.close()
+    engine.dispose()
+    return [row["id"] for row in rows]
+
+
+def worker(database_url: str, profile: bool, role: str, ids: list, seconds: float) -> dict:
+    """One reader or writer process: loop through ContractService for a fixed time"""
+    db = build_sessionmaker(database_url, profile)()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    stop_at = time.monotonic() + seconds
+    try:
+        while time.monotonic() < stop_at:
+            service = ContractService(db)
+            try:
+                if role == "writes":
+                    service.update_contract(random.choice(ids), ContractUpdate(value=Decimal(random.randrange(10000))))
+                elif random.random() < 0.8:
+                    service.get_contract(random.choice(ids))
+                else:
+                    service.list_contracts(
+                        ContractFilters(status=random.choice(list(ContractStatus))),
+                        PaginationParams(page_size=10, include_total="false")
+                    )
+                counts[role] += 1
+            except Exception:
+                # "database is locked" after busy_timeout, or 412 on a concurrent update
+                counts["errors"] += 1
+                db.rollback()
+    finally:
+        db.close()
+    return counts
+
+
+def run_workload(database_url: str, profile: bool, ids: list, readers: int, writers: int, seconds: float) -> dict:
+    """Run reader and writer processes concurrently and return operations per second"""
+    roles = ["reads"] * readers + ["writes"] * writers
+    with multiprocessing.Pool(len(roles)) as pool:
+        results = pool.starmap(worker, [(database_url, profile, role, ids, seconds) for role in roles])
+    return {key: sum(result[key] for result in results) / seconds for key in ("reads", "writes", "errors")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--contracts", type=int, default=20000, help="Contracts in the scratch database")
+    parser.add_argument("--readers", type=int, default=6, help="Concurrent reader processes")
+    parser.add_argument("--writers", type=int, default=2, help="Concurrent writer processes")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run")
+    args = parser.parse_args()
+
+    print(f"Profile: {sqlite_pragmas()}")
+    print(f"{args.contracts} contracts, {args.readers} readers, {args.writers} writers, {args.seconds:g}s per run\n")
+    results = {}
+    for name, profile in (("defaults", False), ("profile", True)):
+        with tempfile.TemporaryDirectory() as directory:
+            database_url = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+            ids = seed(database_url, args.contracts)
+            results[name] = run_workload(database_url, profile, ids, args.readers, args.writers, args.seconds)
+        print(f"{name:<10} {results[name]['reads']:>9.1f} reads/s {results[name]['writes']:>9.1f} writes/s "
+              f"{results[name]['errors']:>7.1f} errors/s")
+
+    for key in ("reads", "writes"):
+        baseline = results["defaults"][key]
+        if baseline:
+            print(f"{key}: {results['profile'][key] / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Micro-benchmarks for the contract repository and service hot paths.
+
+`run` builds a fixture database per size with generate_data.py (cached under
+benchmarks/.data, so only the first run at a size pays for the load), times
+each case through ContractService and writes the timings as JSON. Cases cover
+get-by-id, list pages with and without counts, filter combinations, text
+search, facet counts (uncached and cached), every SORT_FIELDS key, page
+serialization, create and update. Each run times a throwaway copy of the
+fixture, so the writing cases never change the cached database.
+
+`compare` checks a results file against a stored baseline and exits with
+status 1 when a case's median got slower by more than --threshold.
+
+    python benchmarks/suite.py run --sizes 10000 100000 1000000 --output baseline.json
+    python benchmarks/suite.py run --sizes 10000 100000 1000000 --output current.json
+    python benchmarks/suite.py compare baseline.json current.json --threshold 0.15
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import itertools
+import json
+import platform
+import sqlite3
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List
+
+import sqlalchemy
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, apply_sqlite_pragmas, backup_sqlite_database
+from app.models.contract import Category, Contract as ContractModel, ContractStatus
+from app.models.indexes import apply_managed_indexes
+from app.repositories.contract import SORT_FIELDS
+from app.schemas.contract import ContractCreate, ContractFilters, ContractUpdate, PaginationParams, FACET_FIELDS
+from app.services.contract import ContractService, facet_cache
+from app.utils.responses import FastJSONResponse
+from generate_data import load_dataset
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+Case = Callable[[ContractService], Any]
+
+
+def fixture_url(size: int, seed: int, workers: int) -> str:
+    """SQLite URL of the generated fixture for this size, building it on first use, with the managed indexes"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"contracts-{size}-seed{seed}.db")
+    if not os.path.exists(path):
+        # Build under a temporary name so an interrupted load is never reused
+        partial = f"{path}.partial.db"
+        if os.path.exists(partial):
+            os.remove(partial)
+        engine = create_engine(f"sqlite:///{partial}")
+        apply_sqlite_pragmas(engine)
+        Base.metadata.create_all(engine)
+        print(f"Building {size:,}-contract fixture...")
+        started = time.perf_counter()
+        load_dataset(engine, size, seed=seed, workers=workers, progress=False)
+        engine.dispose()
+        os.replace(partial, path)
+        print(f"  built in {time.perf_counter() - started:.1f}s")
+    # Cached fixtures predate later managed indexes; bring them up to the current manifest
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        changes = apply_managed_indexes(connection)
+        if changes:
+            connection.exec_driver_sql("ANALYZE")
+    engine.dispose()
+    return f"sqlite:///{path}"
+
+
+@contextmanager
+def run_copy(database_url: str) -> Iterator[str]:
+    """SQLite URL of a copy of the fixture for one run, removed (with its WAL files) afterwards"""
+    path = f"{make_url(database_url).database}.run-{uuid.uuid4().hex[:8]}.db"
+    backup_sqlite_database(database_url, f"sqlite:///{path}")
+    try:
+        yield f"sqlite:///{path}"
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def build_cases(db, run_id: str) -> Dict[str, Case]:
+    """Benchmark cases keyed by name, parameterized from the fixture's own data"""
+    ids = list(db.scalars(select(ContractModel.id).order_by(ContractModel.id).limit(1000)))
+    category_id = db.scalar(select(Category.id).order_by(Category.id).limit(1))
+    supplier = db.scalar(
+        select(ContractModel.supplier).group_by(ContractModel.supplier).order_by(func.count().desc()).limit(1)
+    )
+    supplier_word = supplier.split()[0]
+    year_from, year_to = date(2022, 1, 1), date(2022, 12, 31)
+    next_id = itertools.cycle(ids).__next__
+    counter = itertools.count()
+
+    def list_case(include_total: str = "exact", **filters) -> Case:
+        pagination = PaginationParams(include_total=include_total)
+        filters = ContractFilters(**filters)
+        return lambda service: service.list_contracts(filters, pagination)
+
+    def facets_case(cached: bool, **filters) -> Case:
+        pagination = PaginationParams(include_total="false")
+        filters = ContractFilters(**filters)
+        facets = frozenset(FACET_FIELDS)
+
+        def case(service: ContractService):
+            if not cached:
+                facet_cache.clear()
+            return service.list_contracts(filters, pagination, facets=facets)
+        return case
+
+    def sort_case(sort_by: str) -> Case:
+        pagination = PaginationParams(sort_by=sort_by, include_total="false")
+        return lambda service: service.list_contracts(ContractFilters(), pagination)
+
+    def create(service: ContractService):
+        return service.create_contract(ContractCreate(
+            contract_number=f"BENCH-{run_id}-{next(counter)}", supplier=supplier,
+            description="Benchmark contract", category_id=category_id, responsible="bench.user",
+            status=ContractStatus.DRAFT, value=Decimal("1000.00"),
+            start_date=date(2025, 1, 1), end_date=date(2025, 12, 31)
+        ))
+
+    def update(service: ContractService):
+        return service.update_contract(
+            next_id(), ContractUpdate(responsible=f"bench.user{next(counter) % 2}"), updated_by="bench"
+        )
+
+    first_page = ContractService(db).list_contracts(ContractFilters(), PaginationParams(include_total="false"))
+
+    cases: Dict[str, Case] = {
+        "get_by_id": lambda service: service.get_contract(next_id()),
+        "list.default": list_case(),
+        "list.no_total": list_case("false"),
+        "list.estimated_total": list_case("estimate"),
+        "list.cursor_page": lambda service: service.list_contracts(
+            ContractFilters(), PaginationParams(include_total="false", cursor=first_page.next_cursor)
+        ),
+        "filter.status": list_case(status=ContractStatus.ACTIVE),
+        "filter.supplier": list_case(supplier=supplier_word),
+        "filter.category_value": list_case(category_id=category_id, min_value=10_000, max_value=500_000),
+        "filter.start_date_range": list_case(start_date_from=year_from, start_date_to=year_to),
+        "filter.combined": list_case(
+            status=ContractStatus.ACTIVE, category_id=category_id, min_value=10_000,
+            end_date_from=date(2025, 1, 1)
+        ),
+        "search.q": list_case(q="cloud"),
+        "search.q_no_total": list_case("false", q="cloud hosting"),
+        "search.relevance": lambda service: service.list_contracts(
+            ContractFilters(q="cloud"), PaginationParams(sort_by="relevance", include_total="false")
+        ),
+        "facets.all": facets_case(False),
+        "facets.filtered": facets_case(False, status=ContractStatus.ACTIVE, start_date_from=year_from),
+        "facets.cached": facets_case(True, status=ContractStatus.ACTIVE, start_date_from=year_from),
+        "serialize.list_page": lambda service: FastJSONResponse(first_page.model_dump()).body,
+        "create": create,
+        "update": update,
+    }
+    cases.update({f"sort.{sort_by}": sort_case(sort_by) for sort_by in SORT_FIELDS})
+    return cases
+
+
+def time_case(case: Case, service: ContractService, min_time: float, max_iterations: int) -> Dict[str, Any]:
+    """Call a case repeatedly for at least min_time seconds (and 5 calls) after one warmup call"""
+    case(service)
+    samples: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_iterations and (len(samples) < 5 or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        case(service)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "iterations": len(samples),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+    }
+
+
+def run_size(database_url: str, size: int, only: List[str], min_time: float, max_iterations: int) -> List[dict]:
+    """Time every selected case against one fixture database"""
+    engine = create_engine(database_url)
+    apply_sqlite_pragmas(engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    run_id = uuid.uuid4().hex[:8]
+    results = []
+    try:
+        with session_factory() as db:
+            cases = build_cases(db, run_id)
+        for name, case in cases.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            with session_factory() as db:
+                timing = time_case(case, ContractService(db), min_time, max_iterations)
+            results.append({"size": size, "case": name, **timing})
+            print(f"  {size:>9,}  {name:<28} {timing['median_ms']:>10.3f} ms  (p95 {timing['p95_ms']:.3f}, n={timing['iterations']})")
+    finally:
+        engine.dispose()
+    return results
+
+
+def run(args) -> None:
+    results = []
+    for size in args.sizes:
+        # create and update write to the database, so they run against a copy of the cached fixture
+        with run_copy(fixture_url(size, args.seed, args.workers)) as database_url:
+            results.extend(run_size(database_url, size, args.only, args.min_time, args.max_iterations))
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "min_time": args.min_time,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+def compare(args) -> int:
+    """Print per-case changes against the baseline; return 1 if any case regressed"""
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        baseline = {(r["size"], r["case"]): r for r in json.load(baseline_file)["results"]}
+        current = {(r["size"], r["case"]): r for r in json.load(current_file)["results"]}
+
+    regressions = []
+    for key in sorted(current.keys() & baseline.keys()):
+        before, after = baseline[key]["median_ms"], current[key]["median_ms"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        # Ignore sub-min_delta differences: at microsecond scale they are noise
+        if change > args.threshold and after - before > args.min_delta_ms:
+            flag = "REGRESSION"
+            regressions.append(key)
+        elif change < -args.threshold and before - after > args.min_delta_ms:
+            flag = "improved"
+        print(f"{key[0]:>9,}  {key[1]:<28} {before:>10.3f} -> {after:>10.3f} ms  {change:+7.1%}  {flag}")
+    for key in sorted(baseline.keys() - current.keys()):
+        print(f"{key[0]:>9,}  {key[1]:<28} missing from current results")
+    for key in sorted(current.keys() - baseline.keys()):
+        print(f"{key[0]:>9,}  {key[1]:<28} new (no baseline)")
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contract repository and service micro-benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write results as JSON")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Fixture sizes in contracts")
+    run_parser.add_argument("--output", default="benchmark-results.json", help="Results file to write")
+    run_parser.add_argument("--only", nargs="*", default=[], help="Only cases whose name starts with one of these")
+    run_parser.add_argument("--min-time", type=float, default=1.0, help="Seconds to spend timing each case")
+    run_parser.add_argument("--max-iterations", type=int, default=2000, help="Cap on timed calls per case")
+    run_parser.add_argument("--seed", type=int, default=42, help="Fixture generation seed")
+    run_parser.add_argument("--workers", type=int, default=1, help="Processes used to generate missing fixtures")
+
+    compare_parser = commands.add_parser("compare", help="Compare results against a baseline")
+    compare_parser.add_argument("baseline", help="Baseline results file")
+    compare_parser.add_argument("current", help="Results file to check")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="Allowed median slowdown, e.g. 0.15 = 15%%")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Generate a production-sized synthetic dataset for load testing.
+
+Contracts get skewed supplier popularity (a few suppliers hold most contracts),
+start dates spread over several years, realistic durations and values, a status
+mix that follows the dates, and a change history of varying depth. The output
+is fully determined by --seed and the row counts, however many --workers
+generate it: contracts are produced in fixed-size chunks, each with its own
+random stream, and inserted in chunk order.
+
+Rows are written with large Core executemany batches. Secondary indexes and
+the full-text search triggers are dropped for the load and rebuilt once at the
+end, followed by the dashboard summary. The target database must be empty,
+or pass --reset to drop and recreate every table first.
+
+    python generate_data.py --contracts 1000000 --history-mean 8 --workers 4
+    python generate_data.py --database-url sqlite:///./load.db --contracts 200000 --reset
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import multiprocessing
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base, apply_sqlite_pragmas, create_tables, is_sqlite_file
+from app.models.contract import Category, ChangeHistory, Contract, ContractStatus
+from app.models.generation import create_data_generation, drop_data_generation
+from app.models.search import SEARCH_TABLE, create_search_index, drop_search_index
+from app.models.indexes import apply_managed_indexes, load_manifest
+from app.repositories.contract import SummaryRepository
+
+# Last day of the generated timeline; fixed so the same seed always yields the same data
+AS_OF = date(2025, 1, 1)
+
+CATEGORIES = [
+    ("Software Licensing", "Software licenses and subscriptions"),
+    ("IT Services", "Information technology support and consulting"),
+    ("Cloud Services", "Cloud computing and hosting services"),
+    ("Security Services", "Cybersecurity and data protection services"),
+    ("Hardware Procurement", "Computer equipment and hardware purchases"),
+    ("Professional Services", "Consulting and professional advisory services"),
+    ("Facilities", "Office space, cleaning and maintenance"),
+    ("Telecommunications", "Phone, network and connectivity services"),
+]
+# Relative share of contracts per category, in CATEGORIES order
+CATEGORY_WEIGHTS = [22, 18, 15, 10, 12, 13, 5, 5]
+
+SUPPLIER_PREFIXES = [
+    "Acme", "Apex", "Blue", "Bright", "Cedar", "Core", "Delta", "Echo", "Falcon", "Global",
+    "Granite", "Harbor", "Iron", "Keystone", "Lumen", "Meridian", "North", "Nova", "Orion", "Pacific",
+    "Pioneer", "Quantum", "Summit", "Titan", "Vertex",
+]
+SUPPLIER_STEMS = [
+    "Data", "Systems", "Networks", "Cloud", "Logic", "Works", "Soft", "Tech", "Labs", "Digital",
+    "Solutions", "Secure", "Analytics", "Consulting", "Infra", "Facilities", "Telecom", "Supply",
+]
+SUPPLIER_SUFFIXES = ["Inc", "LLC", "Ltd", "Corporation", "GmbH", "Group", "Partners", "AG"]
+FIRST_NAMES = [
+    "alex", "maria", "john", "jane", "li", "sara", "omar", "emma", "lucas", "priya",
+    "noah", "olivia", "mateo", "yuki", "fatima", "david", "elena", "kwame", "anna", "ravi",
+]
+LAST_NAMES = [
+    "smith", "garcia", "chen", "johnson", "müller", "rossi", "kim", "nguyen", "silva", "brown",
+    "khan", "novak", "dubois", "tanaka", "okafor", "wilson", "larsen", "costa", "singh", "davis",
+]
+SERVICES = [
+    "subscription", "support and maintenance", "implementation", "managed services", "licensing",
+    "consulting", "hosting", "hardware refresh", "security monitoring", "training", "cleaning",
+    "connectivity", "data migration", "audit",
+]
+SCOPES = [
+    "for all company sites", "for the finance department", "for 500 users", "for the EMEA region",
+    "including 24/7 helpdesk", "with quarterly reviews", "for the new office expansion",
+    "covering production and staging", "with a three year support option",
+]
+
+# Contract lengths in months and how often each occurs
+DURATIONS = [3, 6, 12, 24, 36, 60]
+DURATION_WEIGHTS = [5, 10, 45, 20, 15, 5]
+
+# Fields a history entry may change after creation, with their relative frequency
+HISTORY_FIELDS = ["status", "value", "responsible", "end_date", "description"]
+HISTORY_FIELD_WEIGHTS = [30, 30, 15, 20, 5]
+
+
+def build_suppliers(seed: int) -> List[str]:
+    """Every supplier name in popularity order, shuffled deterministically per seed"""
+    names = [
+        f"{prefix} {stem} {suffix}"
+        for prefix in SUPPLIER_PREFIXES for stem in SUPPLIER_STEMS for suffix in SUPPLIER_SUFFIXES
+    ]
+    random.Random(seed).shuffle(names)
+    return names
+
+
+def zipf_cum_weights(count: int, exponent: float) -> List[float]:
+    """Cumulative Zipf weights: rank r is chosen proportionally to 1 / r**exponent"""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def add_months(day: date, months: int) -> date:
+    """Same day of month `months` later, clamped to the month's length"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    for candidate in (day.day, 30, 29, 28):
+        try:
+            return date(year, month, candidate)
+        except ValueError:
+            continue
+
+
+def pick_status(rng: random.Random, start_date: date, end_date: date) -> ContractStatus:
+    """Status consistent with where the contract's dates sit relative to AS_OF"""
+    if start_date > AS_OF:
+        return ContractStatus.DRAFT if rng.random() < 0.9 else ContractStatus.ACTIVE
+    if end_date < AS_OF:
+        return ContractStatus.EXPIRED if rng.random() < 0.85 else ContractStatus.TERMINATED
+    roll = rng.random()
+    if roll < 0.88:
+        return ContractStatus.ACTIVE
+    return ContractStatus.SUSPENDED if roll < 0.95 else ContractStatus.TERMINATED
+
+
+def random_value(rng: random.Random) -> Decimal:
+    """Log-normal contract value: mostly tens of thousands, with a long tail of large deals"""
+    cents = min(int(rng.lognormvariate(15.4, 1.3)), 5_000_000_000)
+    return Decimal(cents).scaleb(-2)
+
+
+def random_timestamp(rng: random.Random, start: datetime, end: datetime) -> datetime:
+    """Uniform timestamp in [start, end], whole seconds"""
+    span = max(int((end - start).total_seconds()), 0)
+    return start + timedelta(seconds=rng.randint(0, span))
+
+
+def generate_history(
+    rng: random.Random, contract: Dict[str, Any], people: List[str], history_mean: float
+) -> List[Dict[str, Any]]:
+    """Creation entry plus a geometric number of later edits, oldest first"""
+    created_at = contract["created_at"]
+    entries = [{
+        "contract_id": contract["id"],
+        "changed_at": created_at,
+        "changed_by": contract["responsible"],
+        "changes": {"action": {"old": None, "new": "created"}},
+    }]
+    edits = 0
+    if history_mean > 1:
+        # Geometric with mean history_mean - 1, capped to keep single contracts bounded
+        keep_going = 1 - 1 / history_mean
+        while edits < 200 and rng.random() < keep_going:
+            edits += 1
+    last_edit = max(created_at, datetime.combine(min(contract["end_date"], AS_OF), datetime.min.time()))
+    changed_at = [random_timestamp(rng, created_at, last_edit) for _ in range(edits)]
+    for moment in sorted(changed_at):
+        field = rng.choices(HISTORY_FIELDS, weights=HISTORY_FIELD_WEIGHTS)[0]
+        if field == "status":
+            old, new = rng.sample([status.value for status in ContractStatus], 2)
+        elif field == "value":
+            old, new = str(random_value(rng)), str(contract["value"])
+        elif field == "responsible":
+            old, new = rng.choice(people), contract["responsible"]
+        elif field == "end_date":
+            old = (contract["end_date"] - timedelta(days=rng.choice([30, 90, 180, 365]))).isoformat()
+            new = contract["end_date"].isoformat()
+        else:
+            old, new = "Draft description", contract["description"]
+        entries.append({
+            "contract_id": contract["id"],
+            "changed_at": moment,
+            "changed_by": rng.choice(people),
+            "changes": {field: {"old": old, "new": new}},
+        })
+    return entries
+
+
+def generate_chunk(task: Tuple[int, int, int, int, List[int], float, float]) -> Tuple[List[dict], List[dict]]:
+    """
+    Contracts [start, stop) and their history, from a random stream owned by this chunk.
+
+    Runs in pool workers, so it only takes plain picklable arguments.
+    """
+    seed, chunk_index, start, stop, category_ids, years, history_mean = task
+    rng = random.Random(seed * 1_000_003 + chunk_index)
+    suppliers = build_suppliers(seed)
+    supplier_weights = zipf_cum_weights(len(suppliers), 1.1)
+    people = [f"{first}.{last}@company.com" for first in FIRST_NAMES for last in LAST_NAMES]
+    people_weights = zipf_cum_weights(len(people), 0.8)
+    earliest = AS_OF - timedelta(days=int(365 * years))
+    timeline_days = (AS_OF - earliest).days + 180  # A few drafts start in the future
+
+    contracts, history = [], []
+    for n in range(start, stop):
+        start_date = earliest + timedelta(days=rng.randrange(timeline_days))
+        end_date = add_months(start_date, rng.choices(DURATIONS, weights=DURATION_WEIGHTS)[0]) - timedelta(days=1)
+        created_at = random_timestamp(
+            rng,
+            datetime.combine(start_date - timedelta(days=60), datetime.min.time()),
+            datetime.combine(start_date, datetime.min.time())
+        )
+        category_index = rng.choices(range(len(category_ids)), weights=CATEGORY_WEIGHTS[:len(category_ids)])[0]
+        contract = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "contract_number": f"GEN-{start_date.year}-{n:09d}",
+            "supplier": rng.choices(suppliers, cum_weights=supplier_weights)[0],
+            "description": f"{CATEGORIES[category_index][0]} {rng.choice(SERVICES)} {rng.choice(SCOPES)}",
+            "category_id": category_ids[category_index],
+            "responsible": rng.choices(people, cum_weights=people_weights)[0],
+            "status": pick_status(rng, start_date, end_date),
+            "value": random_value(rng),
+            "start_date": start_date,
+            "end_date": end_date,
+            "created_at": created_at,
+        }
+        entries = generate_history(rng, contract, people, history_mean)
+        contract["updated_at"] = entries[-1]["changed_at"]
+        contract["version"] = len(entries)
+        contracts.append(contract)
+        history.extend(entries)
+    return contracts, history
+
+
+def generate_chunks(
+    seed: int, contracts: int, chunk_size: int, category_ids: List[int], years: float,
+    history_mean: float, workers: int
+) -> Iterator[Tuple[List[dict], List[dict]]]:
+    """Yield generated chunks in order, computed in a process pool when workers > 1"""
+    tasks = [
+        (seed, index, start, min(start + chunk_size, contracts), category_ids, years, history_mean)
+        for index, start in enumerate(range(0, contracts, chunk_size))
+    ]
+    if workers <= 1:
+        yield from map(generate_chunk, tasks)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        # imap keeps chunk order, so the insert order (and history ids) stay deterministic
+        yield from pool.imap(generate_chunk, tasks)
+
+
+def ensure_categories(session_factory) -> List[int]:
+    """Create missing CATEGORIES and return their ids in CATEGORIES order"""
+    with session_factory() as db:
+        existing = {name: id_ for id_, name in db.execute(select(Category.id, Category.name))}
+        missing = [{"name": name, "description": description} for name, description in CATEGORIES if name not in existing]
+        if missing:
+            db.execute(insert(Category), missing)
+            db.commit()
+            existing = {name: id_ for id_, name in db.execute(select(Category.id, Category.name))}
+        return [existing[name] for name, _ in CATEGORIES]
+
+
+def drop_load_indexes(connection) -> list:
+    """Drop secondary and managed indexes, search and generation triggers on the bulk-loaded tables, returning the model indexes"""
+    indexes = [index for table in (Contract.__table__, ChangeHistory.__table__) for index in table.indexes]
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    for managed in load_manifest():
+        connection.execute(text(f"DROP INDEX IF EXISTS {managed.name}"))
+    drop_search_index(connection)
+    drop_data_generation(connection)
+    return indexes
+
+
+def rebuild_load_indexes(connection, indexes: list) -> None:
+    """Recreate the dropped indexes, managed indexes, search index and generation counter from the loaded rows"""
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+    apply_managed_indexes(connection)
+    create_search_index(connection)
+    create_data_generation(connection)
+
+
+def load_dataset(
+    engine: Engine, contracts: int, history_mean: float = 5.0, years: float = 6.0, seed: int = 42,
+    chunk_size: int = 10_000, batch_size: int = 5_000, workers: int = 1, progress: bool = True
+) -> Tuple[int, int]:
+    """
+    Generate and bulk-load contracts into an empty schema, returning (contracts, history rows).
+
+    Raises ValueError if the database already has contracts.
+    """
+    with engine.connect() as connection:
+        if connection.scalar(select(func.count()).select_from(Contract.__table__)):
+            raise ValueError("the database already has contracts")
+
+    session_factory = sessionmaker(bind=engine)
+    category_ids = ensure_categories(session_factory)
+    started = time.perf_counter()
+    contract_count = history_count = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            # The data can be regenerated, so durability during the load is not worth an fsync per commit
+            connection.execute(text("PRAGMA synchronous = OFF"))
+            connection.commit()
+        with connection.begin():
+            indexes = drop_load_indexes(connection)
+        for chunk_contracts, chunk_history in generate_chunks(
+            seed, contracts, chunk_size, category_ids, years, history_mean, workers
+        ):
+            with connection.begin():
+                for start in range(0, len(chunk_contracts), batch_size):
+                    connection.execute(insert(Contract.__table__), chunk_contracts[start:start + batch_size])
+                for start in range(0, len(chunk_history), batch_size):
+                    connection.execute(insert(ChangeHistory.__table__), chunk_history[start:start + batch_size])
+            contract_count += len(chunk_contracts)
+            history_count += len(chunk_history)
+            if progress:
+                print(f"  {contract_count:,} contracts, {history_count:,} history rows "
+                      f"({time.perf_counter() - started:.1f}s)")
+        if progress:
+            print(f"Building indexes and {SEARCH_TABLE}...")
+        with connection.begin():
+            rebuild_load_indexes(connection, indexes)
+        if connection.dialect.name == "sqlite":
+            connection.execute(text("ANALYZE"))
+            connection.commit()
+
+    with session_factory() as db:
+        SummaryRepository(db).rebuild()
+        db.commit()
+    return contract_count, history_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic contracts and change history for load testing")
+    parser.add_argument("--database-url", default=settings.database_url, help="Target database (default: DATABASE_URL)")
+    parser.add_argument("--contracts", type=int, default=100_000, help="Number of contracts to generate")
+    parser.add_argument("--history-mean", type=float, default=5.0, help="Average history entries per contract, creation included")
+    parser.add_argument("--years", type=float, default=6.0, help="How many years of start dates to spread contracts over")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; the same seed and counts give the same data")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Contracts generated per worker task and committed together")
+    parser.add_argument("--batch-size", type=int, default=5_000, help="Rows per INSERT executemany")
+    parser.add_argument("--workers", type=int, default=1, help="Generator processes (the database is still written by one)")
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables before loading")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if is_sqlite_file(args.database_url):
+        apply_sqlite_pragmas(engine)
+
+    if args.reset:
+        Base.metadata.drop_all(engine)
+    if args.database_url == settings.database_url:
+        create_tables()
+    else:
+        Base.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    try:
+        contract_count, history_count = load_dataset(
+            engine, args.contracts, args.history_mean, args.years, args.seed,
+            args.chunk_size, args.batch_size, args.workers
+        )
+    except ValueError as exc:
+        parser.error(f"{exc}; pass --reset to replace them")
+    finally:
+        engine.dispose()
+    print(f"Generated {contract_count:,} contracts and {history_count:,} history rows "
+          f"in {time.perf_counter() - started:.1f}s (seed {args.seed})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Rebuild the dashboard summary table from the contracts table.
+
+The summary is maintained incrementally on every write; run this to repair
+drift, e.g. after contracts were changed outside the API.
+
+    python rebuild_summary.py
+    python rebuild_summary.py --database-url sqlite:///./load.db
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base, apply_sqlite_pragmas, create_tables, is_sqlite_file
+from app.services.contract import ContractService
+
+
+def main():
+    """Recompute every summary bucket"""
+    parser = argparse.ArgumentParser(description="Rebuild the dashboard summary table from the contracts table")
+    parser.add_argument("--database-url", default=settings.database_url, help="Target database (default: DATABASE_URL)")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if is_sqlite_file(args.database_url):
+        apply_sqlite_pragmas(engine)
+    if args.database_url == settings.database_url:
+        create_tables()
+    else:
+        Base.metadata.create_all(engine)
+
+    try:
+        with sessionmaker(bind=engine)() as db:
+            ContractService(db).rebuild_summary()
+    finally:
+        engine.dispose()
+    print("Contract summary rebuilt successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ from decimal import Decimal
 from sqlalchemy.orm import sessionmaker
 from app.database import engine, Base
 from app.models.contract import Category, Contract, ContractStatus
+from app.repositories.contract import SummaryRepository
 
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -210,6 +211,12 @@ def main():
     # Then seed contracts
     seed_contracts(categories)
     
+    # Contracts were inserted directly, so recompute the dashboard summary
+    db = SessionLocal()
+    SummaryRepository(db).rebuild()
+    db.commit()
+    db.close()
+    
     print("Database seeding completed successfully!")
     print("\nSample data includes:")
     print("- 6 contract categories (Software, IT Services, Cloud, Security, Hardware, Professional)")
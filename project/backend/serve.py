@@ -0,0 +1,360 @@
+"""
+Production launcher: a pre-forking master running the API in N uvicorn workers.
+
+The master imports app.main once, runs the startup database work
+(create_tables) once, closes its connections and binds the listening socket,
+then forks workers that inherit the loaded modules and the socket instead of
+each importing the app and racing each other through the schema setup.
+Workers only run the per-process startup (supplier index, audit writer,
+metrics snapshots) and serve on the shared socket.
+
+Workers are recycled after SERVE_MAX_REQUESTS requests (plus jitter) or once
+their resident memory exceeds SERVE_MAX_WORKER_MEMORY_MB. A recycled worker
+is replaced before it is stopped, and a stopping worker finishes its in-flight
+requests within SERVE_GRACEFUL_TIMEOUT_SECONDS. SIGHUP replaces every worker
+the same way, one at a time; code changes need a new master, since workers
+are forked from the code the master loaded. SIGTERM or SIGINT stops all
+workers gracefully.
+
+SQLite across processes: the database must use WAL (readers never wait for
+the writer) and a busy timeout, so each worker's single writer connection
+waits its turn for the file lock instead of failing; the master refuses to
+start several workers otherwise, or on an in-memory database.
+
+    python serve.py --port 8000 --workers 4
+    kill -HUP <master pid>    # Rolling restart
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import gc
+import logging
+import random
+import selectors
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+import uvicorn
+
+from app.config import settings
+from app.database import create_tables, dispose_engines, engine, is_sqlite_file
+from app.main import app
+from app.utils import metrics
+
+logger = logging.getLogger("serve")
+
+# A worker that has not finished its startup by then is killed and replaced
+BOOT_TIMEOUT_SECONDS = 120.0
+# Consecutive workers failing before ready after which the master gives up
+MAX_BOOT_FAILURES = 5
+# Extra time after the graceful timeout before a stopping worker is killed
+KILL_GRACE_SECONDS = 5.0
+MEMORY_CHECK_INTERVAL_SECONDS = 10.0
+# Time a stopping worker gives connections it accepted last to send their request
+ACCEPTED_REQUEST_GRACE_SECONDS = 0.5
+
+
+def default_worker_count() -> int:
+    """One worker per CPU this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        return os.cpu_count() or 1
+
+
+def resident_memory_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process, or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def check_database(workers: int) -> None:
+    """Refuse SQLite setups that several processes cannot share safely"""
+    if workers < 2 or engine.dialect.name != "sqlite":
+        return
+    if not is_sqlite_file(settings.database_url):
+        raise SystemExit("An in-memory SQLite database cannot be shared by several workers; use --workers 1")
+    with engine.connect() as connection:
+        journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+        busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+    if journal_mode.lower() != "wal" or not busy_timeout:
+        raise SystemExit(
+            f"Several workers need SQLite in WAL mode with a busy timeout (got journal_mode={journal_mode}, "
+            f"busy_timeout={busy_timeout}); check the SQLITE_* settings or use --workers 1"
+        )
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server that tells the master once it accepts connections"""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            os.write(self.ready_fd, b"1")
+        os.close(self.ready_fd)
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        # uvicorn closes every connection without a request in progress, including
+        # one accepted just before whose request has not been read yet: stop
+        # accepting (the other workers take new connections) and let those arrive
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(ACCEPTED_REQUEST_GRACE_SECONDS)
+        await super().shutdown(sockets=sockets)
+
+
+class Worker:
+    def __init__(self, pid: int, ready_fd: int):
+        self.pid = pid
+        self.ready_fd: Optional[int] = ready_fd  # Read end of the pipe the worker writes to once ready
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.retiring = False  # Being replaced: stopped once no other worker is booting
+        self.stopping_since: Optional[float] = None
+
+
+class Master:
+    def __init__(self, sock: socket.socket, workers: int, max_requests: int, max_requests_jitter: int,
+                 max_memory_bytes: int, graceful_timeout: float):
+        self.sock = sock
+        self.target = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_memory_bytes = max_memory_bytes
+        self.graceful_timeout = graceful_timeout
+        self.workers: Dict[int, Worker] = {}
+        self.restart_queue: List[int] = []
+        self.signals: List[int] = []
+        self.boot_failures = 0
+        self.next_memory_check = 0.0
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_read, self.wakeup_write = os.pipe()
+
+    def run(self) -> int:
+        """Supervise workers until told to stop; returns the exit status"""
+        os.set_blocking(self.wakeup_write, False)
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ)
+        signal.set_wakeup_fd(self.wakeup_write)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+
+        logger.info("Master %d serving on %s:%d with %d workers", os.getpid(), *self.sock.getsockname()[:2], self.target)
+        self.rotate()
+        while True:
+            for key, _ in self.selector.select(timeout=1.0):
+                if key.fd == self.wakeup_read:
+                    os.read(self.wakeup_read, 4096)
+                else:
+                    self.mark_ready(key.data)
+            self.reap()
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop()
+                    return 0
+                if signum == signal.SIGHUP:
+                    logger.info("Rolling restart of %d workers", len(self.workers))
+                    self.restart_queue.extend(pid for pid in self.workers if pid not in self.restart_queue)
+            if self.boot_failures >= MAX_BOOT_FAILURES:
+                logger.error("%d workers in a row failed to start; shutting down", self.boot_failures)
+                self.stop()
+                return 1
+            self.check_workers()
+            self.rotate()
+
+    def spawn(self) -> None:
+        ready_read, ready_write = os.pipe()
+        gc.freeze()  # Keep preloaded objects out of collections, so workers keep sharing their pages
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            try:
+                self.run_worker(ready_write)
+                code = 0
+            except BaseException:
+                logger.exception("Worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                logging.shutdown()
+            os._exit(code)
+        os.close(ready_write)
+        worker = Worker(pid, ready_read)
+        self.workers[pid] = worker
+        self.selector.register(ready_read, selectors.EVENT_READ, worker)
+        logger.info("Booting worker %d", pid)
+
+    def run_worker(self, ready_fd: int) -> None:
+        """Body of a forked worker: plain signal handling, then serve on the inherited socket"""
+        signal.set_wakeup_fd(-1)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        self.selector.close()
+        for fd in (self.wakeup_read, self.wakeup_write, *(worker.ready_fd for worker in self.workers.values())):
+            if fd is not None:
+                os.close(fd)
+        limit = self.max_requests + random.randint(0, self.max_requests_jitter) if self.max_requests else None
+        config = uvicorn.Config(
+            app, limit_max_requests=limit, timeout_graceful_shutdown=self.graceful_timeout,
+            lifespan="on", log_config=None
+        )
+        WorkerServer(config, ready_fd).run(sockets=[self.sock])
+
+    def mark_ready(self, worker: Worker) -> None:
+        ready = os.read(worker.ready_fd, 1) == b"1"  # Empty if the worker exited during startup
+        self.close_ready_pipe(worker)
+        if ready:
+            worker.ready = True
+            self.boot_failures = 0
+            logger.info("Worker %d ready in %.1fs", worker.pid, time.monotonic() - worker.started_at)
+
+    def reap(self) -> None:
+        """Forget exited workers, counting the ones that died before becoming ready"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            self.close_ready_pipe(worker)
+            if not worker.ready:
+                self.boot_failures += 1
+            if pid in self.restart_queue:
+                self.restart_queue.remove(pid)
+            exit_code = os.waitstatus_to_exitcode(status)
+            if worker.stopping_since is None:
+                # Workers exit on their own with status 0 once they reach their request limit
+                log = logger.info if worker.ready and exit_code == 0 else logger.warning
+                log("Worker %d exited with status %d", pid, exit_code)
+
+    def close_ready_pipe(self, worker: Worker) -> None:
+        if worker.ready_fd is not None:
+            self.selector.unregister(worker.ready_fd)
+            os.close(worker.ready_fd)
+            worker.ready_fd = None
+
+    def check_workers(self) -> None:
+        """Kill stuck workers and queue the ones over the memory limit for replacement"""
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if worker.stopping_since is not None:
+                if now - worker.stopping_since > self.graceful_timeout + KILL_GRACE_SECONDS:
+                    logger.warning("Worker %d did not stop in time; killing it", worker.pid)
+                    self.signal_worker(worker, signal.SIGKILL)
+            elif not worker.ready and now - worker.started_at > BOOT_TIMEOUT_SECONDS:
+                logger.warning("Worker %d did not start within %gs; killing it", worker.pid, BOOT_TIMEOUT_SECONDS)
+                self.signal_worker(worker, signal.SIGKILL)
+        if not self.max_memory_bytes or now < self.next_memory_check:
+            return
+        self.next_memory_check = now + MEMORY_CHECK_INTERVAL_SECONDS
+        for worker in self.workers.values():
+            rss = resident_memory_bytes(worker.pid)
+            if worker.ready and not worker.retiring and rss and rss > self.max_memory_bytes:
+                if worker.pid not in self.restart_queue:
+                    logger.info("Worker %d uses %d MB; recycling it", worker.pid, rss // 2**20)
+                    self.restart_queue.append(worker.pid)
+
+    def rotate(self) -> None:
+        """Keep the target number of serving workers, replacing queued ones one at a time"""
+        booting = any(not worker.ready for worker in self.workers.values())
+        if not booting:
+            # Replacements are up: stop the workers they replace
+            for worker in self.workers.values():
+                if worker.retiring and worker.stopping_since is None:
+                    logger.info("Worker %d replaced; stopping it", worker.pid)
+                    self.signal_worker(worker, signal.SIGTERM)
+            while self.restart_queue:
+                worker = self.workers.get(self.restart_queue.pop(0))
+                if worker is not None and not worker.retiring:
+                    worker.retiring = True
+                    break
+        serving = sum(not worker.retiring for worker in self.workers.values())
+        for _ in range(self.target - serving):
+            if self.boot_failures:
+                time.sleep(min(self.boot_failures, 5))  # Back off while workers keep failing to start
+            self.spawn()
+
+    def signal_worker(self, worker: Worker, signum: int) -> None:
+        if worker.stopping_since is None:
+            worker.stopping_since = time.monotonic()
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def stop(self) -> None:
+        """Stop every worker gracefully, killing the ones still running after the timeout"""
+        logger.info("Stopping %d workers", len(self.workers))
+        for worker in self.workers.values():
+            self.signal_worker(worker, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + KILL_GRACE_SECONDS
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for worker in self.workers.values():
+            logger.warning("Worker %d did not stop in time; killing it", worker.pid)
+            os.kill(worker.pid, signal.SIGKILL)
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from a pre-forking master with N workers")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)), help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=settings.serve_workers or default_worker_count(),
+                        help="Worker processes (default: SERVE_WORKERS, else one per CPU)")
+    parser.add_argument("--backlog", type=int, default=2048, help="Pending connections queued by the shared socket")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s")
+
+    # Startup work done once, before forking
+    create_tables()
+    check_database(args.workers)
+    app.state.database_ready = True
+    dispose_engines()
+
+    owned_metrics_dir = None
+    if settings.metrics_enabled and args.workers > 1 and not settings.metrics_multiprocess_dir:
+        # /metrics has to merge every worker's snapshot to describe the whole server
+        owned_metrics_dir = settings.metrics_multiprocess_dir = tempfile.mkdtemp(prefix="contracts-metrics-")
+    if settings.metrics_multiprocess_dir:
+        os.makedirs(settings.metrics_multiprocess_dir, exist_ok=True)
+        metrics.remove_snapshots(settings.metrics_multiprocess_dir)
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+
+    master = Master(
+        sock, args.workers, settings.serve_max_requests, settings.serve_max_requests_jitter,
+        settings.serve_max_worker_memory_mb * 2**20, settings.serve_graceful_timeout_seconds
+    )
+    try:
+        status = master.run()
+    finally:
+        if owned_metrics_dir:
+            shutil.rmtree(owned_metrics_dir, ignore_errors=True)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Keep a local SQLite read replica in sync with the primary database.
+
+Copies DATABASE_URL onto the replica file with SQLite's online backup API,
+once or every --interval seconds. Point READ_REPLICA_URLS at the replica to
+try read routing locally, e.g.:
+
+    READ_REPLICA_URLS='["sqlite:///./contracts_replica.db"]' uvicorn app.main:app
+    python sync_replica.py sqlite:///./contracts_replica.db --interval 2
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import time
+
+from app.config import settings
+from app.database import backup_sqlite_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the primary SQLite database onto a replica file")
+    parser.add_argument("replica_url", help="SQLite URL of the replica, e.g. sqlite:///./contracts_replica.db")
+    parser.add_argument("--interval", type=float, default=None, help="Repeat every N seconds instead of once")
+    args = parser.parse_args()
+
+    while True:
+        backup_sqlite_database(settings.database_url, args.replica_url)
+        print(f"Replica {args.replica_url} synced from {settings.database_url}")
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,17 @@
 Test configuration and fixtures
 """
 import pytest
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
 from app.main import app
-from app.database import get_db, Base
+from app.database import get_db, get_async_db, get_async_replica_db, get_async_database_url, apply_sqlite_pragmas, Base
+from app.utils.cache import invalidate_query_caches
+from app.utils.query_stats import capture_queries, instrument_engine
 from app.models.contract import Category, Contract, ContractStatus
 from app.schemas.contract import ContractCreate
 from datetime import date
@@ -25,6 +29,21 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Each TestClient runs its own event loop, so async connections are not pooled across tests
+async_engine = create_async_engine(
+    get_async_database_url(SQLALCHEMY_DATABASE_URL),
+    poolclass=NullPool,
+)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False)
+
+# Enforce foreign keys like the app's SQLite profile does
+apply_sqlite_pragmas(engine, {"foreign_keys": "ON"})
+apply_sqlite_pragmas(async_engine.sync_engine, {"foreign_keys": "ON"})
+
+# Query budgets and Server-Timing need statement timing on the test engines too
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 
 def override_get_db():
     """Override database dependency for testing"""
@@ -35,7 +54,18 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    """Override asyncio database dependency for testing"""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_async_replica_db] = override_get_async_db
+# Startup work (supplier index) reads the test database too; db_session creates its schema
+app.state.session_factory = TestingSessionLocal
+app.state.database_ready = True
 
 
 @pytest.fixture(scope="function")
@@ -43,6 +73,7 @@ def db_session():
     """Create a fresh database session for each test"""
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    invalidate_query_caches()
     
     db = TestingSessionLocal()
     try:
@@ -52,12 +83,45 @@ def db_session():
 
 
 @pytest.fixture(scope="function")
-def client():
-    """Create a test client"""
+def client(db_session):
+    """Create a test client on a fresh test database"""
     with TestClient(app) as test_client:
         yield test_client
 
 
+@pytest.fixture
+def assert_max_queries():
+    """Context manager failing the test if the block runs more than `limit` SQL statements"""
+    @contextmanager
+    def check(limit: int):
+        with capture_queries() as stats:
+            yield stats
+        assert stats.count <= limit, (
+            f"{stats.count} statements, budget is {limit}:\n{stats.report()}"
+        )
+    return check
+
+
+def statement_verbs(statements):
+    """Leading keyword of each captured statement (SELECT, INSERT, ...)"""
+    return [statement.split()[0].upper() for statement in statements]
+
+
+@pytest.fixture
+def capture_statements(db_session):
+    """Context manager collecting, in order, the SQL statements the test engine runs in the block"""
+    @contextmanager
+    def capture():
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            yield statements
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    return capture
+
+
 @pytest.fixture
 def sample_category(db_session):
     """Create a sample category for testing"""
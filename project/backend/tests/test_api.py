@@ -1,8 +1,34 @@
 """
 Integration tests for the contract API endpoints
 """
+import asyncio
+import csv
+import io
+import json
+import os
+import pstats
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
 import pytest
 from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+from app.database import backup_sqlite_database, get_async_db, get_async_replica_db, get_async_database_url
+from app.api.middleware import ProfilingMiddleware, QueryStatsMiddleware
+from app.main import app
+from app.utils import metrics
+from app.utils.query_stats import capture_queries, instrument_engine
+from tests.conftest import SQLALCHEMY_DATABASE_URL, engine
 
 
 class TestContractAPI:
@@ -38,6 +64,19 @@ class TestContractAPI:
         
         assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
     
+    def test_bulk_create_contracts(self, client, sample_contract_data):
+        """Test bulk contract creation via API"""
+        second = dict(sample_contract_data, contract_number="TEST-2024-002")
+        payload = {"items": [sample_contract_data, second, sample_contract_data]}
+
+        response = client.post("/api/v1/contracts/bulk", json=payload)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [r["status"] for r in data["results"]] == ["created", "created", "error"]
+        assert data["created"] == 2
+        assert client.get(f"/api/v1/contracts/{data['results'][1]['id']}").status_code == status.HTTP_200_OK
+
     def test_get_contract_success(self, client, sample_contract):
         """Test successful contract retrieval via API"""
         response = client.get(f"/api/v1/contracts/{sample_contract.id}")
@@ -68,6 +107,8 @@ class TestContractAPI:
         assert "pages" in data
         assert len(data["items"]) == 3
         assert data["total"] == 3
+        assert data["total_mode"] == "exact"
+        assert data["has_next"] is False
     
     def test_list_contracts_with_filters(self, client, multiple_contracts):
         """Test contract listing with filters"""
@@ -79,6 +120,188 @@ class TestContractAPI:
         assert len(data["items"]) == 1
         assert "Microsoft" in data["items"][0]["supplier"]
 
+    def test_list_contracts_search_with_highlights(self, client, multiple_contracts):
+        """Test full-text search with highlighted snippets via API"""
+        response = client.get("/api/v1/contracts/?q=goog&sort_by=relevance&highlight=true")
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [item["supplier"] for item in data["items"]] == ["Google LLC"]
+        assert data["highlights"][data["items"][0]["id"]] == "<mark>Google</mark> LLC"
+
+    def test_list_contracts_cursor_pagination(self, client, multiple_contracts):
+        """Test walking the contract list with next_cursor"""
+        response = client.get("/api/v1/contracts/?page_size=2&sort_by=value&sort_dir=asc")
+        data = response.json()
+        assert [item["contract_number"] for item in data["items"]] == ["TEST-2024-003", "TEST-2024-002"]
+        assert data["next_cursor"]
+
+        response = client.get(
+            f"/api/v1/contracts/?page_size=2&sort_by=value&sort_dir=asc&cursor={data['next_cursor']}"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [item["contract_number"] for item in data["items"]] == ["TEST-2024-001"]
+        assert data["next_cursor"] is None
+
+    def test_list_contracts_invalid_cursor(self, client, multiple_contracts):
+        """Test listing with a malformed cursor"""
+        response = client.get("/api/v1/contracts/?cursor=garbage")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_list_contracts_sparse_fields(self, client, multiple_contracts):
+        """Test fields= returns only the requested contract fields plus id"""
+        response = client.get("/api/v1/contracts/?fields=contract_number,category&sort_by=value&sort_dir=asc")
+        assert response.status_code == status.HTTP_200_OK
+        item = response.json()["items"][0]
+        assert set(item) == {"id", "contract_number", "category"}
+        assert item["contract_number"] == "TEST-2024-003"
+        assert item["category"]["name"] == multiple_contracts[0].category.name
+
+        response = client.get("/api/v1/contracts/?fields=supplier,bogus")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "bogus" in response.json()["error"]["message"]
+
+    def test_list_contracts_facets(self, client, multiple_contracts, sample_contract_data):
+        """Test facet counts ignore the facet's own filter and follow writes"""
+        category_id = multiple_contracts[0].category_id
+        response = client.get("/api/v1/contracts/?facets=status,category_id,year&status=active")
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total"] == 1
+        assert data["facets"] == {
+            "status": [{"value": "active", "count": 1}, {"value": "draft", "count": 1}, {"value": "expired", "count": 1}],
+            "category_id": [{"value": category_id, "count": 1}],
+            "year": [{"value": 2024, "count": 1}],
+        }
+
+        response = client.get("/api/v1/contracts/?facets=year,status&start_date_from=2024-01-01")
+        facets = response.json()["facets"]
+        assert facets["year"] == [{"value": 2024, "count": 2}, {"value": 2023, "count": 1}]
+        assert facets["status"] == [{"value": "active", "count": 1}, {"value": "draft", "count": 1}]
+
+        client.post("/api/v1/contracts/", json={
+            **sample_contract_data, "contract_number": "FACET-1", "category_id": category_id,
+            "start_date": "2023-03-01", "end_date": "2023-09-30"
+        })
+        response = client.get("/api/v1/contracts/?facets=year")
+        assert response.json()["facets"]["year"] == [{"value": 2023, "count": 2}, {"value": 2024, "count": 2}]
+
+        response = client.get("/api/v1/contracts/?facets=status,bogus")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "bogus" in response.json()["error"]["message"]
+
+    def test_caches_follow_writes_from_other_processes(self, client, multiple_contracts, sample_contract_data):
+        """Test cached totals and facets are not served after another process wrote contracts"""
+        url = "/api/v1/contracts/?include_total=estimate&facets=status"
+        assert client.get(url).json()["total"] == 3
+        cached = client.get(url).json()
+        assert (cached["total"], cached["total_mode"]) == (3, "estimate")
+
+        # Another worker (a separate process with its own caches) creates a contract
+        writer = (
+            "import json, sys\n"
+            "from app.database import SessionLocal\n"
+            "from app.schemas.contract import ContractCreate\n"
+            "from app.services.contract import ContractService\n"
+            "with SessionLocal() as db:\n"
+            "    ContractService(db).create_contract(ContractCreate(**json.loads(sys.argv[1])))\n"
+        )
+        data = {**sample_contract_data, "contract_number": "OTHER-PROCESS-1", "status": "expired"}
+        subprocess.run(
+            [sys.executable, "-c", writer, json.dumps(data)],
+            env={**os.environ, "DATABASE_URL": SQLALCHEMY_DATABASE_URL}, check=True, timeout=60
+        )
+
+        fresh = client.get(url).json()
+        assert (fresh["total"], fresh["total_mode"]) == (4, "exact")
+        assert {"value": "expired", "count": 2} in fresh["facets"]["status"]
+
+    def test_get_contract_sparse_fields(self, client, sample_contract):
+        """Test fields= on a single contract, with the ETag only when version is selected"""
+        url = f"/api/v1/contracts/{sample_contract.id}"
+        response = client.get(f"{url}?fields=status,value")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"id": sample_contract.id, "status": "active", "value": "50000.00"}
+        assert "ETag" not in response.headers
+
+        response = client.get(f"{url}?fields=version")
+        assert response.json() == {"id": sample_contract.id, "version": 1}
+        assert response.headers["ETag"] == '"1"'
+
+        assert client.get("/api/v1/contracts/missing?fields=status").status_code == status.HTTP_404_NOT_FOUND
+
+    def test_batch_get_contracts(self, client, multiple_contracts):
+        """Test batch get keeps request order and marks missing ids"""
+        ids = [multiple_contracts[2].id, "missing-id", multiple_contracts[0].id]
+        response = client.post("/api/v1/contracts:batchGet", json={"ids": ids})
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [item["key"] for item in data["items"]] == ids
+        assert [item["found"] for item in data["items"]] == [True, False, True]
+        assert data["items"][0]["contract"]["contract_number"] == multiple_contracts[2].contract_number
+        assert data["items"][1]["contract"] is None
+        assert data["found"] == 2
+        assert data["missing"] == ["missing-id"]
+
+        response = client.post(
+            "/api/v1/contracts:batchGet", json={"ids": ["TEST-2024-001"], "by": "contract_number"}
+        )
+        assert response.json()["items"][0]["contract"]["id"] == multiple_contracts[0].id
+
+    def test_export_contracts_csv(self, client, multiple_contracts):
+        """Test CSV export honours the list filters"""
+        response = client.get("/api/v1/contracts/export?format=csv&status=active&min_value=60000")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [row["contract_number"] for row in rows] == ["TEST-2024-001"]
+        assert rows[0]["category_name"] == "Software Licensing"
+        assert rows[0]["status"] == "active"
+
+    def test_export_contracts_ndjson(self, client, multiple_contracts):
+        """Test NDJSON export streams one object per contract"""
+        response = client.get("/api/v1/contracts/export?format=ndjson&sort_by=value&sort_dir=asc")
+
+        assert response.status_code == status.HTTP_200_OK
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["contract_number"] for r in records] == ["TEST-2024-003", "TEST-2024-002", "TEST-2024-001"]
+        assert records[0]["value"] == "50000.00"
+        assert records[0]["start_date"] == "2023-01-01"
+
+    def test_contract_summary(self, client, sample_contract_data):
+        """Test dashboard summary via API"""
+        client.post("/api/v1/contracts/", json=sample_contract_data)
+        client.post("/api/v1/contracts/", json=dict(
+            sample_contract_data, contract_number="TEST-2024-002", status="draft", value="25.50"
+        ))
+
+        response = client.get("/api/v1/contracts/summary?expiring_within_days=7")
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_count"] == 2
+        assert data["total_value"] == "50025.50"
+        assert {b["key"]: b["count"] for b in data["by_status"]} == {"active": 1, "draft": 1}
+        # Bucket totals keep both decimal places, even when they are whole or end in zero
+        assert {b["key"]: b["value"] for b in data["by_status"]} == {"active": "50000.00", "draft": "25.50"}
+        assert [b["value"] for b in data["by_category"]] == ["50025.50"]
+        assert [b["value"] for b in data["by_start_month"]] == ["50025.50"]
+        assert data["by_category"][0]["label"] == "Software Licensing"
+        assert data["expiring_within_days"] == 7
+        assert data["expiring_count"] == 0
+
+    def test_list_serializes_like_detail(self, client, sample_contract):
+        """Test the fast list encoding matches the regular response_model encoding"""
+        listed = client.get("/api/v1/contracts/").json()["items"][0]
+        detail = client.get(f"/api/v1/contracts/{sample_contract.id}").json()
+        
+        assert listed == detail
+        assert isinstance(listed["value"], str)
+
     def test_update_contract_success(self, client, sample_contract):
         """Test successful contract update via API"""
         update_data = {
@@ -94,6 +317,60 @@ class TestContractAPI:
         assert data["status"] == update_data["status"]
         assert data["id"] == sample_contract.id
 
+    def test_update_contract_rejects_nulls(self, client, sample_contract):
+        """Test explicit nulls for required fields are rejected without writing"""
+        url = f"/api/v1/contracts/{sample_contract.id}"
+        
+        for field in ("category_id", "supplier", "value"):
+            response = client.put(url, json={field: None, "responsible": "Someone Else"})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert response.json()["error"]["message"] == f"Fields cannot be null: {field}"
+        
+        contract = client.get(url).json()
+        assert contract["version"] == 1
+        assert contract["responsible"] == sample_contract.responsible
+
+    def test_update_contract_if_match(self, client, sample_contract):
+        """Test conditional updates with If-Match reject stale versions"""
+        url = f"/api/v1/contracts/{sample_contract.id}"
+        etag = client.get(url).headers["ETag"]
+        assert etag == '"1"'
+        
+        response = client.put(url, json={"supplier": "First Editor"}, headers={"If-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] == '"2"'
+        assert response.json()["version"] == 2
+        
+        # A second editor still holding the old ETag must not overwrite the first
+        response = client.put(url, json={"supplier": "Second Editor"}, headers={"If-Match": etag})
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        response = client.put(url, json={"supplier": "Second Editor"}, headers={"If-Match": "garbage"})
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        # If-Match compares strongly, so even the current version as a weak tag fails
+        response = client.put(url, json={"supplier": "Second Editor"}, headers={"If-Match": 'W/"2"'})
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        assert client.get(url).json()["supplier"] == "First Editor"
+
+    def test_get_contract_history(self, client, sample_contract):
+        """Test the history endpoint pages through a contract's changes"""
+        url = f"/api/v1/contracts/{sample_contract.id}"
+        for n in range(3):
+            client.put(url, json={"supplier": f"Supplier {n}"})
+        
+        response = client.get(f"{url}/history", params={"page_size": 2})
+        assert response.status_code == status.HTTP_200_OK
+        first = response.json()
+        assert [entry["changes"]["supplier"]["new"] for entry in first["items"]] == ["Supplier 2", "Supplier 1"]
+        assert first["has_next"] is True
+        
+        second = client.get(f"{url}/history", params={"page_size": 2, "cursor": first["next_cursor"]}).json()
+        assert [entry["changes"]["supplier"]["new"] for entry in second["items"]] == ["Supplier 0"]
+        assert second["has_next"] is False
+        
+        assert client.get(f"{url}/history", params={"changed_by": "someone.else"}).json()["items"] == []
+        assert client.get(f"{url}/history", params={"changed_from": "2999-01-01T00:00:00Z"}).json()["items"] == []
+        assert client.get("/api/v1/contracts/missing/history").status_code == status.HTTP_404_NOT_FOUND
+
     def test_delete_contract_success(self, client, sample_contract):
         """Test successful contract deletion via API"""
         response = client.delete(f"/api/v1/contracts/{sample_contract.id}?confirmation=true")
@@ -170,4 +447,435 @@ class TestCategoryAPI:
         response = client.delete(f"/api/v1/categories/{category_id}?confirmation=true")
         
         assert response.status_code == status.HTTP_400_BAD_REQUEST
-        assert "associated contracts" in response.json()["error"]["message"]
\ No newline at end of file
+        assert "associated contracts" in response.json()["error"]["message"]
+
+
+class TestMetrics:
+    """Test request metrics and the /metrics endpoint"""
+
+    def test_metrics_by_route_template(self, client, sample_contract):
+        """Test requests are recorded per route template, method and status"""
+        metrics.registry.reset()
+        client.get(f"/api/v1/contracts/{sample_contract.id}")
+        client.get("/api/v1/contracts/missing-id")
+        client.get("/no-such-path")
+
+        response = client.get("/metrics")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        route = "/api/v1/contracts/{contract_id}"
+        assert f'http_requests_total{{method="GET",route="{route}",status="200"}} 1' in body
+        assert f'http_requests_total{{method="GET",route="{route}",status="404"}} 1' in body
+        assert 'route="<unmatched>",status="404"' in body
+        assert f'http_request_duration_seconds_count{{method="GET",route="{route}",status="200"}} 1' in body
+        assert f'http_request_duration_seconds_bucket{{method="GET",route="{route}",status="200",le="+Inf"}} 1' in body
+        assert f'http_response_size_bytes_count{{method="GET",route="{route}"}} 2' in body
+        # The scrape itself is still in flight
+        assert 'http_requests_in_progress{method="GET"} 1' in body
+
+    def test_metrics_merge_worker_snapshots(self, tmp_path):
+        """Test scrapes sum other workers' snapshots and drop gauges of dead workers"""
+        registry = metrics.MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("route",))
+        latency = registry.histogram("latency_seconds", "Latency", ("route",), (0.1, 1.0))
+        in_flight = registry.gauge("in_flight", "In flight")
+        requests.inc(("/a",), 2)
+        latency.observe(("/a",), 0.05)
+        in_flight.inc(())
+
+        dead_worker = {
+            "pid": 2 ** 22 + 1,  # Above the default pid_max, so never a live process
+            "metrics": {
+                "requests_total": [[["/a"], 3], [["/b"], 1]],
+                "latency_seconds": [[["/a"], [0, 1, 0, 0.5]]],
+                "in_flight": [[[], 4]],
+            },
+        }
+        (tmp_path / "worker-1-1.json").write_text(json.dumps(dead_worker))
+
+        body = registry.render(str(tmp_path))
+        assert 'requests_total{route="/a"} 5' in body
+        assert 'requests_total{route="/b"} 1' in body
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in body
+        assert 'latency_seconds_bucket{route="/a",le="1"} 2' in body
+        assert 'latency_seconds_count{route="/a"} 2' in body
+        assert 'latency_seconds_sum{route="/a"} 0.55' in body
+        assert "in_flight 1" in body
+        assert len(list(tmp_path.glob("worker-*.json"))) == 2
+
+
+class TestQueryBudgets:
+    """Test the SQL statement count of each endpoint stays within its budget"""
+
+    def test_contract_endpoints(self, client, sample_contract, sample_contract_data, assert_max_queries):
+        """Raise a budget only together with the change that needs the extra statements"""
+        url = f"/api/v1/contracts/{sample_contract.id}"
+        with assert_max_queries(4):
+            created = client.post("/api/v1/contracts/", json={**sample_contract_data, "contract_number": "NEW-1"})
+        with assert_max_queries(2):
+            client.get("/api/v1/contracts/")
+        with assert_max_queries(1):
+            client.get(url)
+        with assert_max_queries(2):
+            client.get(f"{url}/history")
+        with assert_max_queries(5):
+            client.put(url, json={"supplier": "Updated", "status": "suspended"})
+        with assert_max_queries(3):
+            client.get("/api/v1/contracts/summary")
+        with assert_max_queries(1):
+            client.post("/api/v1/contracts:batchGet", json={"ids": [sample_contract.id, created.json()["id"]]})
+        with assert_max_queries(5):
+            client.post("/api/v1/contracts/bulk", json={"items": [
+                {**sample_contract_data, "contract_number": f"BULK-{n}"} for n in range(20)
+            ]})
+        with assert_max_queries(7):
+            client.delete(f"{url}?confirmation=true")
+
+    def test_list_facets(self, client, sample_contract, assert_max_queries):
+        """Test each facet is one grouped query, and none once cached (the data generation read keys the cache)"""
+        url = "/api/v1/contracts/?facets=status,category_id,year"
+        with assert_max_queries(6):
+            client.get(url)
+        with assert_max_queries(3):
+            client.get(url)
+
+    def test_category_endpoints(self, client, sample_category, assert_max_queries):
+        """Test category reads are a single statement"""
+        with assert_max_queries(1):
+            client.get("/api/v1/categories/")
+        with assert_max_queries(1):
+            client.get(f"/api/v1/categories/{sample_category.id}")
+
+    def test_server_timing_header(self, client, sample_contract):
+        """Test responses report their DB time and statement count"""
+        response = client.get(f"/api/v1/contracts/{sample_contract.id}")
+        db_timing, slowest = response.headers["Server-Timing"].split(", ")
+        assert db_timing.startswith("db;dur=") and db_timing.endswith(';desc="1 queries"')
+        assert slowest.startswith("db-slowest;dur=")
+
+    def test_only_instrumented_engines_are_timed(self):
+        """Test statement timing is opt-in per engine rather than global"""
+        other_engine = create_engine("sqlite://")
+        with capture_queries() as stats, other_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        assert stats.count == 0
+
+        instrument_engine(other_engine)
+        instrument_engine(other_engine)
+        with capture_queries() as stats, other_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        assert stats.count == 1
+        other_engine.dispose()
+
+    def test_repeated_statements_logged(self, caplog, monkeypatch):
+        """Test a request running one statement in a loop is reported as a possible N+1"""
+        monkeypatch.setattr(settings, "sql_repeated_statement_threshold", 3)
+
+        async def n_plus_one(scope, receive, send):
+            with engine.connect() as connection:
+                for contract_id in range(3):
+                    connection.execute(text("SELECT :id"), {"id": contract_id})
+                connection.execute(text("SELECT 'other'"))
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        with caplog.at_level("WARNING", logger="app.api.middleware"):
+            response = TestClient(QueryStatsMiddleware(n_plus_one)).get("/")
+
+        assert 'desc="4 queries"' in response.headers["Server-Timing"]
+        warnings = [record.getMessage() for record in caplog.records if "Possible N+1" in record.getMessage()]
+        assert len(warnings) == 1
+        assert "ran this statement 3 times: SELECT ?" in warnings[0]
+
+
+class TestAsyncDatabasePath:
+    """Test routes run their queries without blocking the event loop"""
+
+    QUERY_DELAY = 0.1
+    PARALLEL_REQUESTS = 5
+
+    @pytest.fixture
+    def slow_async_db(self):
+        """Async session whose supplier filter takes QUERY_DELAY inside SQLite"""
+        slow_engine = create_async_engine(
+            get_async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool
+        )
+
+        def slow_lower(value):
+            # Runs on the driver's worker thread, standing in for a slow query
+            if value == "%slow-query%":
+                time.sleep(self.QUERY_DELAY)
+            return value.lower() if isinstance(value, str) else value
+
+        @event.listens_for(slow_engine.sync_engine, "connect")
+        def register_slow_lower(dbapi_connection, connection_record):
+            dbapi_connection.create_function("lower", 1, slow_lower)
+
+        session_factory = async_sessionmaker(bind=slow_engine, autoflush=False)
+
+        async def override():
+            async with session_factory() as db:
+                yield db
+
+        dependencies = (get_async_db, get_async_replica_db)
+        previous = {dependency: app.dependency_overrides[dependency] for dependency in dependencies}
+        app.dependency_overrides.update({dependency: override for dependency in dependencies})
+        yield
+        app.dependency_overrides.update(previous)
+
+    @pytest.mark.asyncio
+    async def test_parallel_list_requests_overlap(self, slow_async_db, multiple_contracts):
+        """Test N slow list requests take about as long as one, not N times as long"""
+        url = "/api/v1/contracts/?supplier=slow-query"
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as async_client:
+            started = time.perf_counter()
+            response = await async_client.get(url)
+            single = time.perf_counter() - started
+            assert response.status_code == status.HTTP_200_OK
+
+            started = time.perf_counter()
+            responses = await asyncio.gather(*[
+                async_client.get(url) for _ in range(self.PARALLEL_REQUESTS)
+            ])
+            parallel = time.perf_counter() - started
+
+        assert all(r.status_code == status.HTTP_200_OK for r in responses)
+        assert single >= self.QUERY_DELAY
+        assert parallel < single * self.PARALLEL_REQUESTS / 2
+
+
+class TestReadReplicas:
+    """Test GET routes read from a replica while writes and read-your-writes use the primary"""
+
+    REPLICA_URL = "sqlite:///./test_replica.db"
+
+    @pytest.fixture
+    def replica(self, monkeypatch):
+        """A replica file synced from the test database with the SQLite backup API"""
+        monkeypatch.setattr(settings, "read_replica_urls", [self.REPLICA_URL])
+        replica_engine = create_async_engine(get_async_database_url(self.REPLICA_URL), poolclass=NullPool)
+        session_factory = async_sessionmaker(bind=replica_engine, autoflush=False)
+
+        async def override():
+            async with session_factory() as db:
+                yield db
+
+        previous = app.dependency_overrides[get_async_replica_db]
+        app.dependency_overrides[get_async_replica_db] = override
+        yield lambda: backup_sqlite_database(SQLALCHEMY_DATABASE_URL, self.REPLICA_URL)
+        app.dependency_overrides[get_async_replica_db] = previous
+
+    def test_reads_use_replica_until_synced(self, client, sample_contract, replica):
+        """Test stale replica reads, the read-your-writes window and catching up after a sync"""
+        replica()
+        url = f"/api/v1/contracts/{sample_contract.id}"
+        original_supplier = sample_contract.supplier
+        
+        response = client.put(url, json={"supplier": "Written To Primary"})
+        assert response.status_code == status.HTTP_200_OK
+        marker = response.headers["X-Read-Primary-Until"]
+        assert "read_primary_until" in response.cookies
+        
+        # The writer's cookie routes its reads to the primary ...
+        assert client.get(url).json()["supplier"] == "Written To Primary"
+        # ... and so does echoing the header back
+        client.cookies.clear()
+        assert client.get(url, headers={"X-Read-Primary-Until": marker}).json()["supplier"] == "Written To Primary"
+        
+        # Everyone else reads the replica, which lags until the next sync
+        assert client.get(url).json()["supplier"] == original_supplier
+        replica()
+        assert client.get(url).json()["supplier"] == "Written To Primary"
+
+    def test_replica_facets_are_not_served_to_primary_reads(self, client, multiple_contracts, sample_contract_data, replica):
+        """Test facets cached from a lagging replica never answer a read routed to the primary"""
+        replica()
+        url = "/api/v1/contracts/?facets=status"
+        expired = {"value": "expired", "count": 1}
+        assert expired in client.get(url).json()["facets"]["status"]
+
+        response = client.post("/api/v1/contracts/", json={
+            **sample_contract_data, "contract_number": "REPLICA-FACET-1", "status": "expired"
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+
+        # Inside the read-your-writes window the primary answers, with the new contract counted
+        assert {"value": "expired", "count": 2} in client.get(url).json()["facets"]["status"]
+        # Other clients still see the replica's own (cached) counts until it syncs
+        client.cookies.clear()
+        assert expired in client.get(url).json()["facets"]["status"]
+
+
+class TestProfiling:
+    """Test on-demand request profiling and the admin profile endpoints"""
+
+    @pytest.fixture
+    def profiling(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings, "profiling_token", "secret")
+        monkeypatch.setattr(settings, "profiling_dir", str(tmp_path))
+        with TestClient(ProfilingMiddleware(app)) as profiled_client:
+            yield profiled_client
+
+    def test_profile_on_demand(self, profiling, sample_contract, tmp_path):
+        """Test only requests carrying the token are profiled, and the profile can be listed and downloaded"""
+        assert "X-Profile-Id" not in profiling.get("/api/v1/contracts/").headers
+        assert "X-Profile-Id" not in profiling.get("/api/v1/contracts/", headers={"X-Profile": "wrong"}).headers
+
+        response = profiling.get("/api/v1/contracts/", headers={"X-Profile": "secret"})
+        assert response.status_code == status.HTTP_200_OK
+        profile_id = response.headers["X-Profile-Id"]
+        by_query = profiling.get(f"/api/v1/contracts/{sample_contract.id}?profile=secret")
+        assert by_query.status_code == status.HTTP_200_OK and "X-Profile-Id" in by_query.headers
+
+        admin = {"X-Admin-Token": "secret"}
+        listed = profiling.get("/api/v1/admin/profiles", headers=admin).json()["items"]
+        assert [item["id"] for item in listed] == [by_query.headers["X-Profile-Id"], profile_id]
+        assert listed[1]["route"] == "/api/v1/contracts/" and listed[1]["trigger"] == "token"
+
+        summary = profiling.get(f"/api/v1/admin/profiles/{profile_id}", headers=admin).json()
+        layers = summary["layers"]
+        assert set(layers) == {"route", "service", "repository"}
+        assert 0 < layers["repository"]["total_ms"] <= layers["service"]["total_ms"] <= layers["route"]["total_ms"]
+        assert layers["service"]["self_ms"] == pytest.approx(
+            layers["service"]["total_ms"] - layers["repository"]["total_ms"], abs=0.01
+        )
+        assert summary["allocations"]["peak_bytes"] > 0
+        assert summary["functions"]
+        app_functions = [row["function"] for row in summary["app_functions"]]
+        assert any("services/contract.py" in name and "list_contracts" in name for name in app_functions)
+
+        download = profiling.get(f"/api/v1/admin/profiles/{profile_id}/download", headers=admin)
+        assert download.status_code == status.HTTP_200_OK
+        dump = tmp_path / "download.prof"
+        dump.write_bytes(download.content)
+        assert pstats.Stats(str(dump)).total_tt > 0
+
+    def test_sampled_profiles_are_pruned(self, profiling, monkeypatch):
+        """Test sampling profiles requests without a token and only the newest profiles are kept"""
+        monkeypatch.setattr(settings, "profiling_sample_rate", 1.0)
+        monkeypatch.setattr(settings, "profiling_max_profiles", 2)
+        for _ in range(3):
+            assert "X-Profile-Id" in profiling.get("/health").headers
+
+        listed = profiling.get("/api/v1/admin/profiles", headers={"X-Admin-Token": "secret"}).json()["items"]
+        assert len(listed) == 2
+        assert {item["trigger"] for item in listed} == {"sample"}
+
+    def test_admin_endpoints_guarded(self, client, monkeypatch):
+        """Test the admin endpoints are hidden without a configured token and need it when configured"""
+        assert client.get("/api/v1/admin/profiles").status_code == status.HTTP_404_NOT_FOUND
+        monkeypatch.setattr(settings, "profiling_token", "secret")
+        assert client.get("/api/v1/admin/profiles").status_code == status.HTTP_403_FORBIDDEN
+        response = client.get("/api/v1/admin/profiles/../../etc/passwd", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestSupplierSuggest:
+    """Test the supplier typeahead endpoint"""
+
+    def test_suggest_follows_writes(self, client, db_session, sample_contract_data, assert_max_queries):
+        """Test suggestions match prefixes ignoring case and accents and track creates, updates and deletes"""
+        url = "/api/v1/suppliers/suggest"
+        ids = {}
+        for number, supplier in enumerate(["Ácme Corp", "Ácme Corp", "acme  corp", "Acme Labs", "Beta GmbH"]):
+            response = client.post("/api/v1/contracts/", json={
+                **sample_contract_data, "contract_number": f"SUG-{number}", "supplier": supplier
+            })
+            ids[number] = response.json()["id"]
+
+        with assert_max_queries(0):
+            response = client.get(url, params={"prefix": "ACME"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"prefix": "ACME", "items": [
+            {"name": "Ácme Corp", "contracts": 3}, {"name": "Acme Labs", "contracts": 1}
+        ]}
+        assert [item["name"] for item in client.get(url, params={"prefix": "acmé c"}).json()["items"]] == ["Ácme Corp"]
+        assert client.get(url, params={"prefix": "acme", "limit": 1}).json()["items"] == [
+            {"name": "Ácme Corp", "contracts": 3}
+        ]
+
+        client.put(f"/api/v1/contracts/{ids[3]}", json={"supplier": "Beta GmbH"})
+        client.delete(f"/api/v1/contracts/{ids[0]}?confirmation=true")
+        assert client.get(url, params={"prefix": "acme"}).json()["items"] == [{"name": "Ácme Corp", "contracts": 2}]
+        assert client.get(url, params={"prefix": "b"}).json()["items"] == [{"name": "Beta GmbH", "contracts": 2}]
+
+        assert client.get(url).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert client.get(url, params={"prefix": "a", "limit": 500}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_index_loaded_from_test_database_at_startup(self, db_session, sample_contract):
+        """Test startup builds the index through app.state.session_factory, not the default database"""
+        with TestClient(app) as test_client:
+            response = test_client.get("/api/v1/suppliers/suggest", params={"prefix": "test sup"})
+        assert response.json()["items"] == [{"name": sample_contract.supplier, "contracts": 1}]
+
+
+class TestServe:
+    """serve.py run as a real pre-forking master"""
+
+    @staticmethod
+    def _wait_until(condition, log, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "".join(log)
+            time.sleep(0.1)
+
+    def test_rolling_restart_and_shutdown(self, tmp_path):
+        """Test two workers serve, SIGHUP replaces them without failing a request and SIGTERM exits cleanly"""
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp_path / 'serve.db'}",
+            "AUDIT_JOURNAL_DIR": str(tmp_path / "audit_journal"),
+            "SERVE_GRACEFUL_TIMEOUT_SECONDS": "5",
+        }
+        master = subprocess.Popen(
+            [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", "0", "--workers", "2"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, stderr=subprocess.PIPE, text=True
+        )
+        log = []
+        def read_log():
+            for line in master.stderr:
+                log.append(line)
+        threading.Thread(target=read_log, daemon=True).start()
+        ready = lambda: [int(pid) for pid in re.findall(r"Worker (\d+) ready", "".join(log))]
+        running = lambda pid: os.path.exists(f"/proc/{pid}")
+        try:
+            self._wait_until(lambda: len(ready()) == 2, log)
+            port = int(re.search(r"serving on 127\.0\.0\.1:(\d+)", "".join(log)).group(1))
+            url = f"http://127.0.0.1:{port}/health"
+            assert httpx.get(url).json()["status"] == "healthy"
+
+            # Keep requests coming while every worker is replaced
+            failures, served, done = [], [], threading.Event()
+            def load():
+                while not done.is_set():
+                    try:
+                        response = httpx.get(url, timeout=10)
+                        (served if response.status_code == 200 else failures).append(response.status_code)
+                    except httpx.HTTPError as exc:
+                        failures.append(repr(exc))
+            loader = threading.Thread(target=load)
+            loader.start()
+            old_workers = ready()
+            master.send_signal(signal.SIGHUP)
+            self._wait_until(lambda: len(ready()) == 4 and not any(running(pid) for pid in old_workers), log)
+            served_before = len(served)
+            self._wait_until(lambda: len(served) > served_before, log)
+            done.set()
+            loader.join()
+
+            new_workers = ready()[2:]
+            assert not set(new_workers) & set(old_workers)
+            assert all(running(pid) for pid in new_workers)
+            assert failures == []
+            assert served
+
+            master.send_signal(signal.SIGTERM)
+            assert master.wait(timeout=30) == 0
+            assert not any(running(pid) for pid in new_workers)
+        finally:
+            if master.poll() is None:
+                master.kill()
+                master.wait()
@@ -1,12 +1,35 @@
 """
 Unit tests for contract-related functionality
 """
+import asyncio
+import os
 import pytest
+import pytest_asyncio
+import signal
+import subprocess
+import sys
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Query
+from sqlalchemy.pool import NullPool
+from app.config import settings
+from app.database import RoutingSession, get_async_database_url
+from app.services.audit import AuditLogWriter
 from app.services.contract import ContractService, CategoryService
-from app.schemas.contract import ContractCreate, CategoryCreate
+from app.repositories.contract import ContractRepository, ChangeHistoryRepository, SORT_FIELDS
+from app.schemas.contract import (
+    ContractCreate, ContractUpdate, CategoryCreate, ContractFilters, PaginationParams, ContractBulkRequest,
+    ContractBatchGetRequest, ChangeHistoryFilters
+)
+from app.models.contract import AuditJournalCheckpoint, ChangeHistory as ChangeHistoryModel
 from fastapi import HTTPException
+from app.models.contract import Contract as ContractModel
+from app.models.indexes import ManagedIndex, apply_managed_indexes, load_manifest
 from datetime import date
 from decimal import Decimal
+from tests.conftest import SQLALCHEMY_DATABASE_URL, statement_verbs
 
 
 class TestContractService:
@@ -78,6 +101,147 @@ class TestContractService:
         
         assert exc_info.value.status_code == 400
         assert "does not exist" in str(exc_info.value.detail)
+        assert db_session.query(ContractModel).filter_by(contract_number="TEST-002").count() == 0
+
+    def test_enforced_foreign_key_is_bad_request(self, db_session, sample_contract, capture_statements):
+        """Test an unknown category rejected by an enforced foreign key is a 400, not a server error"""
+        service = ContractService(db_session)
+        with capture_statements() as create_statements, pytest.raises(HTTPException) as created:
+            service.create_contract(ContractCreate(
+                contract_number="TEST-FK", supplier="Test Supplier", description="Test contract",
+                category_id=999, responsible="test.user", value=Decimal("1.00"),
+                start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+            ))
+        with capture_statements() as update_statements, pytest.raises(HTTPException) as updated:
+            service.update_contract(sample_contract.id, ContractUpdate(category_id=999))
+
+        assert (created.value.status_code, created.value.detail) == (400, "Category with id 999 does not exist")
+        assert (updated.value.status_code, updated.value.detail) == (400, "Category with id 999 does not exist")
+        # The foreign key failed the write itself, before any category lookup
+        assert statement_verbs(create_statements) == ["INSERT"]
+        assert statement_verbs(update_statements)[-1] == "UPDATE"
+
+    def test_create_contract_single_transaction(self, db_session, sample_category, capture_statements):
+        """Test contract creation commits once with a fixed number of statements"""
+        service = ContractService(db_session)
+        db_session.expunge_all()
+        contract_data = ContractCreate(
+            contract_number="TEST-003", supplier="Test Supplier", description="Test contract",
+            category_id=sample_category.id, responsible="test.user", value=Decimal("10000.00"),
+            start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+        )
+
+        commits = []
+        commit_listener = lambda session: commits.append(session)
+        event.listen(db_session, "after_commit", commit_listener)
+        try:
+            with capture_statements() as statements:
+                contract = service.create_contract(contract_data)
+        finally:
+            event.remove(db_session, "after_commit", commit_listener)
+
+        # contract insert, category load, summary upsert, history insert
+        assert statement_verbs(statements) == ["INSERT", "SELECT", "INSERT", "INSERT"]
+        assert len(commits) == 1
+        assert contract.category.name == sample_category.name
+        assert contract.created_at is not None
+        history = db_session.query(ChangeHistoryModel).filter_by(contract_id=contract.id).one()
+        assert history.changes == {"action": {"old": None, "new": "created"}}
+
+    def test_update_contract_conditional(self, db_session, sample_contract, sample_category, capture_statements):
+        """Test updates are one conditional UPDATE and stale versions are rejected"""
+        service = ContractService(db_session)
+        other_category = CategoryService(db_session).create_category(CategoryCreate(name="Hardware"))
+        contract_id = sample_contract.id
+
+        with capture_statements() as statements:
+            updated = service.update_contract(
+                contract_id,
+                ContractUpdate(status="suspended", category_id=other_category.id),
+                expected_version=1
+            )
+
+        # old row with the new category, conditional update, summary upsert, history insert
+        assert statement_verbs(statements) == ["SELECT", "UPDATE", "INSERT", "INSERT"]
+        assert (updated.version, updated.status, updated.category.name) == (2, "suspended", "Hardware")
+        history = db_session.query(ChangeHistoryModel).filter_by(contract_id=sample_contract.id).one()
+        assert history.changes["category_id"] == {"old": str(sample_category.id), "new": str(other_category.id)}
+
+        with pytest.raises(HTTPException) as exc_info:
+            service.update_contract(sample_contract.id, ContractUpdate(supplier="Stale"), expected_version=1)
+        assert exc_info.value.status_code == 412
+        assert service.get_contract(sample_contract.id).supplier == sample_contract.supplier
+
+    def test_update_without_if_match_retries_a_lost_race(self, db_session, sample_contract, monkeypatch):
+        """Test an unconditional update is reapplied after a concurrent edit, and 409 when it keeps losing"""
+        service = ContractService(db_session)
+        update_if_version = ContractRepository.update_if_version
+        races = []
+
+        def lose_race(repo, contract_id, update_data, expected_version=None):
+            if len(races) == race_count:
+                return update_if_version(repo, contract_id, update_data, expected_version)
+            # Another writer commits after this update read the contract, so its UPDATE matches nothing
+            old_values, _ = update_if_version(repo, contract_id, {"responsible": f"Racer {len(races)}"})
+            repo.db.commit()
+            races.append(contract_id)
+            return old_values, None
+
+        monkeypatch.setattr(ContractRepository, "update_if_version", lose_race)
+        race_count = 1
+        updated = service.update_contract(sample_contract.id, ContractUpdate(supplier="Retried Supplier"))
+        assert (updated.supplier, updated.responsible, updated.version) == ("Retried Supplier", "Racer 0", 3)
+
+        races.clear()
+        race_count = 2
+        with pytest.raises(HTTPException) as exc_info:
+            service.update_contract(sample_contract.id, ContractUpdate(supplier="Unlucky Supplier"))
+        assert exc_info.value.status_code == 409
+        assert service.get_contract(sample_contract.id).supplier == "Retried Supplier"
+
+    def test_update_without_changes_keeps_version(self, db_session, sample_contract, capture_statements):
+        """Test an empty or no-op update writes nothing, so the version (and ETag) stays the same"""
+        service = ContractService(db_session)
+
+        with capture_statements() as statements:
+            empty = service.update_contract(sample_contract.id, ContractUpdate(), expected_version=1)
+            same = service.update_contract(
+                sample_contract.id, ContractUpdate(supplier=sample_contract.supplier, status="active")
+            )
+
+        assert not {"UPDATE", "INSERT"} & set(statement_verbs(statements))
+        assert (empty.version, same.version) == (1, 1)
+        assert db_session.query(ChangeHistoryModel).filter_by(contract_id=sample_contract.id).count() == 0
+
+    def test_contract_history_pages(self, db_session, sample_contract):
+        """Test history pages walk newest first with filters and ties on changed_at"""
+        service = ContractService(db_session)
+        contract_id = sample_contract.id
+        ChangeHistoryRepository(db_session).bulk_create([
+            {"contract_id": contract_id, "changed_by": f"user{n % 2}", "changes": {"n": {"old": None, "new": str(n)}}}
+            for n in range(7)
+        ])
+        db_session.commit()
+
+        seen, cursor = [], None
+        while True:
+            page = service.get_contract_history(contract_id, ChangeHistoryFilters(changed_by="user0"), 2, cursor)
+            seen.extend(entry.id for entry in page.items)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        # Rows inserted together share changed_at, so id breaks the tie
+        assert len(seen) == 4
+        assert seen == sorted(seen, reverse=True)
+
+        all_entries = service.get_contract_history(contract_id, ChangeHistoryFilters(), 100)
+        assert len(all_entries.items) == 7 and all_entries.has_next is False
+        with pytest.raises(HTTPException) as exc_info:
+            service.get_contract_history(contract_id, ChangeHistoryFilters(), 2, "not-a-cursor")
+        assert exc_info.value.status_code == 400
+        with pytest.raises(HTTPException) as exc_info:
+            service.get_contract_history("non-existent-id", ChangeHistoryFilters(), 2)
+        assert exc_info.value.status_code == 404
 
     def test_get_contract_success(self, db_session, sample_contract):
         """Test successful contract retrieval"""
@@ -88,6 +252,22 @@ class TestContractService:
         assert contract.id == sample_contract.id
         assert contract.contract_number == sample_contract.contract_number
 
+    def test_batch_get_chunks_in_queries(self, db_session, multiple_contracts, monkeypatch, capture_statements):
+        """Test batch get resolves ids with one IN query per chunk"""
+        monkeypatch.setattr("app.repositories.contract.BATCH_GET_CHUNK_SIZE", 2)
+        service = ContractService(db_session)
+        ids = [contract.id for contract in reversed(multiple_contracts)] + ["missing-id"]
+
+        with capture_statements() as statements:
+            result = service.batch_get_contracts(ContractBatchGetRequest(ids=ids + ids[:1]))
+
+        # 4 distinct keys in chunks of 2
+        assert len(statements) == 2
+        assert all(" IN " in statement for statement in statements)
+        assert [item.key for item in result.items] == ids + ids[:1]
+        assert [item.contract.id for item in result.items if item.found] == ids[:3] + ids[:1]
+        assert result.missing == ["missing-id"]
+
     def test_get_contract_not_found(self, db_session):
         """Test contract retrieval with invalid ID"""
         service = ContractService(db_session)
@@ -97,6 +277,193 @@ class TestContractService:
         
         assert exc_info.value.status_code == 404
 
+    def test_list_contracts_without_total(self, db_session, multiple_contracts, capture_statements):
+        """Test include_total=false skips the COUNT and still reports has_next"""
+        service = ContractService(db_session)
+        with capture_statements() as statements:
+            response = service.list_contracts(
+                ContractFilters(), PaginationParams(page_size=2, include_total="false")
+            )
+
+        assert len(response.items) == 2
+        assert response.has_next is True
+        assert (response.total, response.pages, response.total_mode) == (None, None, "none")
+        assert not any("count(" in statement.lower() for statement in statements)
+
+    def test_list_contracts_estimated_total(self, db_session, multiple_contracts, sample_category):
+        """Test include_total=estimate reuses cached counts until the next write"""
+        service = ContractService(db_session)
+        estimate = PaginationParams(include_total="estimate")
+
+        first = service.list_contracts(ContractFilters(supplier="Google"), estimate)
+        second = service.list_contracts(ContractFilters(supplier="GOOGLE"), estimate)
+        assert (first.total, first.total_mode) == (1, "exact")
+        assert (second.total, second.total_mode) == (1, "estimate")
+        # Only what SQLite's LIKE treats as equal shares a key: ASCII case, not Unicode case or spacing
+        assert ContractFilters(supplier="Émile").cache_key() != ContractFilters(supplier="émile").cache_key()
+        assert ContractFilters(supplier=" google ").cache_key() != ContractFilters(supplier="google").cache_key()
+
+        service.create_contract(ContractCreate(
+            contract_number="TEST-2024-004", supplier="Google LLC", description="Second Google contract",
+            category_id=sample_category.id, responsible="test.user", value=Decimal("1.00"),
+            start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+        ))
+        third = service.list_contracts(ContractFilters(supplier="Google"), estimate)
+        assert (third.total, third.total_mode) == (2, "exact")
+
+    def test_export_streams_in_batches(self, db_session, multiple_contracts, monkeypatch):
+        """Test exports yield one chunk per fetched batch"""
+        monkeypatch.setattr(settings, "export_batch_size", 2)
+        service = ContractService(db_session)
+
+        chunks = list(service.export_contracts(ContractFilters(), "ndjson"))
+
+        assert [chunk.count("\n") for chunk in chunks] == [2, 1]
+
+    @staticmethod
+    def _summary_state(service):
+        summary = service.get_summary()
+        return {
+            (dimension, bucket.key): (bucket.count, bucket.value)
+            for dimension in ("by_status", "by_category", "by_start_month")
+            for bucket in getattr(summary, dimension)
+        }
+
+    def test_summary_tracks_writes(self, db_session, sample_category):
+        """Test the incrementally maintained summary matches a full rebuild"""
+        service = ContractService(db_session)
+        first = service.create_contract(self._bulk_item("SUM-001", sample_category.id, value=Decimal("100.10")))
+        second = service.create_contract(self._bulk_item("SUM-002", sample_category.id, status="draft"))
+        service.update_contract(second.id, ContractUpdate(
+            status="active", value=Decimal("0.20"), start_date=date(2024, 3, 1)
+        ))
+        service.bulk_create_contracts(ContractBulkRequest(items=[
+            self._bulk_item("SUM-001", sample_category.id, value=Decimal("5.00")),
+            self._bulk_item("SUM-003", sample_category.id),
+        ], upsert=True))
+        service.delete_contract(first.id)
+
+        summary = service.get_summary()
+        assert summary.total_count == 2
+        assert summary.total_value == Decimal("10.20")
+        assert [(b.key, b.count) for b in summary.by_status] == [("active", 2)]
+        assert [(b.key, b.count) for b in summary.by_start_month] == [("2024-01", 1), ("2024-03", 1)]
+        assert summary.by_category[0].label == sample_category.name
+
+        incremental = self._summary_state(service)
+        service.rebuild_summary()
+        assert self._summary_state(service) == incremental
+
+    @staticmethod
+    def _bulk_item(number, category_id, **overrides):
+        data = dict(
+            contract_number=number, supplier="Bulk Supplier", description="Imported from ERP",
+            category_id=category_id, responsible="erp.sync", status="active", value=Decimal("10.00"),
+            start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+        )
+        data.update(overrides)
+        return ContractCreate(**data)
+
+    def test_bulk_create_reports_each_item(self, db_session, sample_contract):
+        """Test bulk create writes valid items and reports the rest per item"""
+        service = ContractService(db_session)
+        category_id = sample_contract.category_id
+
+        response = service.bulk_create_contracts(ContractBulkRequest(items=[
+            self._bulk_item("BULK-001", category_id),
+            self._bulk_item(sample_contract.contract_number, category_id),
+            self._bulk_item("BULK-002", 999),
+            self._bulk_item("BULK-001", category_id),
+            self._bulk_item("BULK-003", category_id),
+        ]))
+
+        assert [r.status for r in response.results] == ["created", "error", "error", "error", "created"]
+        assert "already exists" in response.results[1].error
+        assert "does not exist" in response.results[2].error
+        assert "more than once" in response.results[3].error
+        assert (response.created, response.failed) == (2, 3)
+        assert service.get_contract(response.results[4].id).contract_number == "BULK-003"
+        assert db_session.query(ChangeHistoryModel).count() == 2
+
+    def test_bulk_upsert_updates_supplier_index(self, db_session, sample_contract):
+        """Test bulk creates and supplier renames are reflected in the typeahead index"""
+        service = ContractService(db_session)
+        service.load_supplier_index()
+        category_id = sample_contract.category_id
+        service.bulk_create_contracts(ContractBulkRequest(upsert=True, items=[
+            self._bulk_item("BULK-001", category_id, supplier="Zeta Systems"),
+            self._bulk_item("BULK-002", category_id, supplier="Zeta Systems"),
+            self._bulk_item(
+                sample_contract.contract_number, category_id, supplier="Zeta Services",
+                description=sample_contract.description, responsible=sample_contract.responsible,
+                value=sample_contract.value
+            ),
+        ]))
+
+        suggestions = service.suggest_suppliers("zeta")
+        assert [(item.name, item.contracts) for item in suggestions.items] == [
+            ("Zeta Systems", 2), ("Zeta Services", 1)
+        ]
+        assert service.suggest_suppliers("Test Supplier").items == []
+
+    def test_bulk_upsert_uses_set_based_statements(self, db_session, sample_contract, capture_statements):
+        """Test upsert updates changed contracts with a fixed number of statements"""
+        service = ContractService(db_session)
+        category_id = sample_contract.category_id
+        items = [self._bulk_item(f"BULK-{n:03d}", category_id) for n in range(50)]
+        items.append(self._bulk_item(
+            sample_contract.contract_number, category_id, supplier="Renamed Inc",
+            description=sample_contract.description, responsible=sample_contract.responsible,
+            value=sample_contract.value
+        ))
+        items.append(self._bulk_item(
+            sample_contract.contract_number.replace("001", "XXX"), category_id
+        ))
+
+        with capture_statements() as statements:
+            response = service.bulk_create_contracts(ContractBulkRequest(items=items, upsert=True))
+
+        assert (response.created, response.updated, response.failed) == (51, 1, 0)
+        # contracts and categories lookups, version-guarded update, insert, history, summary upsert
+        assert statement_verbs(statements) == ["SELECT", "SELECT", "UPDATE", "INSERT", "INSERT", "INSERT"]
+
+        updated = service.get_contract(sample_contract.id)
+        assert updated.supplier == "Renamed Inc"
+        history = db_session.query(ChangeHistoryModel).filter_by(contract_id=sample_contract.id).one()
+        assert history.changes == {"supplier": {"old": "Test Supplier Inc", "new": "Renamed Inc"}}
+
+        again = service.bulk_create_contracts(ContractBulkRequest(items=items[-2:-1], upsert=True))
+        assert again.results[0].status == "unchanged"
+
+    def test_bulk_upsert_reports_concurrent_changes(self, db_session, sample_category, monkeypatch):
+        """Test upsert does not overwrite a contract changed after it was read"""
+        service = ContractService(db_session)
+        raced = service.create_contract(self._bulk_item("RACE-001", sample_category.id, supplier="Old Supplier"))
+        service.create_contract(self._bulk_item("RACE-002", sample_category.id, supplier="Old Supplier"))
+
+        read_rows = ContractRepository.get_rows_by_contract_numbers
+
+        def read_then_race(repo, contract_numbers):
+            rows = read_rows(repo, contract_numbers)
+            # Another writer changes RACE-001 between the read and the update
+            repo.update_if_version(raced.id, {"supplier": "Concurrent Supplier"})
+            repo.db.commit()
+            return rows
+
+        monkeypatch.setattr(ContractRepository, "get_rows_by_contract_numbers", read_then_race)
+        response = service.bulk_create_contracts(ContractBulkRequest(upsert=True, items=[
+            self._bulk_item("RACE-001", sample_category.id),
+            self._bulk_item("RACE-002", sample_category.id)
+        ]))
+
+        assert [result.status for result in response.results] == ["conflict", "updated"]
+        assert "modified concurrently" in response.results[0].error
+        assert (response.updated, response.conflicts, response.failed) == (1, 1, 0)
+        assert service.get_contract(raced.id).supplier == "Concurrent Supplier"
+        assert service.get_contract(raced.id).version == 2
+        assert db_session.query(ChangeHistoryModel).filter_by(contract_id=raced.id).count() == 1
+        assert service.get_contract(response.results[1].id).supplier == "Bulk Supplier"
+
 
 class TestCategoryService:
     """Test category service functionality"""
@@ -148,4 +515,472 @@ class TestCategoryService:
             service.delete_category(sample_contract.category_id)
         
         assert exc_info.value.status_code == 400
-        assert "associated contracts" in str(exc_info.value.detail)
\ No newline at end of file
+        assert "associated contracts" in str(exc_info.value.detail)
+
+    def test_delete_category_foreign_key_backstop(self, db_session, sample_contract, monkeypatch):
+        """Test the foreign key rejects the delete when a contract slips past the count"""
+        service = CategoryService(db_session)
+        monkeypatch.setattr(Query, "count", lambda query: 0)
+
+        with pytest.raises(HTTPException) as exc_info:
+            service.delete_category(sample_contract.category_id)
+
+        assert exc_info.value.status_code == 400
+        assert "associated contracts" in str(exc_info.value.detail)
+        assert service.get_category(sample_contract.category_id).id == sample_contract.category_id
+
+    def test_delete_category_checks_contracts_on_writer(self, db_session, sample_category):
+        """Test the contract count runs on the write connection, in the delete's transaction"""
+        write_engine = create_engine(SQLALCHEMY_DATABASE_URL)
+        written = []
+        event.listen(write_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: written.append(statement))
+        db_session.close()
+        try:
+            with RoutingSession(bind=db_session.get_bind(), info={"write_bind": write_engine}) as db:
+                CategoryService(db).delete_category(sample_category.id)
+        finally:
+            write_engine.dispose()
+
+        assert statement_verbs(written) == ["SELECT", "SELECT", "DELETE"]
+        assert "count(*)" in written[1]
+
+
+class TestContractRepository:
+    """Test contract repository pagination"""
+
+    @staticmethod
+    def _bulk_insert(db_session, category_id, rows):
+        """Insert synthetic contracts in one statement"""
+        db_session.execute(text("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :rows)
+            INSERT INTO contracts (id, contract_number, supplier, description, category_id,
+                                   responsible, status, value, start_date, end_date)
+            SELECT printf('id-%08d', n), printf('C-%08d', n), 'Supplier ' || (n % 97), 'Synthetic',
+                   :category_id, 'load.test', 'ACTIVE', n % 5000,
+                   date('2020-01-01', '+' || (n % 1500) || ' days'), '2030-01-01'
+            FROM seq
+        """), {"rows": rows, "category_id": category_id})
+        db_session.commit()
+
+    @staticmethod
+    def _vm_steps(db_session, fn):
+        """Count SQLite VM instructions (in units of 100) executed by fn"""
+        steps = [0]
+
+        def handler():
+            steps[0] += 1
+            return 0
+
+        raw_connection = db_session.connection().connection.dbapi_connection
+        raw_connection.set_progress_handler(handler, 100)
+        try:
+            result = fn()
+        finally:
+            raw_connection.set_progress_handler(None, 100)
+        return steps[0], result
+
+    def test_cursor_walk_matches_offset_pages(self, db_session, multiple_contracts):
+        """Test following next_cursor visits the same rows as offset pages for every sort field"""
+        repo = ContractRepository(db_session)
+
+        for sort_by in SORT_FIELDS:
+            for sort_dir in ("asc", "desc"):
+                offset_ids = [
+                    repo.get_multi(ContractFilters(), PaginationParams(
+                        page=page, page_size=1, sort_by=sort_by, sort_dir=sort_dir
+                    )).items[0].id
+                    for page in range(1, 4)
+                ]
+
+                cursor_ids, cursor = [], None
+                while True:
+                    items, total, cursor, _ = repo.get_multi(ContractFilters(), PaginationParams(
+                        page_size=1, sort_by=sort_by, sort_dir=sort_dir, cursor=cursor
+                    ))
+                    cursor_ids.extend(item.id for item in items)
+                    if cursor is None:
+                        break
+
+                assert total == 3
+                assert cursor_ids == offset_ids, (sort_by, sort_dir)
+
+    def test_invalid_cursor(self, db_session, multiple_contracts):
+        """Test malformed or mismatched cursors are rejected"""
+        service = ContractService(db_session)
+        cursor = ContractRepository(db_session).get_multi(
+            ContractFilters(), PaginationParams(page_size=1, sort_by="value")
+        ).next_cursor
+
+        for pagination in (
+            PaginationParams(cursor="not-a-cursor"),
+            PaginationParams(page_size=1, sort_by="supplier", cursor=cursor),
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                service.list_contracts(ContractFilters(), pagination)
+            assert exc_info.value.status_code == 400
+
+    def test_sparse_fields_select_only_requested_columns(self, db_session, multiple_contracts, capture_statements):
+        """Test fields narrows the SELECT and skips the category join unless requested"""
+        service = ContractService(db_session)
+        pagination = PaginationParams(page_size=2, sort_by="value", sort_dir="asc", include_total="false")
+
+        with capture_statements() as statements:
+            page = service.list_contracts(ContractFilters(), pagination, fields=frozenset({"status"}))
+            with_category = service.list_contracts(
+                ContractFilters(), pagination, fields=frozenset({"category"})
+            )
+
+        select_list = statements[0].split("FROM")[0]
+        assert "description" not in select_list and "supplier" not in select_list
+        assert "categories" not in statements[0]
+        assert "JOIN categories" in statements[1]
+        assert [item.model_dump().keys() for item in page.items] == [{"id", "status"}] * 2
+        assert with_category.items[0].category.name == multiple_contracts[0].category.name
+
+        # The sort column is read for the cursor even when it is not returned
+        next_page = service.list_contracts(
+            ContractFilters(), pagination.model_copy(update={"cursor": page.next_cursor}),
+            fields=frozenset({"status"})
+        )
+        assert [item.id for item in next_page.items] == [
+            item.id for item in service.list_contracts(
+                ContractFilters(), PaginationParams(page=2, page_size=2, sort_by="value", sort_dir="asc")
+            ).items
+        ]
+
+    def test_deep_cursor_page_costs_same_as_first_page(self, db_session, sample_category):
+        """Test page 10,000 via cursor does about the same work as page 1, unlike OFFSET"""
+        self._bulk_insert(db_session, sample_category.id, rows=10_050)
+        repo = ContractRepository(db_session)
+
+        def fetch(**kwargs):
+            return repo.get_multi(ContractFilters(), PaginationParams(page_size=1, **kwargs))
+
+        first_steps, _ = self._vm_steps(db_session, lambda: fetch(page=1))
+        offset_steps, offset_page = self._vm_steps(db_session, lambda: fetch(page=10_000))
+
+        previous_page = fetch(page=9_999)
+        cursor = repo._make_cursor(previous_page.items[-1], PaginationParams(page_size=1))
+        cursor_steps, cursor_page = self._vm_steps(db_session, lambda: fetch(cursor=cursor))
+
+        assert [c.id for c in cursor_page.items] == [c.id for c in offset_page.items]
+        assert cursor_steps <= first_steps * 2 + 5
+        assert offset_steps > cursor_steps * 20
+
+    def test_keyset_indexes_replace_single_column_indexes(self):
+        """Test no contracts column has a single-column index next to a (column, id) index"""
+        indexes = [tuple(column.name for column in index.columns) for index in ContractModel.__table__.indexes]
+        leading = {columns[0] for columns in indexes if len(columns) > 1}
+        assert [columns for columns in indexes if len(columns) == 1 and columns[0] in leading] == []
+        assert ContractModel.__table__.c.contract_number.unique
+
+    def test_managed_indexes_follow_manifest(self):
+        """Test managed indexes are created, rebuilt, restored and dropped to match the manifest"""
+        engine = create_engine("sqlite://")
+        ContractModel.__table__.metadata.create_all(engine)
+
+        def indexes(connection):
+            return {
+                row[1]: [info[2] for info in connection.exec_driver_sql(f"PRAGMA index_info({row[1]})")]
+                for row in connection.exec_driver_sql("PRAGMA index_list(contracts)")
+            }
+
+        with engine.begin() as connection:
+            connection.exec_driver_sql("CREATE INDEX idx_unmanaged ON contracts (responsible)")
+            status_value = ManagedIndex("idx_test_status_value", "contracts", ("status", "value"))
+            assert apply_managed_indexes(connection, [status_value]) == ["created idx_test_status_value"]
+            assert apply_managed_indexes(connection, [status_value]) == []
+            assert indexes(connection)["idx_test_status_value"] == ["status", "value"]
+
+            # Dropped outside the manifest (bulk loads): recreated without a recorded change
+            connection.exec_driver_sql("DROP INDEX idx_test_status_value")
+            assert apply_managed_indexes(connection, [status_value]) == []
+            assert "idx_test_status_value" in indexes(connection)
+
+            changed = status_value._replace(columns=("status", "value", "id"))
+            assert apply_managed_indexes(connection, [changed]) == ["rebuilt idx_test_status_value"]
+            assert indexes(connection)["idx_test_status_value"] == ["status", "value", "id"]
+
+            assert apply_managed_indexes(connection, []) == ["dropped idx_test_status_value"]
+            assert "idx_test_status_value" not in indexes(connection)
+            assert "idx_unmanaged" in indexes(connection)
+
+            # The shipped manifest only names real contract columns
+            assert apply_managed_indexes(connection) == [f"created {index.name}" for index in load_manifest()]
+        engine.dispose()
+
+
+class TestContractSearch:
+    """Test full-text search through the FTS5 index"""
+
+    def _search(self, db_session, q, sort_by="start_date"):
+        page = ContractRepository(db_session).get_multi(
+            ContractFilters(q=q), PaginationParams(sort_by=sort_by)
+        )
+        return [item.contract_number for item in page.items], page.total
+
+    def test_prefix_match_across_fields(self, db_session, multiple_contracts):
+        """Test each search word matches as a word prefix in any text column"""
+        assert self._search(db_session, "micro")[0] == ["TEST-2024-001"]
+        assert self._search(db_session, "amazon serv")[0] == ["TEST-2024-003"]
+        assert self._search(db_session, "TEST-2024-002")[0] == ["TEST-2024-002"]
+        assert self._search(db_session, "test.user")[1] == 3
+        assert self._search(db_session, "oracle") == ([], 0)
+
+    def test_index_follows_updates_and_deletes(self, db_session, multiple_contracts):
+        """Test the shadow index is kept in sync with contract writes"""
+        service = ContractService(db_session)
+        google = multiple_contracts[1]
+
+        service.update_contract(google.id, ContractUpdate(supplier="Alphabet Inc"))
+        assert self._search(db_session, "google")[0] == []
+        assert self._search(db_session, "alphabet")[0] == ["TEST-2024-002"]
+
+        service.delete_contract(google.id)
+        assert self._search(db_session, "alphabet")[0] == []
+
+    def test_relevance_sort(self, db_session, sample_category):
+        """Test sort_by=relevance lists the best matches first"""
+        service = ContractService(db_session)
+        for number, description in [
+            ("REL-1", "Network cabling"),
+            ("REL-2", "Network monitoring for the network core and network edge"),
+            ("REL-3", "Office furniture"),
+        ]:
+            service.create_contract(ContractCreate(
+                contract_number=number, supplier="Acme", description=description,
+                category_id=sample_category.id, responsible="test.user",
+                value=Decimal("100.00"), start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+            ))
+
+        assert self._search(db_session, "network", sort_by="relevance")[0] == ["REL-2", "REL-1"]
+
+    def test_search_snippets(self, db_session, multiple_contracts):
+        """Test highlighted snippets are returned for the listed contracts"""
+        response = ContractService(db_session).list_contracts(
+            ContractFilters(q="micro"), PaginationParams(), highlight=True
+        )
+
+        assert response.highlights == {multiple_contracts[0].id: "<mark>Microsoft</mark> Corporation"}
+
+    def test_search_snippets_escape_html(self, db_session, sample_category):
+        """Test contract text in snippets is HTML-escaped around the <mark> tags"""
+        service = ContractService(db_session)
+        contract = service.create_contract(ContractCreate(
+            contract_number="XSS-1", supplier="<script>alert(1)</script> Widgets & Co", description="Widgets",
+            category_id=sample_category.id, responsible="test.user",
+            value=Decimal("100.00"), start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+        ))
+
+        response = service.list_contracts(ContractFilters(q="alert"), PaginationParams(), highlight=True)
+
+        assert response.highlights == {
+            contract.id: "&lt;script&gt;<mark>alert</mark>(1)&lt;/script&gt; Widgets &amp; Co"
+        }
+
+    def test_search_without_words_falls_back_to_like(self, db_session, multiple_contracts):
+        """Test q made only of punctuation still filters instead of listing everything"""
+        assert self._search(db_session, "@") == ([], 0)
+        assert self._search(db_session, "-")[1] == 3
+        assert self._search(db_session, ".")[1] == 3
+
+    def test_search_uses_fts_index(self, db_session, multiple_contracts):
+        """Test q is answered from the FTS5 index rather than LIKE scans"""
+        repo = ContractRepository(db_session)
+        query = repo._apply_filters(db_session.query(ContractModel), ContractFilters(q="micro"))
+        sql = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+        assert "LIKE" not in sql.upper()
+        assert "VIRTUAL TABLE INDEX" in plan
+
+
+class TestAuditLogWriter:
+    """Test the write-behind change history queue"""
+
+    # Run in a separate process: queue 120 entries, let two batches land, then die with SIGKILL
+    KILLED_WRITER = """
+import asyncio, os, signal, sys
+from datetime import date
+from decimal import Decimal
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+import app.services.contract as contract_service
+from app.config import settings
+from app.database import SessionLocal, get_async_database_url
+from app.models.contract import ChangeHistory
+from app.schemas.contract import ContractCreate
+from app.services.audit import AuditLogWriter
+
+async def main(journal_dir, category_id):
+    engine = create_async_engine(get_async_database_url(settings.database_url), poolclass=NullPool)
+    writer = AuditLogWriter(async_sessionmaker(engine), batch_size=50, flush_interval_ms=60_000, journal_dir=journal_dir)
+    contract_service.audit_writer = writer
+    writer.start()
+    with SessionLocal() as db:
+        service = contract_service.ContractService(db)
+        for n in range(120):
+            service.create_contract(ContractCreate(
+                contract_number=f"AUDIT-{n:03d}", supplier="Audit Supplier", description="Audited",
+                category_id=category_id, responsible="test.user", value=Decimal("1.00"),
+                start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+            ))
+        while db.query(ChangeHistory).count() < 100:
+            db.rollback()
+            await asyncio.sleep(0.01)
+    os.kill(os.getpid(), signal.SIGKILL)
+
+asyncio.run(main(sys.argv[1], int(sys.argv[2])))
+"""
+
+    @pytest_asyncio.fixture
+    async def writer(self, db_session, monkeypatch, tmp_path):
+        """A journaling writer on its own connections to the test database, installed for ContractService"""
+        writer_engine = create_async_engine(get_async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+        # A long interval keeps entries queued until the batch fills or the writer stops
+        writer = AuditLogWriter(
+            async_sessionmaker(writer_engine), batch_size=50, flush_interval_ms=10_000, journal_dir=str(tmp_path)
+        )
+        monkeypatch.setattr("app.services.contract.audit_writer", writer)
+        yield writer
+        await writer.stop()
+        await writer_engine.dispose()
+
+    def _create(self, service, category_id, count):
+        for n in range(count):
+            service.create_contract(ContractCreate(
+                contract_number=f"AUDIT-{n:03d}", supplier="Audit Supplier", description="Audited",
+                category_id=category_id, responsible="test.user", value=Decimal("1.00"),
+                start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+            ))
+
+    async def _wait_for_history(self, db_session, count):
+        deadline = time.monotonic() + 5
+        while db_session.query(ChangeHistoryModel).count() < count and time.monotonic() < deadline:
+            db_session.rollback()
+            await asyncio.sleep(0.01)
+
+    @pytest.mark.asyncio
+    async def test_graceful_shutdown_writes_every_entry(self, db_session, sample_category, writer, tmp_path):
+        """Test queued entries are written in batches and all of them land on stop"""
+        writer.start()
+        service = ContractService(db_session)
+        self._create(service, sample_category.id, 120)
+
+        # Two full batches went out; the remainder waits for the interval or shutdown
+        await self._wait_for_history(db_session, 100)
+        assert db_session.query(ChangeHistoryModel).count() == 100
+
+        await writer.stop()
+        db_session.rollback()
+        entries = db_session.query(ChangeHistoryModel).all()
+        assert len(entries) == 120
+        assert {entry.changes["action"]["new"] for entry in entries} == {"created"}
+        assert all(entry.changed_at is not None for entry in entries)
+        # A drained writer leaves neither its journal nor its checkpoint behind
+        assert list(tmp_path.iterdir()) == []
+        assert db_session.query(AuditJournalCheckpoint).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_killed_writer_is_recovered_from_its_journal(self, db_session, sample_category, writer, tmp_path):
+        """Test entries queued when the process is SIGKILLed are written exactly once by the next writer"""
+        result = subprocess.run(
+            [sys.executable, "-c", self.KILLED_WRITER, str(tmp_path), str(sample_category.id)],
+            env={**os.environ, "DATABASE_URL": SQLALCHEMY_DATABASE_URL}, timeout=60
+        )
+        assert result.returncode == -signal.SIGKILL
+
+        # The two written batches survive; the 20 queued entries only exist in the journal
+        assert db_session.query(ChangeHistoryModel).count() == 100
+        assert len(list(tmp_path.glob("*.journal"))) == 1
+        # One of the unwritten contracts is deleted before recovery
+        service = ContractService(db_session)
+        deleted_id = db_session.query(ContractModel.id).filter_by(contract_number="AUDIT-119").scalar()
+        service.delete_contract(deleted_id)
+
+        writer.start()
+        await self._wait_for_history(db_session, 119)
+        await writer.stop()
+        db_session.rollback()
+        history = db_session.query(ChangeHistoryModel.contract_id, ChangeHistoryModel.changed_at).all()
+        assert len(history) == 119
+        assert len({contract_id for contract_id, _ in history}) == 119
+        assert deleted_id not in {contract_id for contract_id, _ in history}
+        assert all(changed_at is not None for _, changed_at in history)
+        assert list(tmp_path.iterdir()) == []
+        assert db_session.query(AuditJournalCheckpoint).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_journal_is_fsynced_once_per_tick(self, db_session, sample_category, writer, monkeypatch):
+        """Test entries journaled in one event loop tick share a single fsync before the next tick"""
+        writer.start()
+        fsync = os.fsync
+        synced = []
+        monkeypatch.setattr("app.services.audit.os.fsync", lambda fd: synced.append(fd) or fsync(fd))
+        service = ContractService(db_session)
+        self._create(service, sample_category.id, 3)
+        assert synced == []
+
+        await asyncio.sleep(0)
+        assert len(synced) == 1
+
+    def test_falls_back_to_request_transaction(self, db_session, sample_category):
+        """Test history is written synchronously while the writer is not running"""
+        service = ContractService(db_session)
+        self._create(service, sample_category.id, 2)
+        assert db_session.query(ChangeHistoryModel).count() == 2
+
+    @pytest.mark.asyncio
+    async def test_full_queue_falls_back_to_request_transaction(self, db_session, sample_category, writer):
+        """Test entries the queue has no room for are written synchronously instead of blocking"""
+        writer.max_queued = 1
+        writer.start()
+        service = ContractService(db_session)
+        self._create(service, sample_category.id, 3)
+
+        # One entry is queued; the other two were inserted by the service itself
+        assert db_session.query(ChangeHistoryModel).count() == 2
+        await writer.stop()
+        db_session.rollback()
+        assert db_session.query(ChangeHistoryModel).count() == 3
+
+    @pytest.mark.asyncio
+    async def test_delete_discards_queued_entries(self, db_session, sample_category, writer):
+        """Test deleting a contract drops its queued history so none is left orphaned"""
+        writer.start()
+        service = ContractService(db_session)
+        self._create(service, sample_category.id, 2)
+        contract_id = db_session.query(ContractModel.id).filter_by(contract_number="AUDIT-000").scalar()
+
+        service.delete_contract(contract_id)
+        await writer.stop()
+        db_session.rollback()
+        assert db_session.query(ChangeHistoryModel).filter_by(contract_id=contract_id).count() == 0
+        assert db_session.query(ChangeHistoryModel).count() == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_retried(self, db_session, sample_category, writer, monkeypatch):
+        """Test a batch whose insert fails stays queued, less contracts deleted meanwhile, and is retried"""
+        bulk_create = ChangeHistoryRepository.bulk_create
+        attempts = []
+
+        def flaky_bulk_create(repo, entries):
+            attempts.append(len(entries))
+            if len(attempts) == 1:
+                # A contract of the in-flight batch is deleted before the batch fails
+                writer.discard(discarded_id)
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            return bulk_create(repo, entries)
+
+        writer.start()
+        service = ContractService(db_session)
+        self._create(service, sample_category.id, 50)
+        discarded_id = db_session.query(ContractModel.id).filter_by(contract_number="AUDIT-000").scalar()
+        monkeypatch.setattr(ChangeHistoryRepository, "bulk_create", flaky_bulk_create)
+
+        await self._wait_for_history(db_session, 49)
+        await writer.stop()
+        db_session.rollback()
+        assert attempts == [50, 49]
+        assert db_session.query(ChangeHistoryModel).count() == 49
+        assert db_session.query(ChangeHistoryModel).filter_by(contract_id=discarded_id).count() == 0
@@ -0,0 +1,95 @@
+"""
+Tests for the command-line scripts next to the app
+"""
+import json
+import os
+import subprocess
+import sys
+
+from sqlalchemy import create_engine, text
+
+from app.database import Base
+from generate_data import load_dataset
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _dump(engine, table: str, columns: str) -> list:
+    with engine.connect() as connection:
+        return connection.execute(text(f"SELECT {columns} FROM {table} ORDER BY rowid")).all()
+
+
+class TestGenerateData:
+    def test_output_does_not_depend_on_workers(self, tmp_path):
+        """Test the same seed loads identical rows with one generator process or several"""
+        engines = []
+        for workers in (1, 3):
+            engine = create_engine(f"sqlite:///{tmp_path / f'workers-{workers}.db'}")
+            Base.metadata.create_all(engine)
+            assert load_dataset(engine, 95, seed=7, chunk_size=10, batch_size=25, workers=workers, progress=False)[0] == 95
+            engines.append(engine)
+
+        try:
+            # Categories are seeded, not generated: their creation time is the load's
+            for table, columns in (
+                ("categories", "id, name, description"),
+                ("contracts", "*"),
+                ("change_history", "*"),
+                ("contract_summary", "*"),
+            ):
+                single, pooled = (_dump(engine, table, columns) for engine in engines)
+                assert single, table
+                assert single == pooled, table
+        finally:
+            for engine in engines:
+                engine.dispose()
+
+
+class TestRebuildSummary:
+    def test_rebuilds_the_database_given_on_the_command_line(self, tmp_path):
+        """Test --database-url selects the database whose summary is rebuilt"""
+        database_url = f"sqlite:///{tmp_path / 'summary.db'}"
+        engine = create_engine(database_url)
+        Base.metadata.create_all(engine)
+        load_dataset(engine, 20, seed=3, progress=False)
+        with engine.begin() as connection:
+            expected = connection.execute(text("SELECT * FROM contract_summary ORDER BY dimension, bucket")).all()
+            connection.execute(text("DELETE FROM contract_summary"))
+
+        subprocess.run(
+            [sys.executable, "rebuild_summary.py", "--database-url", database_url],
+            cwd=BACKEND_DIR, check=True, capture_output=True, timeout=60
+        )
+
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT * FROM contract_summary ORDER BY dimension, bucket")).all() == expected
+        engine.dispose()
+
+
+class TestBenchmarkSuite:
+    @staticmethod
+    def _write_results(path, medians):
+        results = [{"size": 10_000, "case": case, "median_ms": median} for case, median in medians.items()]
+        path.write_text(json.dumps({"meta": {}, "results": results}))
+        return str(path)
+
+    def _compare(self, baseline, current):
+        return subprocess.run(
+            [sys.executable, "benchmarks/suite.py", "compare", baseline, current, "--threshold", "0.15"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, timeout=60
+        )
+
+    def test_compare_fails_only_beyond_the_threshold(self, tmp_path):
+        """Test compare exits 0 for slowdowns within --threshold and 1 for a larger one"""
+        baseline = self._write_results(tmp_path / "baseline.json", {"get_by_id": 1.0, "list_page": 10.0})
+        within = self._write_results(tmp_path / "within.json", {"get_by_id": 1.1, "list_page": 11.0})
+        beyond = self._write_results(tmp_path / "beyond.json", {"get_by_id": 1.0, "list_page": 12.0})
+
+        result = self._compare(baseline, within)
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "No regressions" in result.stdout
+
+        result = self._compare(baseline, beyond)
+        assert result.returncode == 1, result.stdout + result.stderr
+        assert "list_page" in result.stdout and "REGRESSION" in result.stdout
+        assert "1 case(s) slower than baseline by more than 15%" in result.stdout